@@ -0,0 +1,207 @@
+"""
+Batch analysis, searching many positions across several processes.
+
+Positions are sent to worker processes in chunks so the cost of pickling is paid once per chunk rather
+than once per position, and results stream back as chunks finish. Run as a script on a file of FENs:
+
+    python analysis.py positions.fen --workers 4 --depth 3
+"""
+# Imports
+import argparse
+import time
+
+import chess_engine
+import parallel
+import search
+
+# One searcher per worker process, so its transposition table is allocated once and reused
+_searcher = None
+
+
+class AnalysisResult:
+    """
+    The analysis of one position.
+    """
+
+    def __init__(self, index: int, position, fen: str = None, best_move: str = None, score: int = 0, depth: int = 0,
+                 pv: list = (), nodes: int = 0, legal_moves: int = 0, checkmate: bool = False,
+                 stalemate: bool = False, error: str = None):
+        """
+        Stores the result.
+
+        :param index: The position's place in the input.
+        :param position: The position as it was given, a FEN or a list of moves.
+        :param fen: The FEN of the analysed position.
+        :param best_move: The best move in chess notation, None if there are no legal moves.
+        :param score: The score in centipawns for the player to move.
+        :param depth: The depth the search reached.
+        :param pv: The principal variation in chess notation.
+        :param nodes: The number of nodes searched.
+        :param legal_moves: The number of legal moves in the position.
+        :param checkmate: Whether the player to move is checkmated.
+        :param stalemate: Whether the player to move is stalemated.
+        :param error: Why the position could not be analysed, None if it was.
+        """
+
+        self.index = index
+        self.position = position
+        self.fen = fen
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.pv = list(pv)
+        self.nodes = nodes
+        self.legal_moves = legal_moves
+        self.checkmate = checkmate
+        self.stalemate = stalemate
+        self.error = error
+
+    def __repr__(self):
+        if self.error:
+            return f"AnalysisResult({self.index}, error={self.error!r})"
+        return (f"AnalysisResult({self.index}, best_move={self.best_move}, score={self.score}, depth={self.depth}, "
+                f"legal_moves={self.legal_moves}, checkmate={self.checkmate}, stalemate={self.stalemate})")
+
+
+def position_to_gamestate(position):
+    """
+    Builds the game state for a position given as a FEN or as a list of moves from the starting position.
+
+    :param position: A FEN string, or a list of moves in chess notation such as ["e2e4", "e7e5"].
+    :return: The GameState.
+    """
+    if isinstance(position, str):
+        return chess_engine.GameState.from_fen(position, board_backend="mailbox")
+    gs = chess_engine.GameState(board_backend="mailbox")
+    for notation in position:
+        moves = {move.get_chess_notation(): move for move in gs.valid_moves()}
+        if notation not in moves:
+            raise ValueError(f"Illegal move {notation!r} in {position!r}")
+        gs.make_move(moves[notation])
+    return gs
+
+
+def analyse_position(position, index: int = 0, depth: int = 3, time_limit: float = None, node_limit: int = None,
+                     searcher: search.Searcher = None) -> AnalysisResult:
+    """
+    Analyses a single position.
+
+    :param position: A FEN string or a list of moves.
+    :param index: The position's place in the input.
+    :param depth: The deepest search iteration.
+    :param time_limit: The time budget per position in seconds.
+    :param node_limit: The node budget per position.
+    :param searcher: The searcher to use, a new one if not given.
+    :return: The AnalysisResult, with error set if the position could not be set up or analysed.
+    """
+    try:
+        gs = position_to_gamestate(position)
+    except (ValueError, KeyError, IndexError) as error:
+        return AnalysisResult(index, position, error=str(error))
+
+    try:
+        legal_moves = len(gs.valid_moves())  # Also sets checkmate and stalemate
+        result = AnalysisResult(index, position, fen=gs.to_fen(), legal_moves=legal_moves,
+                                checkmate=gs.checkmate, stalemate=gs.stalemate)
+        if legal_moves:
+            searcher = searcher or search.Searcher(hash_mb=1)
+            found = searcher.search(gs, max_depth=depth, time_limit=time_limit, node_limit=node_limit)
+            result.best_move = found.best_move.get_chess_notation()
+            result.score = found.score
+            result.depth = found.depth
+            result.pv = [move.get_chess_notation() for move in found.pv]
+            result.nodes = found.nodes
+    except Exception as error:  # One position going wrong must not take the rest of a batch down with it
+        return AnalysisResult(index, position, error=f"{type(error).__name__}: {error}")
+    return result
+
+
+def _init_worker(hash_mb: float) -> None:
+    """
+    Sets up the searcher of a worker process.
+
+    :param hash_mb: The transposition table size for the worker.
+    :return:
+    """
+    global _searcher
+    _searcher = search.Searcher(hash_mb=hash_mb)
+
+
+def _analyse_chunk(chunk: list, depth: int, time_limit: float, node_limit: int) -> list:
+    """
+    Analyses a chunk of positions in a worker process.
+
+    :param chunk: A list of (index, position) pairs.
+    :param depth: The deepest search iteration.
+    :param time_limit: The time budget per position.
+    :param node_limit: The node budget per position.
+    :return: A list of AnalysisResults.
+    """
+    return [analyse_position(position, index, depth, time_limit, node_limit, _searcher) for index, position in chunk]
+
+
+def analyse_positions(positions, workers: int = None, chunk_size: int = 16, ordered: bool = True, depth: int = 3,
+                      time_limit: float = None, node_limit: int = None, hash_mb: float = 4):
+    """
+    Analyses many positions across worker processes, yielding results as they are ready.
+
+    The input is read lazily and only a couple of chunks per worker are in flight at once, so the positions
+    can come from a generator over a file far bigger than memory.
+
+    :param positions: An iterable of FEN strings or move lists.
+    :param workers: The number of worker processes, defaults to the CPU count. 0 analyses in this process.
+    :param chunk_size: The number of positions sent to a worker at a time.
+    :param ordered: Whether to yield results in input order, otherwise they come as soon as they finish.
+    :param depth: The deepest search iteration.
+    :param time_limit: The time budget per position in seconds.
+    :param node_limit: The node budget per position.
+    :param hash_mb: The transposition table size of each worker.
+    :return: A generator of AnalysisResults.
+    """
+    indexed = enumerate(positions)
+    if workers == 0:
+        searcher = search.Searcher(hash_mb=hash_mb)
+        for index, position in indexed:
+            yield analyse_position(position, index, depth, time_limit, node_limit, searcher)
+        return
+
+    yield from parallel.map_chunks(_analyse_chunk, indexed, workers, chunk_size, ordered, _init_worker, (hash_mb,),
+                                   (depth, time_limit, node_limit))
+
+
+def main() -> None:
+    """
+    The command line interface, prints one line per position and the throughput at the end.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Analyse a file of FEN positions across several processes.")
+    parser.add_argument("path", help="file with one FEN per line")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=16, help="positions sent to a worker at a time")
+    parser.add_argument("--depth", type=int, default=3, help="search depth")
+    parser.add_argument("--time", type=float, default=None, help="seconds per position")
+    parser.add_argument("--unordered", action="store_true", help="print results as soon as they finish")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = nodes = 0
+    with open(args.path) as lines:
+        fens = (line.split(";", 1)[0].strip() for line in lines)
+        fens = (fen for fen in fens if fen and not fen.startswith("#"))
+        for result in analyse_positions(fens, args.workers, args.chunk_size, not args.unordered, args.depth,
+                                        args.time):
+            count += 1
+            nodes += result.nodes
+            if result.error:
+                print(f"{result.index}\terror\t{result.error}")
+            else:
+                print(f"{result.index}\t{result.best_move}\t{result.score}\t{result.depth}\t{result.legal_moves}\t"
+                      f"{'mate' if result.checkmate else 'stalemate' if result.stalemate else ''}")
+    seconds = time.perf_counter() - start
+    print(f"# {count} positions in {seconds:.2f}s, {count / seconds:.1f} positions/s, {int(nodes / seconds)} nps")
+
+
+if __name__ == "__main__":
+    main()
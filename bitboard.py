@@ -0,0 +1,363 @@
+"""
+Bitboard representation of a position and the precomputed attack tables used by the move generator.
+
+A bitboard is a plain Python int where bit ``r * 8 + c`` is set when square (r, c) is in the set,
+so bit 0 is a8 and bit 63 is h1. This matches the row/column layout of ``GameState.board``.
+"""
+# Imports
+import numpy as np
+
+# Colours
+WHITE = 0
+BLACK = 1
+
+# Piece codes, 0 is an empty square
+EMPTY = 0
+WP, WN, WB, WR, WQ, WK = 1, 2, 3, 4, 5, 6
+BP, BN, BB, BR, BQ, BK = 7, 8, 9, 10, 11, 12
+
+PIECE_NAMES = ("--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK")
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES)}
+
+FULL = (1 << 64) - 1
+
+
+def square(r: int, c: int) -> int:
+    """
+    The square index of a row and column.
+
+    :param r: The row number of the square.
+    :param c: The column number of the square.
+    :return: The index of the square, 0 to 63.
+    """
+    return r * 8 + c
+
+
+def colour_of(code: int) -> int:
+    """
+    The colour of a piece code.
+
+    :param code: A non empty piece code.
+    :return: WHITE or BLACK.
+    """
+    return WHITE if code <= WK else BLACK
+
+
+def squares(bb: int):
+    """
+    Iterates over the set squares of a bitboard, lowest index first.
+
+    :param bb: The bitboard.
+    :return: A generator of square indexes.
+    """
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _step_table(offsets) -> list:
+    """
+    Builds an attack table for a piece that jumps by fixed offsets (knight, king).
+
+    :param offsets: The (row, column) offsets the piece can jump by.
+    :return: A list of 64 bitboards.
+    """
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        for dr, dc in offsets:
+            end_row, end_col = r + dr, c + dc
+            if 0 <= end_row < 8 and 0 <= end_col < 8:
+                bb |= 1 << square(end_row, end_col)
+        table.append(bb)
+    return table
+
+
+def _ray_table(dr: int, dc: int) -> list:
+    """
+    Builds the table of rays leaving each square in one direction, not including the square itself.
+
+    :param dr: The row step of the direction.
+    :param dc: The column step of the direction.
+    :return: A list of 64 bitboards.
+    """
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        end_row, end_col = r + dr, c + dc
+        while 0 <= end_row < 8 and 0 <= end_col < 8:
+            bb |= 1 << square(end_row, end_col)
+            end_row, end_col = end_row + dr, end_col + dc
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2)))
+KING_ATTACKS = _step_table(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# PAWN_ATTACKS[colour][sq] are the squares a pawn of that colour on sq captures on
+PAWN_ATTACKS = (_step_table(((-1, -1), (-1, 1))), _step_table(((1, -1), (1, 1))))
+
+# Rays, "north" is towards row 0 (black's side)
+NORTH = _ray_table(-1, 0)
+SOUTH = _ray_table(1, 0)
+WEST = _ray_table(0, -1)
+EAST = _ray_table(0, 1)
+NORTH_WEST = _ray_table(-1, -1)
+NORTH_EAST = _ray_table(-1, 1)
+SOUTH_WEST = _ray_table(1, -1)
+SOUTH_EAST = _ray_table(1, 1)
+
+# Rays that grow towards higher square indexes stop at their lowest blocker, the others at their highest
+_ROOK_RAYS = ((SOUTH, EAST), (NORTH, WEST))
+_BISHOP_RAYS = ((SOUTH_WEST, SOUTH_EAST), (NORTH_WEST, NORTH_EAST))
+
+
+def _between_table() -> list:
+    """
+    Builds the table of squares strictly between two squares that share a rank, file or diagonal.
+
+    :return: A 64x64 list of bitboards, 0 for squares that are not aligned.
+    """
+    table = [[0] * 64 for _ in range(64)]
+    for rays in (NORTH, SOUTH, WEST, EAST, NORTH_WEST, NORTH_EAST, SOUTH_WEST, SOUTH_EAST):
+        for start_sq in range(64):
+            for end_sq in squares(rays[start_sq]):
+                table[start_sq][end_sq] = rays[start_sq] & ~rays[end_sq] & ~(1 << end_sq)
+    return table
+
+
+BETWEEN = _between_table()
+
+
+def _slider_attacks(sq: int, occ: int, rays) -> int:
+    """
+    The squares a sliding piece attacks, up to and including the first blocker along each ray.
+
+    :param sq: The square of the sliding piece.
+    :param occ: The occupancy bitboard.
+    :param rays: The increasing and decreasing ray tables of the piece.
+    :return: The attack bitboard.
+    """
+    attacks = 0
+    increasing, decreasing = rays
+    for table in increasing:
+        ray = table[sq]
+        blockers = ray & occ
+        if blockers:
+            ray ^= table[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for table in decreasing:
+        ray = table[sq]
+        blockers = ray & occ
+        if blockers:
+            ray ^= table[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq: int, occ: int) -> int:
+    """
+    The squares a rook on sq attacks given the occupancy.
+
+    :param sq: The square of the rook.
+    :param occ: The occupancy bitboard.
+    :return: The attack bitboard.
+    """
+    return _slider_attacks(sq, occ, _ROOK_RAYS)
+
+
+def bishop_attacks(sq: int, occ: int) -> int:
+    """
+    The squares a bishop on sq attacks given the occupancy.
+
+    :param sq: The square of the bishop.
+    :param occ: The occupancy bitboard.
+    :return: The attack bitboard.
+    """
+    return _slider_attacks(sq, occ, _BISHOP_RAYS)
+
+
+def queen_attacks(sq: int, occ: int) -> int:
+    """
+    The squares a queen on sq attacks given the occupancy.
+
+    :param sq: The square of the queen.
+    :param occ: The occupancy bitboard.
+    :return: The attack bitboard.
+    """
+    return _slider_attacks(sq, occ, _ROOK_RAYS) | _slider_attacks(sq, occ, _BISHOP_RAYS)
+
+
+class Bitboards:
+    """
+    Twelve piece bitboards plus the occupancy masks derived from them.
+    """
+
+    __slots__ = ("pieces", "colours", "occupied", "mailbox")
+
+    def __init__(self):
+        """
+        Sets up an empty position.
+
+        ``pieces`` is indexed by piece code (index 0 is unused), ``colours`` by WHITE/BLACK. ``mailbox`` holds
+        the piece code of every square so the piece on a square can be found without scanning the bitboards.
+        """
+        self.pieces = [0] * 13
+        self.colours = [0, 0]
+        self.occupied = 0
+        self.mailbox = bytearray(64)
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Builds the bitboards from an 8x8 board of two character piece strings.
+
+        :param board: The board, as found on ``GameState.board``.
+        :return: The new Bitboards.
+        """
+        bitboards = cls()
+        if isinstance(board, np.ndarray):
+            board = board.tolist()  # Plain strings are much quicker to look up than numpy ones
+        for r, row in enumerate(board):
+            for c, name in enumerate(row):
+                code = PIECE_CODES[name]
+                if code:
+                    bitboards.add(code, square(r, c))
+        return bitboards
+
+    def add(self, code: int, sq: int) -> None:
+        """
+        Puts a piece on an empty square.
+
+        :param code: The piece code.
+        :param sq: The square index.
+        :return:
+        """
+        bit = 1 << sq
+        self.pieces[code] |= bit
+        self.colours[WHITE if code <= WK else BLACK] |= bit
+        self.occupied |= bit
+        self.mailbox[sq] = code
+
+    def remove(self, code: int, sq: int) -> None:
+        """
+        Takes a piece off its square.
+
+        :param code: The piece code.
+        :param sq: The square index.
+        :return:
+        """
+        bit = 1 << sq
+        self.pieces[code] ^= bit
+        self.colours[WHITE if code <= WK else BLACK] ^= bit
+        self.occupied ^= bit
+        self.mailbox[sq] = EMPTY
+
+    def move(self, code: int, start_sq: int, end_sq: int) -> None:
+        """
+        Moves a piece to an empty square.
+
+        :param code: The piece code.
+        :param start_sq: The square the piece is on.
+        :param end_sq: The empty square it moves to.
+        :return:
+        """
+        bits = (1 << start_sq) | (1 << end_sq)
+        self.pieces[code] ^= bits
+        self.colours[WHITE if code <= WK else BLACK] ^= bits
+        self.occupied ^= bits
+        self.mailbox[start_sq] = EMPTY
+        self.mailbox[end_sq] = code
+
+    def attackers(self, sq: int, colour: int, occ: int = None) -> int:
+        """
+        The pieces of one colour that attack a square.
+
+        Looks outward from the square with each piece's attack pattern, a knight on a square a knight
+        on sq would attack is attacking sq, and so on for the other pieces.
+
+        :param sq: The square index.
+        :param colour: WHITE or BLACK, the colour of the attackers.
+        :param occ: The occupancy to slide through, defaults to the current occupancy.
+        :return: The bitboard of attacking pieces.
+        """
+        if occ is None:
+            occ = self.occupied
+        pieces = self.pieces
+        offset = 0 if colour == WHITE else 6
+        straight = pieces[WR + offset] | pieces[WQ + offset]
+        diagonal = pieces[WB + offset] | pieces[WQ + offset]
+        return ((PAWN_ATTACKS[colour ^ 1][sq] & pieces[WP + offset])
+                | (KNIGHT_ATTACKS[sq] & pieces[WN + offset])
+                | (KING_ATTACKS[sq] & pieces[WK + offset])
+                | (rook_attacks(sq, occ) & straight if straight else 0)
+                | (bishop_attacks(sq, occ) & diagonal if diagonal else 0))
+
+    def is_attacked(self, sq: int, colour: int, occ: int = None) -> bool:
+        """
+        Whether any piece of one colour attacks a square, stopping at the first attacker found.
+
+        :param sq: The square index.
+        :param colour: WHITE or BLACK, the colour of the attackers.
+        :param occ: The occupancy to slide through, defaults to the current occupancy.
+        :return: True if the square is attacked.
+        """
+        if occ is None:
+            occ = self.occupied
+        pieces = self.pieces
+        offset = 0 if colour == WHITE else 6
+        if (KNIGHT_ATTACKS[sq] & pieces[WN + offset]
+                or PAWN_ATTACKS[colour ^ 1][sq] & pieces[WP + offset]
+                or KING_ATTACKS[sq] & pieces[WK + offset]):
+            return True
+        straight = pieces[WR + offset] | pieces[WQ + offset]
+        if straight and rook_attacks(sq, occ) & straight:
+            return True
+        diagonal = pieces[WB + offset] | pieces[WQ + offset]
+        return bool(diagonal and bishop_attacks(sq, occ) & diagonal)
+
+    def pins(self, king_sq: int, colour: int) -> dict:
+        """
+        The pieces pinned to a king and the squares each of them may still move to.
+
+        :param king_sq: The square of the king.
+        :param colour: The colour of the king and the pinned pieces.
+        :return: A dictionary from pinned square to the bitboard of the pin ray, including the pinner.
+        """
+        pins = {}
+        pieces = self.pieces
+        offset = 6 if colour == WHITE else 0  # The enemy's pieces
+        enemies = self.colours[colour ^ 1]
+        # Slide through our own pieces, so the first enemy piece on each line is a possible pinner
+        pinners = ((rook_attacks(king_sq, enemies) & (pieces[WR + offset] | pieces[WQ + offset]))
+                   | (bishop_attacks(king_sq, enemies) & (pieces[WB + offset] | pieces[WQ + offset])))
+        for pinner_sq in squares(pinners):
+            ray = BETWEEN[king_sq][pinner_sq]
+            blockers = ray & self.occupied
+            if blockers and not blockers & (blockers - 1) and blockers & self.colours[colour]:
+                pins[blockers.bit_length() - 1] = ray | (1 << pinner_sq)
+        return pins
+
+    def piece_at(self, sq: int) -> int:
+        """
+        Looks up the piece on a square.
+
+        :param sq: The square index.
+        :return: The piece code, EMPTY if there is none.
+        """
+        return self.mailbox[sq]
+
+    def to_board(self) -> np.ndarray:
+        """
+        The board as an 8x8 Numpy array of two character strings, the same layout as ``GameState.board``.
+
+        :return: The board array.
+        """
+        board = np.full((8, 8), "--")
+        for code in range(1, 13):
+            for sq in squares(self.pieces[code]):
+                board[sq >> 3][sq & 7] = PIECE_NAMES[code]
+        return board
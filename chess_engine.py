@@ -5,32 +5,80 @@ for determining valid moves for the current state and a history of the moves tak
 # Imports
 import numpy as np
 
+import bitboard as bb
+import evaluation
+import mailbox
+import zobrist
+
+# The kinds of GameState.board to choose from at construction
+BOARD_BACKENDS = ("numpy", "mailbox")
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# The irreversible state stack, slots saved per move and the plies room is made for up front
+STATE_FIELDS = 4
+STATE_STACK_PLIES = 256
+
+# Castling rights, bits of GameState.castling_rights
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_LETTERS = (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+
+# The rights left after a move touches a square, a king or rook moving or a rook being captured loses them
+_CASTLING_MASK = [15] * 64
+_CASTLING_MASK[bb.square(7, 0)] = 15 ^ WHITE_QUEENSIDE
+_CASTLING_MASK[bb.square(7, 7)] = 15 ^ WHITE_KINGSIDE
+_CASTLING_MASK[bb.square(7, 4)] = 15 ^ (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+_CASTLING_MASK[bb.square(0, 0)] = 15 ^ BLACK_QUEENSIDE
+_CASTLING_MASK[bb.square(0, 7)] = 15 ^ BLACK_KINGSIDE
+_CASTLING_MASK[bb.square(0, 4)] = 15 ^ (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+# (right, king from, king to, rook from, rook to, squares that must be empty, squares that must not be attacked)
+# for each colour, the king's own square is covered by not being in check
+_CASTLES = (
+    ((WHITE_KINGSIDE, 60, 62, 63, 61, 1 << 61 | 1 << 62, (61, 62)),
+     (WHITE_QUEENSIDE, 60, 58, 56, 59, 1 << 57 | 1 << 58 | 1 << 59, (59, 58))),
+    ((BLACK_KINGSIDE, 4, 6, 7, 5, 1 << 5 | 1 << 6, (5, 6)),
+     (BLACK_QUEENSIDE, 4, 2, 0, 3, 1 << 1 | 1 << 2 | 1 << 3, (3, 2))),
+)
+# Rows 0 and 7, where no pawn can stand
+_BACK_RANKS = 0xFF | 0xFF << 56
+
+# King's end square -> (rook from, rook to)
+_CASTLE_ROOK = {castle[2]: (castle[3], castle[4]) for side in _CASTLES for castle in side}
+
+_FEN_PIECES = {"P": "wP", "N": "wN", "B": "wB", "R": "wR", "Q": "wQ", "K": "wK",
+               "p": "bP", "n": "bN", "b": "bB", "r": "bR", "q": "bQ", "k": "bK"}
+_PIECE_LETTERS = {name: letter for letter, name in _FEN_PIECES.items()}
+
 
 class GameState:
     """
     The game state class.
     """
 
-    def __init__(self):
+    # Check every valid_moves result built from the move caches against a full regeneration, for debugging
+    verify_incremental: bool = False
+
+    def __init__(self, fen: str = None, board_backend: str = "numpy"):
         """
         Sets up the board, whose move it is and a move log.
 
         Sets up the board as a 8x8 Numpy 2d array. Each piece is represented by 2 characters,
         the first character represents the colour, second character represents piece:
         R = Rook, N = Knight, B = Bishop, Q = Queen and K = King. -- represents empty space.
+
+        :param fen: A FEN string of the position to start from, the normal starting position if not given.
+        :param board_backend: "numpy" for the array of strings, or "mailbox" for a compact ``MailboxBoard`` of
+            piece codes that is cheaper to keep up to date, reading ``board[r][c]`` gives strings either way.
         :return:
         """
 
-        self.board = np.array([
-            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
-            ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
-            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"],
-        ])
+        if board_backend not in BOARD_BACKENDS:
+            raise ValueError(f"Unknown board backend {board_backend!r}, expected one of {BOARD_BACKENDS}")
+        self.board_backend = board_backend
 
         self.move_functions = {
             "P": self.pawn_move,
@@ -41,98 +89,384 @@ class GameState:
             "K": self.king_move
         }
 
+        if fen is not None:
+            self.load_fen(fen)
+            return
+
+        self.set_board(np.array([
+            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
+            ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["--", "--", "--", "--", "--", "--", "--", "--"],
+            ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
+            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"],
+        ]), castling_rights=15)
+
+    @classmethod
+    def from_fen(cls, fen: str, board_backend: str = "numpy"):
+        """
+        Builds a game state straight from a FEN string, without replaying any moves.
+
+        :param fen: The FEN string.
+        :param board_backend: "numpy" or "mailbox", see ``__init__``.
+        :return: The new GameState.
+        """
+
+        return cls(fen, board_backend)
+
+    def load_fen(self, fen: str):
+        """
+        Sets up the position described by a FEN string.
+
+        The side to move, castling, enpassant and clock fields may be left off the end, they default to
+        white to move, no castling, no enpassant and the clocks of a new game.
+
+        :param fen: The FEN string.
+        :return:
+        :raises ValueError: If any field is malformed or the position can't occur, see ``set_board``.
+        """
+
+        fields = fen.split()
+        if not 1 <= len(fields) <= 6:
+            raise ValueError(f"FEN needs 1 to 6 fields: {fen!r}")
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"FEN placement needs 8 ranks: {fen!r}")
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row += ["--"] * int(char)
+                elif char in _FEN_PIECES:
+                    row.append(_FEN_PIECES[char])
+                else:
+                    raise ValueError(f"Unknown piece {char!r} in FEN: {fen!r}")
+            if len(row) != 8:
+                raise ValueError(f"FEN rank {rank!r} is not 8 squares: {fen!r}")
+            board.append(row)
+
+        side = fields[1] if len(fields) > 1 else "w"
+        if side not in ("w", "b"):
+            raise ValueError(f"FEN side to move must be w or b, not {side!r}: {fen!r}")
+        white_to_move = side == "w"
+
+        castling = fields[2] if len(fields) > 2 else "-"
+        if castling != "-" and (not set(castling) <= set("KQkq") or len(set(castling)) != len(castling)):
+            raise ValueError(f"Bad FEN castling field {castling!r}: {fen!r}")
+        castling_rights = 0
+        for letter, right in CASTLING_LETTERS:
+            if letter in castling:
+                castling_rights |= right
+
+        enpassant = ()
+        square = fields[3] if len(fields) > 3 else "-"
+        if square != "-":
+            # The square behind a pawn that has just moved two, on the 6th rank if black moved it or the 3rd
+            if len(square) != 2 or square[0] not in Move.files_to_cols or square[1] != ("6" if white_to_move else "3"):
+                raise ValueError(f"Bad FEN enpassant square {square!r}: {fen!r}")
+            enpassant = (Move.ranks_to_rows[square[1]], Move.files_to_cols[square[0]])
+
+        clocks = fields[4:6]
+        if not all(clock.isdigit() for clock in clocks):
+            raise ValueError(f"FEN clocks must be whole numbers: {fen!r}")
+        halfmove_clock = int(clocks[0]) if clocks else 0
+        fullmove_number = int(clocks[1]) if len(clocks) > 1 else 1
+        if fullmove_number < 1:
+            raise ValueError(f"FEN move number must be at least 1: {fen!r}")
+
+        self.set_board(board, white_to_move, enpassant, castling_rights, halfmove_clock, fullmove_number)
+
+    def to_fen(self) -> str:
+        """
+        Describes the current position as a FEN string.
+
+        :return: The FEN string.
+        """
+
+        ranks = []
+        mailbox = self.bitboards.mailbox
+        for r in range(8):
+            rank = ""
+            empty = 0
+            for c in range(8):
+                code = mailbox[r * 8 + c]
+                if code:
+                    if empty:
+                        rank += str(empty)
+                        empty = 0
+                    rank += _PIECE_LETTERS[bb.PIECE_NAMES[code]]
+                else:
+                    empty += 1
+            ranks.append(rank + (str(empty) if empty else ""))
+
+        castling = "".join(letter for letter, right in CASTLING_LETTERS if self.castling_rights & right) or "-"
+        if self.enpassant_possible:
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        else:
+            enpassant = "-"
+        return " ".join(("/".join(ranks), "w" if self.white_to_move else "b", castling, enpassant,
+                         str(self.halfmove_clock), str(self.fullmove_number)))
+
+    def set_board(self, board, white_to_move: bool = True, enpassant_possible: tuple = (), castling_rights: int = 0,
+                  halfmove_clock: int = 0, fullmove_number: int = 1):
+        """
+        Sets up a position directly, everything else is worked out from the board and the move log is cleared.
+
+        :param board: An 8x8 array of two character piece strings, with one king of each colour.
+        :param white_to_move: Whether it is white's turn.
+        :param enpassant_possible: The square a pawn can capture enpassant on (row, column), or an empty tuple.
+        :param castling_rights: The castling rights, made of the WHITE_KINGSIDE etc. bits. Rights without the king
+            and rook on their starting squares are dropped.
+        :param halfmove_clock: Moves since the last capture or pawn move, for the fifty move rule.
+        :param fullmove_number: The move number, starting at 1 and going up after each black move.
+        :return:
+        :raises ValueError: If either side doesn't have exactly one king, a pawn is on the first or last rank or
+            the side that just moved is in check.
+        """
+
+        # Bitboards, kept in step with the board by make_move and undo_move
+        bitboards = bb.Bitboards.from_board(board)
+        pieces = bitboards.pieces
+        for king, colour in ((bb.WK, "white"), (bb.BK, "black")):
+            if pieces[king].bit_count() != 1:
+                raise ValueError(f"The board needs exactly one {colour} king")
+        if (pieces[bb.WP] | pieces[bb.BP]) & _BACK_RANKS:
+            raise ValueError("Pawns can't stand on the first or last rank")
+        waiting = bb.BLACK if white_to_move else bb.WHITE
+        waiting_king = pieces[bb.BK if white_to_move else bb.WK].bit_length() - 1
+        if bitboards.attackers(waiting_king, waiting ^ 1):
+            raise ValueError("The side not to move is in check, its king could be taken")
+        for us, castles in enumerate(_CASTLES):
+            king, rook = (bb.WK, bb.WR) if us == bb.WHITE else (bb.BK, bb.BR)
+            for right, king_from, _, rook_from, *_ in castles:
+                if not pieces[king] >> king_from & pieces[rook] >> rook_from & 1:
+                    castling_rights &= ~right
+        self.bitboards = bitboards
+        if self.board_backend == "mailbox":
+            self.board = mailbox.MailboxBoard(self.bitboards.mailbox)
+        else:
+            self.board = np.array(board, dtype="<U2")
+
         # Who's turn
-        self.white_to_move: bool = True
+        self.white_to_move: bool = white_to_move
 
         self.movelog: list = []
 
         # King pieces' locations
-        self.white_king_loc = (7, 4)
-        self.black_king_loc = (0, 4)
+        white_king_sq = self.bitboards.pieces[bb.WK].bit_length() - 1
+        black_king_sq = self.bitboards.pieces[bb.BK].bit_length() - 1
+        self.white_king_loc = (white_king_sq >> 3, white_king_sq & 7)
+        self.black_king_loc = (black_king_sq >> 3, black_king_sq & 7)
 
         # Checkmate and Stalemate bools
         self.checkmate: bool = False
         self.stalemate: bool = False
 
         # Enpassant tuple
-        self.enpassant_possible = ()
+        self.enpassant_possible = tuple(enpassant_possible)
+
+        # Castling rights and the clocks
+        self.castling_rights: int = castling_rights
+        self.halfmove_clock: int = halfmove_clock
+        self.fullmove_number: int = fullmove_number
+        # The state a move can't be undone from, saved before each move in movelog: STATE_FIELDS slots per move
+        # holding the enpassant square, its Zobrist term, the castling rights and the halfmove clock. Preallocated
+        # and written in place, so making a move allocates nothing here, it doubles if a game outgrows it.
+        self._state_stack: list = [None] * (STATE_STACK_PLIES * STATE_FIELDS)
+
+        # Zobrist key of the position, and the key before each move in movelog for spotting repetitions
+        self.zobrist_key: int = zobrist.position_key(self.bitboards, self.white_to_move, self.enpassant_possible,
+                                                     castling_rights)
+        self.key_history: list = []
+        # The enpassant term currently in zobrist_key
+        self._enpassant_key: int = zobrist.enpassant_key(self.bitboards, self.enpassant_possible, white_to_move)
+
+        # Material plus piece-square score, white minus black, kept up to date like the Zobrist key
+        self.eval_score: int = evaluation.score_mailbox(self.bitboards.mailbox)
+
+        # Per colour move caches for the pieces other than the king, square -> (targets, squares they depend on),
+        # and the squares changed since each colour's cache was last brought up to date
+        self._move_cache: list = [{}, {}]
+        self._dirty: list = [bb.FULL, bb.FULL]
 
     def make_move(self, move):
         """
-        The method that actual moves the pieces on the board, doesn't work for special moves like castling
+        The method that actual moves the pieces on the board, including castling, enpassant and promotion.
 
         :param move: The move that needs to be made.
         :return:
         """
 
-        self.board[move.start_row][move.start_col] = "--"
-        self.board[move.end_row][move.end_col] = move.piece_moved
+        code = move.code
+        start_sq = code & 63
+        end_sq = code >> 6 & 63
+        moved = code >> 12 & 15
+        captured = code >> 16 & 15
+        promotion = code >> 20 & 15
+        bitboards = self.bitboards
+        piece_keys = zobrist.PIECE_KEYS
+        scores = evaluation.SCORES
+        self.key_history.append(self.zobrist_key)
+        key = self.zobrist_key ^ zobrist.BLACK_TO_MOVE_KEY ^ self._enpassant_key
+
+        changed = 1 << start_sq | 1 << end_sq
+        score = self.eval_score + scores[promotion or moved][end_sq] - scores[moved][start_sq]
+        if captured:
+            # An enpassant capture takes the pawn beside the start square, not on the end square
+            capture_sq = (start_sq & 56) | (end_sq & 7) if code & ENPASSANT_FLAG else end_sq
+            bitboards.remove(captured, capture_sq)
+            key ^= piece_keys[captured][capture_sq]
+            changed |= 1 << capture_sq
+            score -= scores[captured][capture_sq]
+        if promotion:  # Pawn promotion
+            bitboards.remove(moved, start_sq)
+            bitboards.add(promotion, end_sq)
+        else:
+            bitboards.move(moved, start_sq, end_sq)
+        key ^= piece_keys[moved][start_sq] ^ piece_keys[promotion or moved][end_sq]
+        if code & CASTLE_FLAG:  # The rook jumps over the king
+            rook = moved - 2
+            rook_start, rook_end = _CASTLE_ROOK[end_sq]
+            bitboards.move(rook, rook_start, rook_end)
+            key ^= piece_keys[rook][rook_start] ^ piece_keys[rook][rook_end]
+            changed |= 1 << rook_start | 1 << rook_end
+            score += scores[rook][rook_end] - scores[rook][rook_start]
+        self.eval_score = score
+        self._update_board(changed)
+        self._dirty[0] |= changed
+        self._dirty[1] |= changed
+
+        # Save what undo can't work out from the move
+        stack = self._state_stack
+        base = len(self.movelog) * STATE_FIELDS
+        if base == len(stack):
+            stack.extend([None] * len(stack))
+        stack[base] = self.enpassant_possible
+        stack[base + 1] = self._enpassant_key
+        stack[base + 2] = self.castling_rights
+        stack[base + 3] = self.halfmove_clock
+
         self.movelog.append(move)  # Add to log
         self.white_to_move = not self.white_to_move  # Swap turn
-        # Update the king's location if it was moved
-        if move.piece_moved == "wK":
-            self.white_king_loc = (move.end_row, move.end_col)
-        elif move.piece_moved == "bK":
-            self.black_king_loc = (move.end_row, move.end_col)
 
-        # Pawn promotion to Queen
-        if move.pawn_promotion:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+        # Castling rights and clocks
+        rights = self.castling_rights & _CASTLING_MASK[start_sq] & _CASTLING_MASK[end_sq]
+        if rights != self.castling_rights:
+            key ^= zobrist.CASTLING_KEYS[self.castling_rights] ^ zobrist.CASTLING_KEYS[rights]
+            self.castling_rights = rights
+        if captured or moved == bb.WP or moved == bb.BP:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.white_to_move:
+            self.fullmove_number += 1
 
-        # Pawn enpassant
-        if move.enpassant_move:
-            self.board[move.start_row][move.end_col] = "--"  # Captured
+        # Update the king's location if it was moved
+        if moved == bb.WK:
+            self.white_king_loc = (end_sq >> 3, end_sq & 7)
+        elif moved == bb.BK:
+            self.black_king_loc = (end_sq >> 3, end_sq & 7)
 
         # Update enpassant_possible
-        if move.piece_moved[1] == "P" and (abs(move.start_row - move.end_row) == 2):
-            self.enpassant_possible = ((move.start_row + move.end_row) // 2, move.start_col)
+        if (moved == bb.WP or moved == bb.BP) and abs(start_sq - end_sq) == 16:
+            self.enpassant_possible = ((start_sq + end_sq) >> 4, start_sq & 7)
+            self._enpassant_key = zobrist.enpassant_key(bitboards, self.enpassant_possible, self.white_to_move)
         else:
             self.enpassant_possible = ()
+            self._enpassant_key = 0
+        self.zobrist_key = key ^ self._enpassant_key
 
     def undo_move(self):
         """
-        Undoes the move.
+        Undoes the last move, the pieces are put back using the move and everything else is read off the state
+        stack, so nothing has to be worked out again.
 
         :return:
         """
         if len(self.movelog) != 0:
             move = self.movelog.pop()
-            self.board[move.start_row][move.start_col] = move.piece_moved
-            self.board[move.end_row][move.end_col] = move.piece_captured
+            code = move.code
+            start_sq = code & 63
+            end_sq = code >> 6 & 63
+            moved = code >> 12 & 15
+            captured = code >> 16 & 15
+            promotion = code >> 20 & 15
+            bitboards = self.bitboards
+
+            if promotion:
+                bitboards.remove(promotion, end_sq)
+                bitboards.add(moved, start_sq)
+            else:
+                bitboards.move(moved, end_sq, start_sq)
+            changed = 1 << start_sq | 1 << end_sq
+            scores = evaluation.SCORES
+            score = self.eval_score - scores[promotion or moved][end_sq] + scores[moved][start_sq]
+            if captured:
+                capture_sq = (start_sq & 56) | (end_sq & 7) if code & ENPASSANT_FLAG else end_sq
+                bitboards.add(captured, capture_sq)
+                changed |= 1 << capture_sq
+                score += scores[captured][capture_sq]
+            if code & CASTLE_FLAG:
+                rook = moved - 2
+                rook_start, rook_end = _CASTLE_ROOK[end_sq]
+                bitboards.move(rook, rook_end, rook_start)
+                changed |= 1 << rook_start | 1 << rook_end
+                score -= scores[rook][rook_end] - scores[rook][rook_start]
+            self.eval_score = score
+            self._update_board(changed)
+            self._dirty[0] |= changed
+            self._dirty[1] |= changed
             self.white_to_move = not self.white_to_move
+            stack = self._state_stack
+            base = len(self.movelog) * STATE_FIELDS
+            self.enpassant_possible = stack[base]
+            self._enpassant_key = stack[base + 1]
+            self.castling_rights = stack[base + 2]
+            self.halfmove_clock = stack[base + 3]
+            if not self.white_to_move:
+                self.fullmove_number -= 1
 
             # Update the king's location
-            if move.piece_moved == "wK":
-                self.white_king_loc = (move.start_row, move.start_col)
-            elif move.piece_moved == "bK":
-                self.black_king_loc = (move.start_row, move.start_col)
+            if moved == bb.WK:
+                self.white_king_loc = (start_sq >> 3, start_sq & 7)
+            elif moved == bb.BK:
+                self.black_king_loc = (start_sq >> 3, start_sq & 7)
+            self.zobrist_key = self.key_history.pop()
 
-            # Undo enpassant
-            if move.enpassant_move:
-                self.board[move.end_row][move.end_col] = "--"
-                self.board[move.start_row][move.end_col] = move.piece_captured
-                self.enpassant_possible = (move.end_row, move.end_col)
+    def _update_board(self, changed: int):
+        """
+        Copies the squares a move changed from the bitboards' mailbox onto the board.
 
-            # Undo pawn 2 step
-            if move.piece_moved[1] == "P" and (abs(move.start_row - move.end_row) == 2):
-                self.enpassant_possible = ()
+        :param changed: The bitboard of changed squares.
+        :return:
+        """
+
+        if self.board_backend == "mailbox":
+            self.board.update(changed)  # A view over the mailbox, only its cached rows go stale
+            return
+        codes = self.bitboards.mailbox
+        board = self.board
+        names = bb.PIECE_NAMES
+        while changed:
+            low = changed & -changed
+            sq = low.bit_length() - 1
+            board[sq >> 3, sq & 7] = names[codes[sq]]
+            changed ^= low
 
     def valid_moves(self):
         """
         All the possible moves, with checking for check.
 
+        See ``_legal_moves`` for how they are generated, and ``legal_moves`` to take them one at a time.
+        Sets checkmate or stalemate when there are none.
+
         :return: The array holding the moves made.
         """
-        temp_enpassant_possible = self.enpassant_possible
 
-        moves = self.all_moves()
-        for i in range(len(moves) - 1, -1, -1):  # going back through the list
-            self.make_move(moves[i])
-            self.white_to_move = not self.white_to_move
-            if self.in_check():
-                moves.remove(moves[i])
-            self.white_to_move = not self.white_to_move
-            self.undo_move()
+        moves = list(self._legal_moves(bb.FULL, True, True))
 
         if len(moves) == 0:  # Checkmate or Stalemate
             if self.in_check():
@@ -143,10 +477,262 @@ class GameState:
             self.checkmate = False
             self.stalemate = False
 
-        self.enpassant_possible = temp_enpassant_possible
+        if self.verify_incremental:
+            king_sq = self.bitboards.pieces[bb.WK if self.white_to_move else bb.BK].bit_length() - 1
+            checkers = self.bitboards.attackers(king_sq, bb.BLACK if self.white_to_move else bb.WHITE)
+            expected = [move.code for move in self._full_valid_moves(king_sq, checkers)]
+            if [move.code for move in moves] != expected:
+                raise AssertionError(f"Cached moves differ from a full regeneration in {self.to_fen()}")
+        return moves
+
+    def legal_moves(self):
+        """
+        The legal moves one at a time, in the order valid_moves gives them, for callers that may not need them
+        all. Moves are generated a piece at a time as they are asked for.
+
+        The position must not change while the generator is in use.
+
+        :return: A generator of moves.
+        """
+
+        return self._legal_moves(bb.FULL, True, True)
+
+    def capture_moves(self):
+        """
+        The legal captures one at a time, enpassant included, quiet moves are never generated.
+
+        :return: A generator of moves.
+        """
+
+        return self._legal_moves(self.bitboards.colours[bb.BLACK if self.white_to_move else bb.WHITE], True, False)
+
+    def quiet_moves(self):
+        """
+        The legal moves that capture nothing one at a time, castling and promotions without a capture included.
+
+        :return: A generator of moves.
+        """
 
+        return self._legal_moves(~self.bitboards.occupied & bb.FULL, False, True)
+
+    def has_any_legal_move(self) -> bool:
+        """
+        Checks for a legal move, stopping at the first one found.
+
+        :return: False in checkmate and stalemate.
+        """
+
+        for _ in self._legal_moves(bb.FULL, True, True):
+            return True
+        return False
+
+    def is_checkmate(self) -> bool:
+        """
+        Checks for checkmate without generating every move.
+
+        :return: Whether the player to move is checkmated.
+        """
+
+        return self.in_check() and not self.has_any_legal_move()
+
+    def is_stalemate(self) -> bool:
+        """
+        Checks for stalemate without generating every move.
+
+        :return: Whether the player to move has no moves but is not in check.
+        """
+
+        return not self.in_check() and not self.has_any_legal_move()
+
+    def _legal_moves(self, targets: int, enpassant: bool, castling: bool):
+        """
+        Generates the legal moves a piece at a time.
+
+        Works out the checking pieces and the pinned pieces once, then each piece only generates moves that
+        stay inside its pin ray and block or capture the checker, so no move has to be made and undone.
+        The squares each piece attacks come from the move cache, so only pieces near the last moves are
+        looked at again, see ``_update_move_cache``.
+
+        :param targets: The bitboard of end squares wanted, enpassant and castling aside.
+        :param enpassant: Whether to include enpassant captures.
+        :param castling: Whether to include castling.
+        :return: A generator of moves.
+        """
+
+        bitboards = self.bitboards
+        us = bb.WHITE if self.white_to_move else bb.BLACK
+        king_code = bb.WK if us == bb.WHITE else bb.BK
+        king_sq = bitboards.pieces[king_code].bit_length() - 1
+        checkers = bitboards.attackers(king_sq, us ^ 1)
+
+        if not checkers & (checkers - 1):  # Not double check, so pieces other than the king can move
+            if checkers:
+                check_mask = bb.BETWEEN[king_sq][checkers.bit_length() - 1] | checkers  # Block or capture
+            else:
+                check_mask = bb.FULL
+            check_mask &= targets
+            pins = bitboards.pins(king_sq, us)
+            pieces = bitboards.pieces
+            cache = self._update_move_cache(us) if self._dirty[us] else self._move_cache[us]
+            pawn_code = king_code - 5
+            promotion_row = 1 if us == bb.WHITE else 6
+            enpassant = enpassant and self.enpassant_possible
+            for code in range(pawn_code, king_code):
+                for sq in bb.squares(pieces[code]):
+                    mask = check_mask & pins[sq] if sq in pins else check_mask
+                    moves = []
+                    if code == pawn_code:
+                        self._add_moves(sq, cache[sq][0] & mask, moves, code + 4 if sq >> 3 == promotion_row else 0)
+                        if enpassant:  # Enpassant is not cached, it depends on the last move
+                            self._add_enpassant(sq, moves)
+                            moves = [m for m in moves
+                                     if not m.code & ENPASSANT_FLAG or self._enpassant_legal(m, king_sq, us)]
+                    elif mask:
+                        self._add_moves(sq, cache[sq][0] & mask, moves)
+                    yield from moves
+
+        # The king may not step onto an attacked square, looking through where it stands now
+        occ = bitboards.occupied ^ (1 << king_sq)
+        safe = 0
+        for sq in bb.squares(bb.KING_ATTACKS[king_sq] & ~bitboards.colours[us] & targets):
+            if not bitboards.is_attacked(sq, us ^ 1, occ):
+                safe |= 1 << sq
+        moves = []
+        self.king_move(king_sq >> 3, king_sq & 7, moves, safe)
+        if castling and self.castling_rights and not checkers:
+            self._castle_moves(us, moves)
+        yield from moves
+
+    def _full_valid_moves(self, king_sq: int, checkers: int) -> list:
+        """
+        The legal moves generated from scratch by the piece functions, the reference the move cache is checked
+        against.
+
+        :param king_sq: The square of the side to move's king.
+        :param checkers: The bitboard of pieces giving check.
+        :return: The moves, in the same order valid_moves gives them.
+        """
+
+        bitboards = self.bitboards
+        us = bb.WHITE if self.white_to_move else bb.BLACK
+        king_code = bb.WK if us == bb.WHITE else bb.BK
+        moves = []
+        if not checkers & (checkers - 1):
+            check_mask = bb.BETWEEN[king_sq][checkers.bit_length() - 1] | checkers if checkers else bb.FULL
+            pins = bitboards.pins(king_sq, us)
+            for code in range(king_code - 5, king_code):
+                move_function = self.move_functions[bb.PIECE_NAMES[code][1]]
+                for sq in bb.squares(bitboards.pieces[code]):
+                    mask = check_mask & pins[sq] if sq in pins else check_mask
+                    if mask or code == bb.WP or code == bb.BP:  # Pawns may still have an enpassant capture
+                        move_function(sq >> 3, sq & 7, moves, mask)
+            if self.enpassant_possible:
+                moves = [m for m in moves if not m.code & ENPASSANT_FLAG or self._enpassant_legal(m, king_sq, us)]
+        occ = bitboards.occupied ^ (1 << king_sq)
+        safe = 0
+        for sq in bb.squares(bb.KING_ATTACKS[king_sq] & ~bitboards.colours[us]):
+            if not bitboards.is_attacked(sq, us ^ 1, occ):
+                safe |= 1 << sq
+        self.king_move(king_sq >> 3, king_sq & 7, moves, safe)
+        if self.castling_rights and not checkers:
+            self._castle_moves(us, moves)
         return moves
 
+    def _castle_moves(self, us: int, moves: list):
+        """
+        Appends the castling moves of a side that is not in check.
+
+        The right must still be held, the king and rook must be on their squares with nothing between them,
+        and the king may not pass through or land on an attacked square.
+
+        :param us: The colour of the side to move.
+        :param moves: The array holding all the moves.
+        :return:
+        """
+
+        bitboards = self.bitboards
+        king_code = bb.WK if us == bb.WHITE else bb.BK
+        rooks = bitboards.pieces[king_code - 2]
+        for right, king_start, king_end, rook_start, _, empty, path in _CASTLES[us]:
+            if (self.castling_rights & right and not bitboards.occupied & empty and rooks >> rook_start & 1
+                    and bitboards.pieces[king_code] >> king_start & 1
+                    and not any(bitboards.is_attacked(sq, us ^ 1) for sq in path)):
+                move = _new_move(Move)
+                move.code = king_start | king_end << 6 | king_code << 12 | CASTLE_FLAG
+                moves.append(move)
+
+    def _update_move_cache(self, us: int) -> dict:
+        """
+        Brings a colour's move cache up to date with the squares changed since it was last used.
+
+        Each entry holds the squares a piece can move to ignoring pins and check, and the squares that decide
+        them: the piece's own square, a slider's rays up to and including the first blocker, the squares a
+        knight or pawn reaches. Only the entries that depend on a changed square are worked out again.
+
+        :param us: The colour whose cache to update.
+        :return: The cache, square -> (targets, depends on).
+        """
+
+        cache = self._move_cache[us]
+        dirty = self._dirty[us]
+        self._dirty[us] = 0
+        for sq in [sq for sq, (_, depends) in cache.items() if depends & dirty]:
+            del cache[sq]
+
+        bitboards = self.bitboards
+        pieces = bitboards.pieces
+        occupied = bitboards.occupied
+        not_own = ~bitboards.colours[us]
+        enemies = bitboards.colours[us ^ 1]
+        first = bb.WP if us == bb.WHITE else bb.BP
+        for code in range(first, first + 5):
+            kind = code - first
+            for sq in bb.squares(pieces[code]):
+                if sq in cache:
+                    continue
+                if kind == 0:  # Pawn
+                    step = -8 if us == bb.WHITE else 8
+                    attacks = bb.PAWN_ATTACKS[us][sq]
+                    depends = attacks | 1 << (sq + step)
+                    targets = attacks & enemies
+                    if not occupied >> (sq + step) & 1:
+                        targets |= 1 << (sq + step)
+                        if sq >> 3 == (6 if us == bb.WHITE else 1):
+                            depends |= 1 << (sq + 2 * step)
+                            if not occupied >> (sq + 2 * step) & 1:
+                                targets |= 1 << (sq + 2 * step)
+                elif kind == 1:  # Knight
+                    depends = bb.KNIGHT_ATTACKS[sq]
+                    targets = depends & not_own
+                else:
+                    if kind == 2:
+                        depends = bb.bishop_attacks(sq, occupied)
+                    elif kind == 3:
+                        depends = bb.rook_attacks(sq, occupied)
+                    else:
+                        depends = bb.queen_attacks(sq, occupied)
+                    targets = depends & not_own
+                cache[sq] = (targets, depends | 1 << sq)
+        return cache
+
+    def _enpassant_legal(self, move, king_sq: int, us: int) -> bool:
+        """
+        Checks an enpassant capture by taking both pawns off the occupancy, the one case pin rays miss.
+
+        :param move: The enpassant move.
+        :param king_sq: The square of the moving side's king.
+        :param us: The colour of the moving side.
+        :return: Whether the king is safe after the capture.
+        """
+
+        bitboards = self.bitboards
+        start_sq = move.code & 63
+        end_sq = move.code >> 6 & 63
+        captured_sq = (start_sq & 56) | (end_sq & 7)
+        occ = (bitboards.occupied ^ (1 << start_sq) ^ (1 << captured_sq)) | (1 << end_sq)
+        attackers = bitboards.attackers(king_sq, us ^ 1, occ)
+        return not attackers & ~(1 << captured_sq)  # The captured pawn no longer attacks anything
+
     def in_check(self):
         """
         Checks if the current player king is in check.
@@ -159,205 +745,258 @@ class GameState:
         else:
             return self.square_attacked(self.black_king_loc[0], self.black_king_loc[1])
 
-    def square_attacked(self, r: int, c: int):
+    def square_attacked(self, r: int, c: int, by_white: bool = None):
         """
-        Checks if the enemy can attack square r, c.
+        Checks if a colour can attack square r, c.
 
         :param r: The row number of the square
         :param c: The column number of the square
+        :param by_white: The colour of the attackers, defaults to the enemy of the player to move.
         :return: Whether a particular square is under attack or not.
         """
 
-        self.white_to_move = not self.white_to_move  # Switch turn (temporary)
-        opp_moves = self.all_moves()
-        self.white_to_move = not self.white_to_move  # Switch back
-        for move in opp_moves:
-            if move.end_row == r and move.end_col == c:  # Square is under attack
-                return True
-        return False
+        if by_white is None:
+            by_white = not self.white_to_move
+        return self.bitboards.is_attacked(bb.square(r, c), bb.WHITE if by_white else bb.BLACK)
+
+    def checkers(self):
+        """
+        The enemy pieces giving check to the current player's king.
+
+        :return: A list of the (row, column) squares of the checking pieces.
+        """
+
+        king_r, king_c = self.white_king_loc if self.white_to_move else self.black_king_loc
+        attackers = self.bitboards.attackers(bb.square(king_r, king_c), bb.BLACK if self.white_to_move else bb.WHITE)
+        return [(sq >> 3, sq & 7) for sq in bb.squares(attackers)]
+
+    def repetition_count(self) -> int:
+        """
+        How many times the current position has occurred, counting this time.
+
+        Walks back through key_history two moves at a time, only positions with the same player to move can match.
+
+        :return: The number of occurrences.
+        """
+
+        key = self.zobrist_key
+        history = self.key_history
+        count = 1
+        for i in range(len(history) - 2, -1, -2):
+            if history[i] == key:
+                count += 1
+        return count
+
+    def threefold_repetition(self) -> bool:
+        """
+        Checks if the current position has occurred three times.
+
+        :return: Whether the game can be drawn by repetition.
+        """
+
+        return self.repetition_count() >= 3
 
     def all_moves(self):
         """
         All the possible moves, without checking for check.
 
+        Walks the bitboard of each of the current player's piece types rather than every square of the board.
+
         :return: The array holding the moves made.
         """
 
         moves = []  # The array holding all the moves done
-        for r in range(len(self.board)):  # Rows
-            for c in range(len(self.board[r])):  # Cols
-                turn = self.board[r][c][0]
-                if (turn == "w" and self.white_to_move) or (turn == "b" and not self.white_to_move):
-                    piece = self.board[r][c][1]
-                    self.move_functions[piece](r, c, moves)
+        first_code = bb.WP if self.white_to_move else bb.BP
+        pieces = self.bitboards.pieces
+        for code in range(first_code, first_code + 6):
+            move_function = self.move_functions[bb.PIECE_NAMES[code][1]]
+            for sq in bb.squares(pieces[code]):
+                move_function(sq >> 3, sq & 7, moves)
 
         return moves
 
-    def pawn_move(self, r: int, c: int, moves: list):
+    def _add_moves(self, sq: int, targets: int, moves: list, promotion: int = 0):
+        """
+        Appends a move from sq to every square in a target bitboard.
+
+        :param sq: The square index of the piece.
+        :param targets: The bitboard of squares the piece can move to.
+        :param moves: The array holding all the moves.
+        :param promotion: The code of the queen a pawn promotes to, 0 for none. Each target then gets a move
+            for the queen, rook, bishop and knight.
+        :return:
+        """
+
+        mailbox = self.bitboards.mailbox
+        if promotion:
+            base = sq | mailbox[sq] << 12
+            while targets:
+                low = targets & -targets
+                end_sq = low.bit_length() - 1
+                for piece in range(promotion, promotion - 4, -1):
+                    move = _new_move(Move)
+                    move.code = base | end_sq << 6 | mailbox[end_sq] << 16 | piece << 20
+                    moves.append(move)
+                targets ^= low
+            return
+        base = sq | mailbox[sq] << 12
+        while targets:
+            low = targets & -targets
+            end_sq = low.bit_length() - 1
+            move = _new_move(Move)
+            move.code = base | end_sq << 6 | mailbox[end_sq] << 16
+            moves.append(move)
+            targets ^= low
+
+    def _own_pieces(self) -> int:
+        """
+        The bitboard of the current player's pieces.
+
+        :return: The occupancy of the side to move.
+        """
+
+        return self.bitboards.colours[bb.WHITE if self.white_to_move else bb.BLACK]
+
+    def pawn_move(self, r: int, c: int, moves: list, mask: int = bb.FULL):
         """
         The valid moves a pawn can make.
 
         :param r: The number representing the row.
         :param c: The number representing the column.
         :param moves: The array holding all the moves.
+        :param mask: The squares the pawn may move to, enpassant captures are left for the caller to check.
         :return:
         """
 
+        bitboards = self.bitboards
+        sq = bb.square(r, c)
         if self.white_to_move:  # Checks its white's turn to move
-            if self.board[r - 1][c] == "--":  # Checks square in front is empty
-                moves.append(Move((r, c), (r - 1, c), self.board))
-                if r == 6 and self.board[r - 2][c] == "--":  # 6 to check it is he first move
-                    moves.append(Move((r, c), (r - 2, c), self.board))
-
-            if c - 1 >= 0:  # Capturing diagonally to the left
-                if self.board[r - 1][c - 1][0] == "b":
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board))
-                elif (r - 1, c - 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board, enpassant_move=True))
-
-            if c + 1 <= 7:  # Capturing diagonally to the right
-                if self.board[r - 1][c + 1][0] == "b":
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board))
-                elif (r - 1, c + 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board, enpassant_move=True))
-
+            step, start_row, enemies = -8, 6, bitboards.colours[bb.BLACK]
+            attacks = bb.PAWN_ATTACKS[bb.WHITE][sq]
+            promotion = bb.WQ if r == 1 else 0  # Pawn promotion, to a Queen or any lesser piece
         else:  # Black's turn to move
-            if self.board[r + 1][c] == "--":  # Checks square is empty
-                moves.append(Move((r, c), (r + 1, c), self.board))
-                if r == 1 and self.board[r + 2][c] == "--":
-                    moves.append(Move((r, c), (r + 2, c), self.board))
+            step, start_row, enemies = 8, 1, bitboards.colours[bb.WHITE]
+            attacks = bb.PAWN_ATTACKS[bb.BLACK][sq]
+            promotion = bb.BQ if r == 6 else 0
 
-            if c - 1 >= 0:  # Capturing diagonally to the left
-                if self.board[r + 1][c - 1][0] == "w":
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board))
-                elif (r + 1, c - 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board, enpassant_move=True))
+        targets = 0
+        if not bitboards.occupied >> (sq + step) & 1:  # Checks square in front is empty
+            targets = 1 << (sq + step)
+            if r == start_row and not bitboards.occupied >> (sq + 2 * step) & 1:  # first move, 2 squares
+                targets |= 1 << (sq + 2 * step)
 
-            if c + 1 <= 7:  # Capturing diagonally to the right
-                if self.board[r + 1][c + 1][0] == "w":
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board))
-                elif (r + 1, c + 1) == self.enpassant_possible:
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board, enpassant_move=True))
+        self._add_moves(sq, (targets | attacks & enemies) & mask, moves, promotion)  # Capturing diagonally
+        if self.enpassant_possible:
+            self._add_enpassant(sq, moves)
 
-    def rook_move(self, r: int, c: int, moves: list):
+    def _add_enpassant(self, sq: int, moves: list):
+        """
+        Appends the enpassant capture of the pawn on sq if it has one, its legality is left for the caller.
+
+        :param sq: The square index of the pawn.
+        :param moves: The array holding all the moves.
+        :return:
+        """
+
+        ep_sq = bb.square(*self.enpassant_possible)
+        if bb.PAWN_ATTACKS[bb.WHITE if self.white_to_move else bb.BLACK][sq] >> ep_sq & 1:
+            move = _new_move(Move)
+            move.code = (sq | ep_sq << 6 | self.bitboards.mailbox[sq] << 12
+                         | (bb.BP if self.white_to_move else bb.WP) << 16 | ENPASSANT_FLAG)
+            moves.append(move)
+
+    def rook_move(self, r: int, c: int, moves: list, mask: int = bb.FULL):
         """
         The valid moves a rook can make.
 
         :param r: The number representing the row.
         :param c: The number representing the column.
         :param moves: The array holding all the moves.
+        :param mask: The squares the rook may move to.
         :return:
         """
 
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # cardinal directions
-        enemy_colour = "b" if self.white_to_move else "w"
-
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":  # empty space ok
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_colour:  # enemy ok
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:  # own team not ok
-                        break
-                else:  # off board not ok
-                    break
+        sq = bb.square(r, c)
+        attacks = bb.rook_attacks(sq, self.bitboards.occupied)
+        self._add_moves(sq, attacks & ~self._own_pieces() & mask, moves)  # own team not ok
 
-    def knight_move(self, r: int, c: int, moves: list):
+    def knight_move(self, r: int, c: int, moves: list, mask: int = bb.FULL):
         """
         The valid moves a knight can make
 
         :param r: The number representing the row.
         :param c: The number representing the column.
         :param moves: The array holding all the moves.
+        :param mask: The squares the knight may move to.
         :return:
         """
 
-        knight_moves = ((-2, -1), (-2, 1), (2, -1), (2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2))
-        ally_colour = "w" if self.white_to_move else "b"
+        sq = bb.square(r, c)
+        self._add_moves(sq, bb.KNIGHT_ATTACKS[sq] & ~self._own_pieces() & mask, moves)
 
-        for m in knight_moves:
-            end_row = r + m[0]
-            end_col = c + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_colour:
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-
-    def bishop_move(self, r: int, c: int, moves: list):
+    def bishop_move(self, r: int, c: int, moves: list, mask: int = bb.FULL):
         """
         The valid moves a bishop can make
 
         :param r: The number representing the row.
         :param c: The number representing the column.
         :param moves: The array holding all the moves.
+        :param mask: The squares the bishop may move to.
         :return:
         """
 
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemy_colour = "b" if self.white_to_move else "w"
-
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_colour:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:
-                        break
-                else:
-                    break
+        sq = bb.square(r, c)
+        attacks = bb.bishop_attacks(sq, self.bitboards.occupied)
+        self._add_moves(sq, attacks & ~self._own_pieces() & mask, moves)
 
-    def queen_move(self, r: int, c: int, moves: list):
+    def queen_move(self, r: int, c: int, moves: list, mask: int = bb.FULL):
         """
         The valid moves a queen can make
 
         :param r: The number representing the row.
         :param c: The number representing the column.
         :param moves: The array holding all the moves.
+        :param mask: The squares the queen may move to.
         :return:
         """
 
-        self.rook_move(r, c, moves)
-        self.bishop_move(r, c, moves)  # queen is basically just rook + bishop
+        sq = bb.square(r, c)
+        attacks = bb.queen_attacks(sq, self.bitboards.occupied)  # queen is rook + bishop
+        self._add_moves(sq, attacks & ~self._own_pieces() & mask, moves)
 
-    def king_move(self, r: int, c: int, moves: list):
+    def king_move(self, r: int, c: int, moves: list, mask: int = bb.FULL):
         """
         The valid moves a king can make
 
         :param r: The number representing the row.
         :param c: The number representing the column.
         :param moves: The array holding all the moves.
+        :param mask: The squares the king may move to.
         :return:
         """
 
-        king_moves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
-        ally_colour = "w" if self.white_to_move else "b"
+        sq = bb.square(r, c)
+        self._add_moves(sq, bb.KING_ATTACKS[sq] & ~self._own_pieces() & mask, moves)
 
-        for i in range(8):
-            end_row = r + king_moves[i][0]
-            end_col = c + king_moves[i][1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_colour:
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+
+# Move encoding, the fields packed into Move.code
+ENPASSANT_FLAG = 1 << 24
+CASTLE_FLAG = 1 << 25
+_KEY_MASK = 0xFFF | 0xF << 20  # Start square, end square and promotion piece
 
 
 class Move:
     """
     A class for moving the pieces and chess notation conversions
+
+    A move is a single packed integer, ``code``: bits 0-5 hold the start square, 6-11 the end square,
+    12-15 the piece moved, 16-19 the piece captured, 20-23 the piece promoted to, bit 24 the enpassant flag and
+    bit 25 the castling flag, set on the king's move.
+    Squares are ``row * 8 + column`` and pieces are the codes from the bitboard file.
     """
 
+    __slots__ = ("code",)
+
     # Maps keys to values, ranks and files special chess words for same thing
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4,
                      "5": 3, "6": 2, "7": 1, "8": 0}
@@ -369,32 +1008,100 @@ class Move:
 
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
-    def __init__(self, start_sq: tuple[int, int], end_sq: tuple[int, int], board, enpassant_move=False):
+    def __init__(self, start_sq: tuple[int, int], end_sq: tuple[int, int], board, enpassant_move=False,
+                 promotion: str = "Q"):
         """
         Setting up the coordinate system.
 
+        The move generator builds moves straight from their code instead, see ``from_code``.
+
         :param start_sq: The starting square (row and column).
         :param end_sq: The ending square (row and column).
         :param board: The chessboard.
         :param enpassant_move: Whether a move is enpassant.
+        :param promotion: The piece a pawn reaching the last row becomes, Q, R, B or N.
         """
 
-        self.start_row: int = start_sq[0]
-        self.start_col: int = start_sq[1]
-        self.end_row: int = end_sq[0]
-        self.end_col: int = end_sq[1]
-        self.piece_moved = board[self.start_row][self.start_col]
-        self.piece_captured = board[self.end_row][self.end_col]
-        self.move_id = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
+        moved = bb.PIECE_CODES[str(board[start_sq[0]][start_sq[1]])]
+        captured = bb.PIECE_CODES[str(board[end_sq[0]][end_sq[1]])]
+        code = bb.square(*start_sq) | bb.square(*end_sq) << 6 | moved << 12
 
         # Pawn promo
-        self.pawn_promotion = (self.piece_moved == "wP" and self.end_row == 0) or (
-                self.piece_moved == "bP" and self.end_row == 7)
+        if (moved == bb.WP and end_sq[0] == 0) or (moved == bb.BP and end_sq[0] == 7):
+            code |= (moved + "PNBRQ".index(promotion)) << 20  # The piece of the same colour
+
+        # Castling, the king moving two columns
+        if (moved == bb.WK or moved == bb.BK) and abs(start_sq[1] - end_sq[1]) == 2:
+            code |= CASTLE_FLAG
 
         # Enpassant
-        self.enpassant_move = enpassant_move
-        if self.enpassant_move:
-            self.piece_captured = "wP" if self.piece_moved == "bP" else "bP"
+        if enpassant_move:
+            captured = bb.WP if moved == bb.BP else bb.BP
+            code |= ENPASSANT_FLAG
+
+        self.code: int = code | captured << 16
+
+    @classmethod
+    def from_code(cls, code: int):
+        """
+        Builds a move from its packed code without looking at a board.
+
+        :param code: The packed move.
+        :return: The move.
+        """
+
+        move = _new_move(cls)
+        move.code = code
+        return move
+
+    # The fields of the old Move, decoded from the code on demand
+    @property
+    def start_row(self) -> int:
+        return (self.code & 63) >> 3
+
+    @property
+    def start_col(self) -> int:
+        return self.code & 7
+
+    @property
+    def end_row(self) -> int:
+        return (self.code >> 6 & 63) >> 3
+
+    @property
+    def end_col(self) -> int:
+        return self.code >> 6 & 7
+
+    @property
+    def start_sq(self) -> int:
+        return self.code & 63
+
+    @property
+    def end_sq(self) -> int:
+        return self.code >> 6 & 63
+
+    @property
+    def piece_moved(self) -> str:
+        return bb.PIECE_NAMES[self.code >> 12 & 15]
+
+    @property
+    def piece_captured(self) -> str:
+        return bb.PIECE_NAMES[self.code >> 16 & 15]
+
+    @property
+    def pawn_promotion(self) -> bool:
+        return bool(self.code >> 20 & 15)
+
+    @property
+    def enpassant_move(self) -> bool:
+        return bool(self.code & ENPASSANT_FLAG)
+
+    @property
+    def castle_move(self) -> bool:
+        return bool(self.code & CASTLE_FLAG)
+
+    @property
+    def move_id(self) -> int:
+        return self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col
 
     def __eq__(self, other):
         """
@@ -408,16 +1115,32 @@ class Move:
         """
 
         if isinstance(other, Move):
-            return self.move_id == other.move_id
+            return self.code & _KEY_MASK == other.code & _KEY_MASK
         return False
 
+    def __hash__(self):
+        """
+        Hashes the same fields ``__eq__`` compares, so moves can be kept in sets and dictionaries.
+
+        :return: The hash.
+        """
+
+        return hash(self.code & _KEY_MASK)
+
+    def __repr__(self):
+        return f"Move({self.get_chess_notation()})"
+
     def get_chess_notation(self):
         """
         Just gets the chess notation, or close to it, of a move.
 
+        Promotions end with the lower case letter of the new piece, like e7e8q.
+
         :return:
         """
-        return self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        notation = self.get_rank_file(self.start_row, self.start_col) + self.get_rank_file(self.end_row, self.end_col)
+        promotion = self.code >> 20 & 15
+        return notation + bb.PIECE_NAMES[promotion][1].lower() if promotion else notation
 
     def get_rank_file(self, r, c):
         """
@@ -428,3 +1151,27 @@ class Move:
         :return: Nothing to see here, never use this directly.
         """
         return self.cols_to_files[c] + self.rows_to_ranks[r]
+
+
+# Skips __init__, for building moves from a code
+_new_move = object.__new__
+
+
+def read_fens(source):
+    """
+    Streams game states from a file with one FEN per line, reading a line at a time so big files never sit
+    in memory. Blank lines and lines starting with # are skipped, anything after a ; is ignored (EPD style
+    operations).
+
+    :param source: A path, or an open text file or any iterable of lines.
+    :return: A generator of GameStates.
+    """
+
+    if isinstance(source, str):
+        with open(source) as lines:
+            yield from read_fens(lines)
+        return
+    for line in source:
+        fen = line.split(";", 1)[0].strip()
+        if fen and not fen.startswith("#"):
+            yield GameState.from_fen(fen)
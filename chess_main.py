@@ -4,45 +4,117 @@ basically the user's interface with the game
 """
 
 # Imports
+import argparse
+
+import numpy as np
 import pygame as pg
 
 import chess_engine
+import engine_worker
+import sprites
 
 # Constants
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
-FPS = 15
-IMAGES = {}
+MIN_SQ_SIZE = 16  # The smallest the window can be resized to, per square
+ATLAS = None  # The sprites.SpriteAtlas of the pieces at SQ_SIZE, set by load_images
+ENGINE_POLL_MS = 20  # How often the loop checks for the engine's move while it thinks
 
 
 def load_images() -> None:
     """
-    Fills the IMAGES dictionary with images of the pieces.
+    Loads the sprite atlas of the pieces at the current square size, see ``sprites.SpriteAtlas``.
+
+    Call it after the display is set up so the sprites are converted to the display's format.
 
     :return:
     """
 
-    pieces = ["wP", "bP", "wR", "bR", "wN", "bN", "wB", "bB", "wQ", "bQ", "wK", "bK"]
+    global ATLAS
+    if ATLAS is None:
+        ATLAS = sprites.SpriteAtlas(SQ_SIZE)
+    else:
+        ATLAS.resize(SQ_SIZE)
+
+
+def set_square_size(size: int) -> None:
+    """
+    Changes the size of the board, for when the window is resized.
+
+    :param size: The new size of a square in pixels.
+    :return:
+    """
 
-    for piece in pieces:
-        IMAGES[piece] = pg.transform.scale(pg.image.load("images/" + piece + ".png"),
-                                           (SQ_SIZE, SQ_SIZE))
+    global SQ_SIZE, WIDTH, HEIGHT
+    SQ_SIZE = max(size, MIN_SQ_SIZE)
+    WIDTH = HEIGHT = SQ_SIZE * DIMENSION
+    load_images()
 
 
-def draw_gamestate(screen: pg.Surface, gs: chess_engine.GameState) -> None:
+def draw_gamestate(screen: pg.Surface, gs: chess_engine.GameState, background: pg.Surface = None) -> None:
     """
     Draw the entire game state onto the screen.
 
     :param screen: The pygame surface that will be drawn upon.
     :param gs: The game state, so that we know where the pieces are.
+    :param background: The pre-rendered board from create_background, the squares are drawn if not given.
     :return:
     """
 
-    draw_board(screen)  # draw the chessboard
+    if background is None:
+        draw_board(screen)  # draw the chessboard
+    else:
+        screen.blit(background, (0, 0))
     draw_pieces(screen, gs.board)  # draw the chess pieces on the board
 
 
+def create_background() -> pg.Surface:
+    """
+    Renders the empty board once, so redrawing a square is a single blit instead of a rect fill.
+
+    :return: The board surface.
+    """
+
+    background = pg.Surface((WIDTH, HEIGHT))
+    draw_board(background)
+    return background
+
+
+def changed_squares(before, after) -> list:
+    """
+    Finds the squares that differ between two boards, the squares a move or an undo touched.
+
+    :param before: The board as it was last drawn.
+    :param after: The board now.
+    :return: A list of (row, col) tuples.
+    """
+
+    return [(int(r), int(c)) for r, c in np.argwhere(np.asarray(before) != np.asarray(after))]
+
+
+def draw_squares(screen: pg.Surface, background: pg.Surface, board, squares) -> list:
+    """
+    Redraws only the given squares, the background then the piece on each.
+
+    :param screen: The pygame surface that gets drawn on.
+    :param background: The pre-rendered board from create_background.
+    :param board: The board, to know which piece is on each square.
+    :param squares: The (row, col) squares to redraw.
+    :return: The list of rects that were drawn, for pg.display.update.
+    """
+
+    rects = []
+    for r, c in squares:
+        rect = pg.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        screen.blit(background, rect, rect)
+        piece = board[r][c]
+        if piece != "--":
+            ATLAS.blit(screen, piece, rect)
+        rects.append(rect)
+    return rects
+
+
 def draw_board(screen: pg.Surface) -> None:
     """
     Draw the squares of the board onto the screen.
@@ -70,39 +142,74 @@ def draw_pieces(screen: pg.Surface, board) -> None:
     :return:
     """
 
+    # Every sprite comes off the one atlas surface, so the whole board goes in a single blits call
+    atlas = ATLAS.surface
+    blits = []
     for i in range(DIMENSION):
+        row = board[i]
         for j in range(DIMENSION):
-            piece = board[i][j]
+            piece = row[j]
             if piece != "--":
-                screen.blit(IMAGES[piece], pg.Rect(j * SQ_SIZE, i * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+                blits.append((atlas, (j * SQ_SIZE, i * SQ_SIZE), ATLAS.area(piece)))
+    screen.blits(blits, doreturn=False)
 
 
-def main() -> None:
+def main(computer: str = None, think_time: float = 1.0, book: str = None) -> None:
     """
     The main method. the actual runnable function.
 
+    :param computer: "white" or "black" to have the engine play that side, None for two human players.
+    :param think_time: The engine's time per move in seconds.
+    :param book: An opening book file for the engine, see ``opening_book``.
     :return:
     """
 
+    engine = None
+    if computer is not None:
+        # Started before pygame so the worker process begins from a clean interpreter as early as possible
+        engine = engine_worker.EngineWorker(time_limit=think_time, book_path=book)
+        engine.start()
+    computer_white = computer == "white"
+
     pg.init()
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    screen = pg.display.set_mode((WIDTH, HEIGHT), pg.RESIZABLE)
     pg.display.set_caption("Chess")
-    clock = pg.time.Clock()
-    screen.fill(pg.Color("white"))
     gs = chess_engine.GameState()
     valid_moves: list = gs.valid_moves()
     move_made: bool = False
-    load_images()  # Image loading is expensive so only do once
+    load_images()  # Loads the atlas saved on disk, scaling the images only the first time at this size
+    background = create_background()  # So is drawing the board, redraws blit from this
+    draw_gamestate(screen, gs, background)
+    pg.display.flip()
+    drawn = gs.board.copy()  # The board as it is on screen
     running: bool = True
     sq_selected = ()  # Keeps track of the last click
     player_clicks = []  # Keeps track of the last clicks
 
     while running:
-        for e in pg.event.get():
+        computer_turn = engine is not None and gs.white_to_move == computer_white and len(valid_moves) > 0
+        if computer_turn and not engine.thinking:
+            engine.think(gs)
+
+        # Sleep until something happens rather than redrawing at a fixed frame rate,
+        # waking up now and then to check on the engine while it thinks
+        events = [pg.event.wait(ENGINE_POLL_MS if computer_turn else 0)] + pg.event.get()
+        for e in events:
             if e.type == pg.QUIT:
                 running = False
-            # Mouse input handling
-            elif e.type == pg.MOUSEBUTTONDOWN:
+            # A new size only means switching atlas and rebuilding the background, the sprites are cached per size
+            elif e.type == pg.VIDEORESIZE:
+                set_square_size(min(e.w, e.h) // DIMENSION)
+                screen = pg.display.set_mode((WIDTH, HEIGHT), pg.RESIZABLE)
+                background = create_background()
+                draw_gamestate(screen, gs, background)
+                pg.display.flip()
+            # The window was uncovered or restored, what was on screen is lost
+            elif e.type in (pg.VIDEOEXPOSE, pg.WINDOWEXPOSED):
+                draw_gamestate(screen, gs, background)
+                pg.display.flip()
+            # Mouse input handling, ignored while the engine is to move
+            elif e.type == pg.MOUSEBUTTONDOWN and not computer_turn:
                 location = pg.mouse.get_pos()
                 col = location[0] // SQ_SIZE
                 row = location[1] // SQ_SIZE
@@ -127,15 +234,39 @@ def main() -> None:
             elif e.type == pg.KEYDOWN:
                 if e.key == pg.K_z:  # Z is undo button
                     gs.undo_move()
+                    if engine is not None:
+                        engine.cancel()  # Whatever it was thinking about is gone
+                        # Take back the engine's move too, so it is the player's turn again
+                        if gs.white_to_move == computer_white and len(gs.movelog) > 0:
+                            gs.undo_move()
                     move_made = True
 
+        if engine is not None and engine.thinking:
+            result = engine.poll()
+            if result is not None and result.best_move is not None:
+                gs.make_move(result.best_move)
+                print(result.best_move.get_chess_notation())
+                move_made = True
+                if len(result.pv) > 1:
+                    engine.ponder(gs, result.pv[1])  # Think on the player's time
+
         if move_made:
             valid_moves = gs.valid_moves()
             move_made = False
-        draw_gamestate(screen, gs)
-        clock.tick(FPS)
-        pg.display.flip()
+            # Only the squares the move or undo touched are redrawn and pushed to the display
+            squares = changed_squares(drawn, gs.board)
+            if squares:
+                pg.display.update(draw_squares(screen, background, gs.board, squares))
+                drawn = gs.board.copy()
+
+    if engine is not None:
+        engine.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Play chess.")
+    parser.add_argument("--computer", choices=("white", "black"), help="let the engine play this side")
+    parser.add_argument("--think-time", type=float, default=1.0, help="the engine's seconds per move")
+    parser.add_argument("--book", help="an opening book file for the engine")
+    args = parser.parse_args()
+    main(args.computer, args.think_time, args.book)
@@ -0,0 +1,207 @@
+"""
+Runs the search in a separate process so the pygame loop never waits on it.
+
+The main loop hands positions to an EngineWorker and polls it for the result between events. Every request gets
+a job number, stored in shared memory along with a deadline, and the worker's search stops as soon as the job
+number moves on, which is how a think is cancelled. Pondering searches the position after the reply the engine
+expects, with no deadline, and if the player makes that reply the deadline is set and the search carries on.
+"""
+# Imports
+import multiprocessing
+import queue
+import time
+
+import chess_engine
+import opening_book
+import search
+
+# How long the worker sleeps between checks while it holds a finished ponder result
+_PONDER_WAIT = 0.005
+
+
+def _run_worker(requests, results, job, deadline, max_depth: int, hash_mb: float, book_path: str = None) -> None:
+    """
+    The worker process, searches each requested position until its job is cancelled or runs out of time.
+
+    :param requests: The queue of (job number, FEN, key history) requests, None to exit.
+    :param results: The queue the (job number, SearchResult) results go on.
+    :param job: The shared number of the current job.
+    :param deadline: The shared time.time() the current job must finish by, 0 for no deadline.
+    :param max_depth: The deepest search iteration.
+    :param hash_mb: The size of the transposition table, kept between searches.
+    :param book_path: An opening book file to play from before searching, if any.
+    :return:
+    """
+    book = opening_book.OpeningBook(book_path) if book_path else None
+    searcher = search.Searcher(max_depth=max_depth, hash_mb=hash_mb, book=book)
+    while True:
+        request = requests.get()
+        # Only the latest request matters, any before it have been cancelled already
+        while request is not None:
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                break
+            else:
+                if request is None:
+                    break
+        if request is None:
+            return
+        number, fen, key_history = request
+        if job.value != number:
+            continue
+
+        def should_stop():
+            return job.value != number or (deadline.value and time.time() >= deadline.value)
+
+        gs = chess_engine.GameState.from_fen(fen, board_backend="mailbox")
+        gs.key_history = list(key_history)
+        searcher.should_stop = should_stop
+        result = searcher.search(gs)
+
+        # A ponder search that finished early waits until the player's reply decides its fate
+        while job.value == number and not deadline.value:
+            time.sleep(_PONDER_WAIT)
+        if job.value == number:
+            results.put((number, result))
+
+
+class EngineWorker:
+    """
+    The search running in its own process.
+    """
+
+    def __init__(self, time_limit: float = 1.0, max_depth: int = search.MAX_DEPTH, hash_mb: float = 16,
+                 book_path: str = None):
+        """
+        Sets up the worker, start must be called before it is used.
+
+        :param time_limit: The think time per move in seconds.
+        :param max_depth: The deepest search iteration.
+        :param hash_mb: The size of the worker's transposition table.
+        :param book_path: An opening book file, opened in the worker, to play from before searching.
+        """
+
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.hash_mb = hash_mb
+
+        context = multiprocessing.get_context("spawn")  # Don't inherit pygame's state through a fork
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self._job = context.Value("q", 0, lock=False)
+        self._deadline = context.Value("d", 0.0, lock=False)
+        self._process = context.Process(target=_run_worker, daemon=True, args=(
+            self._requests, self._results, self._job, self._deadline, max_depth, hash_mb, book_path))
+
+        self.thinking = False  # Whether a result is wanted for the current job
+        self.pondering = False  # Whether the current job is a ponder search
+        self._ponder_key = None  # The Zobrist key of the position being pondered
+
+    def start(self) -> None:
+        """
+        Starts the worker process.
+
+        :return:
+        """
+
+        self._process.start()
+
+    def close(self) -> None:
+        """
+        Cancels any search and stops the worker process.
+
+        :return:
+        """
+
+        self.cancel()
+        if self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(1)
+            if self._process.is_alive():
+                self._process.terminate()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send(self, gs, deadline: float) -> None:
+        """
+        Starts a new job on the position.
+
+        :param gs: The game state to search.
+        :param deadline: The time.time() the search must finish by, 0 to search until told otherwise.
+        :return:
+        """
+
+        self._deadline.value = deadline
+        self._job.value += 1
+        self._requests.put((self._job.value, gs.to_fen(), list(gs.key_history)))
+
+    def think(self, gs) -> None:
+        """
+        Starts searching for a move in the position, the result arrives through poll.
+
+        If the position is the one being pondered the running search is kept and just given its deadline.
+
+        :param gs: The game state, it is not changed.
+        :return:
+        """
+
+        deadline = time.time() + self.time_limit
+        if self.pondering and gs.zobrist_key == self._ponder_key:
+            self._deadline.value = deadline  # Ponder hit
+        else:
+            self._send(gs, deadline)
+        self.thinking = True
+        self.pondering = False
+
+    def ponder(self, gs, expected_reply) -> None:
+        """
+        Searches the position after the expected reply while the player thinks.
+
+        :param gs: The game state after the engine's move, it is returned to the same position.
+        :param expected_reply: The reply the engine expects, the second move of its principal variation.
+        :return:
+        """
+
+        gs.make_move(expected_reply)
+        try:
+            self._ponder_key = gs.zobrist_key
+            self._send(gs, 0.0)
+        finally:
+            gs.undo_move()
+        self.thinking = False
+        self.pondering = True
+
+    def cancel(self) -> None:
+        """
+        Stops the current search, its result will never arrive.
+
+        :return:
+        """
+
+        if self.thinking or self.pondering:
+            self._job.value += 1
+        self.thinking = False
+        self.pondering = False
+
+    def poll(self):
+        """
+        Checks for the result of the current think without waiting.
+
+        :return: The SearchResult, or None if it is not ready.
+        """
+
+        while self.thinking:
+            try:
+                number, result = self._results.get_nowait()
+            except queue.Empty:
+                return None
+            if number == self._job.value:
+                self.thinking = False
+                return result
+        return None
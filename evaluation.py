@@ -0,0 +1,256 @@
+"""
+Scores positions for the search, in centipawns from the point of view of the player to move.
+
+The score is material plus piece-square tables, summed from one table indexed by [piece code][square]. Search
+keeps it up to date move by move (``GameState.eval_score``), while offline jobs score whole batches of boards,
+stacked as an (N, 64) array of piece codes, in a few vectorized Numpy operations. Run as a script to measure
+positions per second:
+
+    python evaluation.py --positions 100000
+"""
+# Imports
+import argparse
+import random
+import time
+
+import numpy as np
+
+import bitboard as bb
+
+# Piece values indexed by piece code, the king has no material value
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 0, 100, 320, 330, 500, 900, 0)
+
+# Piece-square bonuses for white, laid out like the board with rank 8 first, so index them by square.
+# Black uses the same tables flipped top to bottom.
+_PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+_KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+_BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+_ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+_QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+_KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+PIECE_SQUARE_TABLES = (_PAWN_TABLE, _KNIGHT_TABLE, _BISHOP_TABLE, _ROOK_TABLE, _QUEEN_TABLE, _KING_TABLE)
+
+
+def _tables() -> tuple:
+    """
+    Builds the lookup tables, white's pieces score positive and black's negative.
+
+    :return: The (13, 64) int32 arrays of material plus piece-square bonus and of material alone, indexed by
+        piece code and square, row 0 (empty) is all zeros.
+    """
+    scores = np.zeros((13, 64), dtype=np.int32)
+    materials = np.zeros((13, 64), dtype=np.int32)
+    for kind, bonuses in enumerate(PIECE_SQUARE_TABLES):
+        value = PIECE_VALUES[bb.WP + kind]
+        white = np.asarray(bonuses, dtype=np.int32) + value
+        scores[bb.WP + kind] = white
+        scores[bb.BP + kind] = -white.reshape(8, 8)[::-1].ravel()  # Flipped for black
+        materials[bb.WP + kind] = value
+        materials[bb.BP + kind] = -value
+    return scores, materials
+
+
+SCORE_TABLE, MATERIAL_TABLE = _tables()
+# Plain lists for the scalar path, indexing these is much quicker than indexing Numpy arrays one item at a time
+SCORES = SCORE_TABLE.tolist()
+
+_SQUARES = np.arange(64)
+
+
+def material(bitboards) -> int:
+    """
+    The material balance, white minus black.
+
+    :param bitboards: The position's bitboards.
+    :return: The balance in centipawns.
+    """
+    pieces = bitboards.pieces
+    score = 0
+    for code in range(bb.WP, bb.WK):
+        score += PIECE_VALUES[code] * (pieces[code].bit_count() - pieces[code + 6].bit_count())
+    return score
+
+
+def score_mailbox(mailbox) -> int:
+    """
+    Scores a board from scratch, material plus piece-square bonuses, white minus black.
+
+    :param mailbox: The 64 piece codes of the board, ``Bitboards.mailbox``.
+    :return: The score in centipawns.
+    """
+    return sum(SCORES[code][sq] for sq, code in enumerate(mailbox) if code)
+
+
+def evaluate(gs) -> int:
+    """
+    Scores a position for the player to move, from the score make_move and undo_move keep up to date.
+
+    :param gs: The game state.
+    :return: The score in centipawns, positive when the player to move is ahead.
+    """
+    score = gs.eval_score
+    return score if gs.white_to_move else -score
+
+
+def encode_board(board) -> np.ndarray:
+    """
+    Turns a board of piece strings, like ``GameState.board``, into 64 piece codes.
+
+    :param board: An 8x8 array of two character piece strings.
+    :return: A (64,) uint8 array of piece codes.
+    """
+    board = np.asarray(board).ravel()
+    codes = np.zeros(64, dtype=np.uint8)
+    for code in range(bb.WP, bb.BK + 1):
+        codes[board == bb.PIECE_NAMES[code]] = code
+    return codes
+
+
+def stack_positions(states) -> np.ndarray:
+    """
+    Stacks the boards of many game states into one array of piece codes, copied from their mailboxes.
+
+    :param states: An iterable of GameStates.
+    :return: An (N, 64) uint8 array.
+    """
+    data = b"".join(bytes(gs.bitboards.mailbox) for gs in states)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 64)
+
+
+def material_batch(boards: np.ndarray) -> np.ndarray:
+    """
+    The material balance of many boards at once, white minus black.
+
+    :param boards: An (N, 64) array of piece codes.
+    :return: An (N,) int32 array of balances in centipawns.
+    """
+    return MATERIAL_TABLE[boards, _SQUARES].sum(axis=1, dtype=np.int32)
+
+
+def evaluate_batch(boards: np.ndarray, white_to_move=None) -> np.ndarray:
+    """
+    Scores many boards at once, material plus piece-square bonuses.
+
+    :param boards: An (N, 64) array of piece codes, see stack_positions and encode_board.
+    :param white_to_move: An (N,) array of bools to score for the player to move, white's view if not given.
+    :return: An (N,) int32 array of scores in centipawns.
+    """
+    scores = SCORE_TABLE[boards, _SQUARES].sum(axis=1, dtype=np.int32)
+    if white_to_move is not None:
+        scores = np.where(white_to_move, scores, -scores)
+    return scores
+
+
+def benchmark(count: int = 100000, seed: int = 0) -> dict:
+    """
+    Times the batch and the scalar evaluation on positions from random games.
+
+    :param count: The number of positions to score.
+    :param seed: The seed for the random games.
+    :return: A dictionary with positions, batch and scalar seconds and positions per second, and whether the
+        two paths agreed.
+    """
+    import chess_engine  # Imported here, chess_engine imports this file for the incremental score
+
+    rng = random.Random(seed)
+    states = []
+    gs = chess_engine.GameState(board_backend="mailbox")
+    while len(states) < min(count, 2000):
+        moves = gs.valid_moves()
+        if not moves or len(gs.movelog) > 80:
+            gs = chess_engine.GameState(board_backend="mailbox")
+            continue
+        gs.make_move(rng.choice(moves))
+        states.append(gs.bitboards.mailbox[:])
+    mailboxes = (states * (count // len(states) + 1))[:count]
+    boards = np.frombuffer(b"".join(bytes(mailbox) for mailbox in mailboxes), dtype=np.uint8).reshape(-1, 64)
+
+    start = time.perf_counter()
+    batch = evaluate_batch(boards)
+    batch_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    scalar = [score_mailbox(mailbox) for mailbox in mailboxes]
+    scalar_seconds = time.perf_counter() - start
+    return {
+        "matches": batch.tolist() == scalar,
+        "positions": count,
+        "batch_seconds": batch_seconds,
+        "batch_positions_per_second": int(count / batch_seconds) if batch_seconds > 0 else 0,
+        "scalar_seconds": scalar_seconds,
+        "scalar_positions_per_second": int(count / scalar_seconds) if scalar_seconds > 0 else 0,
+    }
+
+
+def main() -> None:
+    """
+    The command line interface, prints the throughput of the batch and scalar paths.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Measure evaluation throughput.")
+    parser.add_argument("--positions", type=int, default=100000, help="positions to score")
+    args = parser.parse_args()
+    result = benchmark(args.positions)
+    print(f"batch   {result['positions']} positions in {result['batch_seconds']:.3f}s, "
+          f"{result['batch_positions_per_second']} positions/s")
+    print(f"scalar  {result['positions']} positions in {result['scalar_seconds']:.3f}s, "
+          f"{result['scalar_positions_per_second']} positions/s")
+
+
+if __name__ == "__main__":
+    main()
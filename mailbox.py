@@ -0,0 +1,118 @@
+"""
+A compact board of piece codes, an alternative to the Numpy array of strings in ``GameState.board``.
+
+The board is a view over 64 piece codes in row * 8 + column order. In a game state these are the bitboards' own
+``Bitboards.mailbox``, so the board is never a second copy to keep in step: a move only drops the cached rows it
+changed. Reading ``board[r][c]`` still gives the "wP"/"--" strings the UI and ``Move`` expect.
+"""
+# Imports
+import numpy as np
+
+import bitboard as bb
+
+
+class MailboxBoard:
+    """
+    The 8x8 board of piece codes.
+    """
+
+    __slots__ = ("cells", "_rows")
+
+    def __init__(self, codes: bytearray = None):
+        """
+        Sets up the board.
+
+        :param codes: The 64 piece codes of the squares in row * 8 + column order, used as they are rather than
+            copied so the board follows any change made to them. An empty board if not given.
+        """
+
+        self.cells = codes if codes is not None else bytearray(64)
+        self._rows = [None] * 8  # The rows as piece strings, built when first read and dropped when they change
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        Builds the board from an 8x8 array of two character piece strings.
+
+        :param board: The board, as found on ``GameState.board``.
+        :return: The MailboxBoard.
+        """
+
+        rows = board.tolist() if isinstance(board, np.ndarray) else board
+        return cls(bytearray(bb.PIECE_CODES[str(name)] for row in rows for name in row))
+
+    def __getitem__(self, r: int) -> tuple:
+        """
+        A row of the board as piece strings, so ``board[r][c]`` reads like the Numpy board.
+
+        :param r: The row number, negative ones count from the end.
+        :return: A tuple of the 8 piece strings.
+        :raises IndexError: If the row is off the board.
+        """
+
+        if not -8 <= r < 8:
+            raise IndexError(f"row {r} is off the board")
+        row = self._rows[r]
+        if row is None:
+            start = r % 8 * 8
+            names = bb.PIECE_NAMES
+            row = self._rows[r] = tuple(names[code] for code in self.cells[start:start + 8])
+        return row
+
+    def __len__(self) -> int:
+        return 8
+
+    def __iter__(self):
+        return (self[r] for r in range(8))
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(list(self), dtype=dtype or "<U2")
+
+    def piece_at(self, sq: int) -> int:
+        """
+        The code of the piece on a square.
+
+        :param sq: The square index, row * 8 + column.
+        :return: The piece code, 0 if empty.
+        """
+
+        return self.cells[sq]
+
+    def update(self, squares: int) -> None:
+        """
+        Forgets the rows of squares whose codes have changed, how GameState keeps the strings in step.
+
+        :param squares: The bitboard of changed squares.
+        :return:
+        """
+
+        rows = self._rows
+        while squares:
+            low = squares & -squares
+            rows[(low.bit_length() - 1) >> 3] = None
+            squares ^= low
+
+    def codes(self) -> bytes:
+        """
+        The piece codes of the 64 squares.
+
+        :return: 64 bytes in row * 8 + column order.
+        """
+
+        return bytes(self.cells)
+
+    def copy(self):
+        """
+        A copy of the board with codes of its own, it doesn't follow the original.
+
+        :return: The new MailboxBoard.
+        """
+
+        board = MailboxBoard(bytearray(self.cells))
+        board._rows = self._rows[:]
+        return board
+
+    def __eq__(self, other):
+        if isinstance(other, MailboxBoard):
+            return self.cells == other.cells
+        return NotImplemented
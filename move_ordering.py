@@ -0,0 +1,264 @@
+"""
+Orders moves for the alpha-beta search, best guesses first, so cut offs come early.
+
+Moves are tried in stages:
+
+1. The hash move, the best move stored for the position or the principal variation move, before anything
+   else is scored.
+2. Captures by MVV-LVA, the most valuable victim first and the least valuable attacker among those, along with
+   promotions to a queen.
+3. The killer moves of the ply, quiet moves that caused a cut off in a sibling position.
+4. Other quiet moves by their history score, how often and how deep they have caused cut offs anywhere.
+5. Underpromotions.
+
+The moves are picked one at a time rather than sorted, so when the first move cuts off the others are never
+ordered at all. Run as a script to compare the nodes searched with each heuristic turned on in turn:
+
+    python move_ordering.py --depth 4
+"""
+# Imports
+import argparse
+import time
+
+import chess_engine
+
+# Score bands, every capture outranks every killer, which outranks every quiet move
+CAPTURE_SCORE = 1 << 30
+KILLER_SCORE = 1 << 29
+HISTORY_MAX = 1 << 20  # The history table is halved when an entry passes this
+UNDERPROMOTION_SCORE = -1
+
+KILLER_SLOTS = 2
+
+# Piece code -> how valuable it is for ordering, P=1 up to K=6 for both colours
+_RANKS = (0, 1, 2, 3, 4, 5, 6, 1, 2, 3, 4, 5, 6, 0, 0, 0)
+
+
+def _mvv_lva_table() -> tuple:
+    """
+    The capture scores, indexed by the victim and mover nibbles of Move.code, ``code >> 12 & 0xFF``.
+
+    :return: 256 scores, 0 where nothing is captured.
+    """
+    scores = [0] * 256
+    for victim in range(1, 13):
+        for mover in range(1, 13):
+            scores[victim << 4 | mover] = CAPTURE_SCORE + _RANKS[victim] * 10 - _RANKS[mover]
+    return tuple(scores)
+
+
+MVV_LVA = _mvv_lva_table()
+
+
+def _pick_best(moves: list, scores: list):
+    """
+    Yields the moves highest score first, finding the next best each time, so moves after a cut off are never
+    put in order.
+
+    :param moves: The moves, reordered in place.
+    :param scores: Their scores, reordered along with them.
+    :return: A generator of the moves.
+    """
+    pick = scores.__getitem__
+    count = len(moves)
+    for i in range(count):
+        best = max(range(i, count), key=pick)
+        if best != i:
+            moves[i], moves[best] = moves[best], moves[i]
+            scores[i], scores[best] = scores[best], scores[i]
+        yield moves[i]
+
+
+class MoveOrderer:
+    """
+    The killer and history tables, kept between positions and searches, and the move picker that uses them.
+    """
+
+    def __init__(self, captures: bool = True, killers: bool = True, history: bool = True,
+                 max_ply: int = 128):
+        """
+        Sets up empty tables, each heuristic can be turned off to measure what it is worth.
+
+        :param captures: Whether to order captures and promotions by MVV-LVA ahead of quiet moves, the
+            quiescence search orders its captures that way regardless.
+        :param killers: Whether to try the killer moves ahead of other quiet moves.
+        :param history: Whether to order quiet moves by the history table.
+        :param max_ply: The deepest ply that has killer moves.
+        """
+
+        self.captures = captures
+        self.killers = killers
+        self.history = history
+        self.max_ply = max_ply
+        self.killer_moves = [[None] * KILLER_SLOTS for _ in range(max_ply)]
+        self.history_table = [0] * 1024  # Indexed by the mover and end square nibbles, code >> 6 & 0x3FF
+
+    def clear(self) -> None:
+        """
+        Forgets every killer move and history score.
+
+        :return:
+        """
+
+        self.killer_moves = [[None] * KILLER_SLOTS for _ in range(self.max_ply)]
+        self.history_table = [0] * 1024
+
+    def new_search(self) -> None:
+        """
+        Called before each search, the killers belong to the old root so they go, the history is halved so it
+        still counts but gives way to what the new search learns.
+
+        :return:
+        """
+
+        self.killer_moves = [[None] * KILLER_SLOTS for _ in range(self.max_ply)]
+        self.history_table = [score >> 1 for score in self.history_table]
+
+    def score_moves(self, moves: list, ply: int) -> list:
+        """
+        The ordering score of each move, higher is tried first.
+
+        :param moves: The moves.
+        :param ply: The distance from the root, for the killer moves.
+        :return: The list of scores, one per move.
+        """
+
+        mvv_lva = MVV_LVA if self.captures else None
+        killers = self.killer_moves[ply] if self.killers and ply < self.max_ply else ()
+        history = self.history_table if self.history else None
+        scores = []
+        for move in moves:
+            code = move.code
+            promotion = code >> 20 & 15
+            if promotion and _RANKS[promotion] != 5:
+                score = UNDERPROMOTION_SCORE
+            elif mvv_lva is not None and (code >> 16 & 15 or promotion):
+                score = mvv_lva[code >> 12 & 0xFF] or CAPTURE_SCORE
+                if promotion:
+                    score += 50  # Past every capture that doesn't also promote
+            elif move in killers:
+                score = KILLER_SCORE + KILLER_SLOTS - killers.index(move)
+            elif history is not None:
+                score = history[code >> 6 & 0x3FF]
+            else:
+                score = 0
+            scores.append(score)
+        return scores
+
+    def ordered(self, moves: list, ply: int = 0, hash_move=None):
+        """
+        Yields the moves best first, picking the next best each time instead of sorting them all up front.
+
+        :param moves: The moves, only the hash move is moved, to the front.
+        :param ply: The distance from the root, for the killer moves.
+        :param hash_move: The move to try before all others, if it is among the moves.
+        :return: A generator of the moves.
+        """
+
+        start = 0
+        if hash_move is not None:
+            try:
+                index = moves.index(hash_move)
+            except ValueError:
+                pass
+            else:
+                moves[0], moves[index] = moves[index], moves[0]
+                yield moves[0]
+                start = 1
+
+        remaining = moves[start:]
+        yield from _pick_best(remaining, self.score_moves(remaining, ply))
+
+    def ordered_captures(self, captures: list):
+        """
+        Yields captures by MVV-LVA whatever the settings, without it the quiescence search explodes.
+
+        :param captures: The captures, reordered in place as they are picked.
+        :return: A generator of the moves.
+        """
+
+        yield from _pick_best(captures, [MVV_LVA[move.code >> 12 & 0xFF] for move in captures])
+
+    def record_cutoff(self, move, ply: int, depth: int) -> None:
+        """
+        Remembers a quiet move that caused a beta cut off, as a killer of its ply and in the history table.
+
+        :param move: The move.
+        :param ply: The distance from the root.
+        :param depth: The remaining depth where it cut off, deeper cut offs count for more.
+        :return:
+        """
+
+        code = move.code
+        if code >> 16 & 15 or code >> 20 & 15:
+            return  # Captures and promotions are ordered well enough already
+        if ply < self.max_ply:
+            killers = self.killer_moves[ply]
+            if killers[0] != move:
+                killers.pop()
+                killers.insert(0, move)
+        history = self.history_table
+        index = code >> 6 & 0x3FF
+        history[index] += depth * depth
+        if history[index] > HISTORY_MAX:
+            self.history_table = [score >> 1 for score in history]
+
+
+# The heuristics added one at a time by the benchmark
+CONFIGURATIONS = (
+    ("hash move", dict(captures=False, killers=False, history=False)),
+    ("+ MVV-LVA", dict(captures=True, killers=False, history=False)),
+    ("+ killers", dict(captures=True, killers=True, history=False)),
+    ("+ history", dict(captures=True, killers=True, history=True)),
+)
+
+BENCHMARK_POSITIONS = (
+    chess_engine.STARTING_FEN,
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r2q1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP3PPP/R2QKB1R w KQ - 0 9",
+)
+
+
+def benchmark(depth: int = 4, positions=BENCHMARK_POSITIONS, hash_mb: float = 4) -> list:
+    """
+    Searches the positions to a fixed depth with each configuration, fewer nodes means better ordering.
+
+    :param depth: The search depth.
+    :param positions: The FENs to search.
+    :param hash_mb: The transposition table size, a fresh table for each search.
+    :return: A list of dictionaries with the configuration name, total nodes and seconds.
+    """
+    import search  # The searcher imports this module
+
+    results = []
+    for name, options in CONFIGURATIONS:
+        nodes = 0
+        start = time.perf_counter()
+        for fen in positions:
+            searcher = search.Searcher(max_depth=depth, hash_mb=hash_mb, orderer=MoveOrderer(**options))
+            nodes += searcher.search(chess_engine.GameState.from_fen(fen, board_backend="mailbox")).nodes
+        results.append({"name": name, "nodes": nodes, "seconds": time.perf_counter() - start})
+    return results
+
+
+def main() -> None:
+    """
+    The command line interface.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Compare the nodes searched with each move ordering heuristic.")
+    parser.add_argument("--depth", type=int, default=4, help="the fixed search depth")
+    args = parser.parse_args()
+
+    results = benchmark(args.depth)
+    baseline = results[0]["nodes"]
+    for result in results:
+        print(f"{result['name']:<10} {result['nodes']:>9} nodes  {result['nodes'] / baseline:6.1%}  "
+              f"{result['seconds']:7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
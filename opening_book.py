@@ -0,0 +1,231 @@
+"""
+An opening book, moves for the positions near the start of a game that don't need searching.
+
+The book is a file of 16 byte entries sorted by position key, laid out like a Polyglot book, big-endian:
+
+    key     8 bytes  the position's Zobrist key
+    move    2 bytes  to file, to rank, from file, from rank (3 bits each from the low end), promotion piece
+    weight  2 bytes  how good the move is, higher is played more often
+    learn   4 bytes  unused, 0
+
+Ranks count up from white's side and castling is written as the king capturing its own rook, as in Polyglot.
+The keys are this project's Zobrist keys rather than Polyglot's, so books must be built with ``build_book``.
+The file is memory-mapped and binary searched, so only the pages a lookup touches are read.
+
+    python opening_book.py build games.pgn book.bin --max-ply 16
+    python opening_book.py probe book.bin --fen "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+"""
+# Imports
+import argparse
+import mmap
+import random
+import struct
+
+import bitboard as bb
+import chess_engine
+import pgn
+
+ENTRY = struct.Struct(">QHHI")
+_KEY = struct.Struct(">Q")
+
+MAX_WEIGHT = 0xFFFF
+
+# Promotion piece code -> the 3 bit promotion field, and the weight each result gives the winner's moves
+_PROMOTIONS = {bb.WN: 1, bb.WB: 2, bb.WR: 3, bb.WQ: 4, bb.BN: 1, bb.BB: 2, bb.BR: 3, bb.BQ: 4}
+_RESULT_WEIGHTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}  # (white's moves, black's moves)
+
+
+def encode_move(move) -> int:
+    """
+    Packs a move into the 16 bit book format.
+
+    :param move: The move.
+    :return: The book move.
+    """
+    code = move.code
+    start_sq = code & 63
+    end_sq = code >> 6 & 63
+    if code & chess_engine.CASTLE_FLAG:
+        end_sq = (end_sq & 56) | (7 if end_sq & 7 == 6 else 0)  # The king takes its rook
+    promotion = _PROMOTIONS.get(code >> 20 & 15, 0)
+    return ((end_sq & 7) | (7 - (end_sq >> 3)) << 3 | (start_sq & 7) << 6 | (7 - (start_sq >> 3)) << 9
+            | promotion << 12)
+
+
+class OpeningBook:
+    """
+    A book file, memory-mapped for lookups.
+    """
+
+    def __init__(self, path: str, seed: int = None):
+        """
+        Opens the book.
+
+        :param path: The book file.
+        :param seed: Seeds the choice between weighted moves, for repeatable games.
+        """
+
+        self.path = path
+        self.random = random.Random(seed)
+        self._file = open(path, "rb")
+        size = self._file.seek(0, 2)
+        # An empty file can't be mapped, and an empty book needs nothing to search
+        self._mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._count = size // ENTRY.size
+
+    def close(self) -> None:
+        """
+        Unmaps and closes the file.
+
+        :return:
+        """
+
+        if isinstance(self._mapped, mmap.mmap):
+            self._mapped.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def entries(self, key: int) -> list:
+        """
+        The entries for a position, found by binary search.
+
+        :param key: The Zobrist key.
+        :return: A list of (book move, weight, learn) tuples in file order.
+        """
+
+        mapped = self._mapped
+        low, high = 0, self._count
+        while low < high:  # The first entry with a key not below the one wanted
+            middle = (low + high) >> 1
+            if _KEY.unpack_from(mapped, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        for index in range(low, self._count):
+            entry_key, move, weight, learn = ENTRY.unpack_from(mapped, index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((move, weight, learn))
+        return found
+
+    def moves(self, gs) -> list:
+        """
+        The book moves for a position that are legal in it.
+
+        :param gs: The game state.
+        :return: A list of (Move, weight) tuples, heaviest first.
+        """
+
+        entries = self.entries(gs.zobrist_key)
+        if not entries:
+            return []
+        legal = {encode_move(move): move for move in gs.valid_moves()}
+        moves = [(legal[move], weight) for move, weight, _ in entries if move in legal]
+        moves.sort(key=lambda entry: entry[1], reverse=True)
+        return moves
+
+    def choose(self, gs, best: bool = False):
+        """
+        Picks a book move, at random in proportion to the weights.
+
+        :param gs: The game state.
+        :param best: Always take the heaviest move instead.
+        :return: The Move, or None if the position is out of book.
+        """
+
+        moves = [(move, weight) for move, weight in self.moves(gs) if weight > 0]
+        if not moves:
+            return None
+        if best:
+            return moves[0][0]
+        return self.random.choices([move for move, _ in moves], [weight for _, weight in moves])[0]
+
+
+def build_book(games, path: str, max_ply: int = 16, min_games: int = 1) -> dict:
+    """
+    Compiles games into a book file, a move is weighted 2 for each win and 1 for each draw it was played in.
+
+    :param games: A PGN path, or an iterable of Games such as ``pgn.read_games`` gives.
+    :param path: The book file to write.
+    :param max_ply: How many plies of each game go into the book.
+    :param min_games: Moves played in fewer games than this are left out.
+    :return: A dictionary with the games read, games skipped as unreadable and entries written.
+    """
+    if isinstance(games, str):
+        games = pgn.read_games(games)
+    counts = {}  # (key, book move) -> [games, weight]
+    read = skipped = 0
+    for game in games:
+        read += 1
+        weights = _RESULT_WEIGHTS.get(game.result, (0, 0))
+        played = []  # Counted once the whole opening has replayed, a broken game adds nothing
+        try:
+            gs = chess_engine.GameState.from_fen(game.fen, board_backend="mailbox")
+            for san in game.moves[:max_ply]:
+                move = pgn.san_to_move(gs, san)
+                played.append((gs.zobrist_key, encode_move(move), weights[0 if gs.white_to_move else 1]))
+                gs.make_move(move)
+        except ValueError:  # A malformed FEN tag or an illegal move
+            skipped += 1
+            continue
+        for key, move, weight in played:
+            entry = counts.setdefault((key, move), [0, 0])
+            entry[0] += 1
+            entry[1] += weight
+
+    entries = [(key, move, weight) for (key, move), (played, weight) in counts.items()
+               if played >= min_games and weight > 0]
+    heaviest = max((weight for _, _, weight in entries), default=0)
+    scale = MAX_WEIGHT / heaviest if heaviest > MAX_WEIGHT else 1
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(path, "wb") as file:
+        for key, move, weight in entries:
+            file.write(ENTRY.pack(key, move, max(1, int(weight * scale)), 0))
+    return {"games": read, "skipped": skipped, "entries": len(entries)}
+
+
+def main() -> None:
+    """
+    The command line interface.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Build or look up an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a book from PGN games")
+    build.add_argument("pgn", help="the PGN file")
+    build.add_argument("book", help="the book file to write")
+    build.add_argument("--max-ply", type=int, default=16, help="plies of each game to include")
+    build.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games")
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("book", help="the book file")
+    probe.add_argument("--fen", default=chess_engine.STARTING_FEN, help="the position")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        stats = build_book(args.pgn, args.book, args.max_ply, args.min_games)
+        print(f"{stats['games']} games, {stats['skipped']} skipped, {stats['entries']} entries")
+        return
+
+    gs = chess_engine.GameState.from_fen(args.fen, board_backend="mailbox")
+    with OpeningBook(args.book) as book:
+        moves = book.moves(gs)
+        total = sum(weight for _, weight in moves)
+        for move, weight in moves:
+            print(f"{pgn.move_to_san(gs, move):<8} {weight:>6} {weight / total:6.1%}")
+        if not moves:
+            print("out of book")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Spreads work over worker processes in chunks, for jobs over more items than fit in memory.
+
+``Executor.map`` submits every item up front, so it reads the whole input before the first result comes back.
+``map_chunks`` reads the input lazily and keeps only a couple of chunks per worker in flight. When ordered, the
+chunks finished early but waiting on a slow one count too, so a slow chunk stops the reading rather than letting
+results pile up behind it.
+"""
+# Imports
+import concurrent.futures
+import itertools
+import os
+
+
+def map_chunks(function, items, workers: int = None, chunk_size: int = 16, ordered: bool = True,
+               initializer=None, initargs: tuple = (), args: tuple = ()):
+    """
+    Calls function on chunks of the items in worker processes, yielding the results one item at a time.
+
+    :param function: A picklable function taking a list of items, then args, and returning a list of results.
+    :param items: An iterable of picklable items, read as chunks are sent out.
+    :param workers: The number of worker processes, defaults to the CPU count.
+    :param chunk_size: The number of items sent to a worker at a time.
+    :param ordered: Whether to yield results in input order, otherwise they come as soon as their chunk finishes.
+    :param initializer: Called once in each worker process when it starts.
+    :param initargs: The arguments for the initializer.
+    :param args: Extra arguments passed to function after the chunk.
+    :return: A generator of results.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = workers * 2  # Chunks sent out and not yet yielded
+    items = iter(items)
+    chunks = iter(lambda: list(itertools.islice(items, chunk_size)), [])
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as pool:
+        pending = {}  # future -> chunk number
+        finished = {}  # chunk number -> results, held back until the earlier chunks are out when ordered
+        next_chunk = 0
+        submitted = 0
+        exhausted = False
+
+        def fill():
+            nonlocal submitted, exhausted
+            while not exhausted and (submitted - next_chunk if ordered else len(pending)) < window:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending[pool.submit(function, chunk, *args)] = submitted
+                    submitted += 1
+
+        fill()
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            if ordered:
+                for future in done:
+                    finished[pending.pop(future)] = future.result()
+                while next_chunk in finished:
+                    yield from finished.pop(next_chunk)
+                    next_chunk += 1
+                fill()
+            else:
+                for future in done:
+                    del pending[future]
+                fill()
+                for future in done:
+                    yield from future.result()
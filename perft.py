@@ -0,0 +1,153 @@
+"""
+Perft, counting the leaf nodes of the move tree to a fixed depth.
+
+The counts for well known positions are published, so any difference points to a bug in the move generator,
+and the time taken is a benchmark of move generation speed. Run as a script for divide output or benchmarks:
+
+    python perft.py --depth 4
+    python perft.py --position "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -" --depth 3 --divide
+    python perft.py --bench --depth 3
+    python perft.py --depth 3 --profile
+"""
+# Imports
+import argparse
+import time
+
+import chess_engine
+import profiling
+
+STARTING_FEN = chess_engine.STARTING_FEN
+
+# (name, FEN, {depth: leaf nodes})
+REFERENCE_POSITIONS = [
+    ("start", STARTING_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("enpassant pin", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {1: 15, 2: 126, 3: 1928, 4: 13931}),
+    ("avoid illegal enpassant", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {1: 18, 2: 92, 3: 1670, 4: 10138}),
+    ("discovered check", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {1: 37, 2: 183, 3: 6559, 4: 23527}),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", {1: 2, 2: 6, 3: 13, 4: 63}),
+    ("enpassant by bishop", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {1: 13, 2: 102, 3: 1266, 4: 10276}),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", {1: 44, 2: 1486, 3: 62379}),
+    ("promotions", "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1", {1: 24, 2: 496, 3: 9483, 4: 182838}),
+    ("castling through check", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {1: 44, 2: 1494, 3: 50509}),
+]
+
+
+def perft(gs, depth: int) -> int:
+    """
+    Counts the positions reachable in exactly depth moves.
+
+    :param gs: The game state, returned to the same position afterwards.
+    :param depth: The number of plies to look ahead.
+    :return: The number of leaf nodes.
+    """
+    if depth <= 0:
+        return 1
+    moves = gs.valid_moves()
+    if depth == 1:
+        return len(moves)  # Bulk count the last ply instead of making each move
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_move()
+    return nodes
+
+
+def divide(gs, depth: int) -> dict:
+    """
+    Perft split by the first move, for narrowing down which move a wrong count comes from.
+
+    :param gs: The game state.
+    :param depth: The number of plies to look ahead, including the first move.
+    :return: A dictionary from move notation to its leaf nodes.
+    """
+    counts = {}
+    for move in gs.valid_moves():
+        gs.make_move(move)
+        counts[move.get_chess_notation()] = perft(gs, depth - 1)
+        gs.undo_move()
+    return counts
+
+
+def benchmark(positions=None, max_depth: int = None) -> list:
+    """
+    Times perft on each reference position at each depth.
+
+    :param positions: The (name, FEN, counts) positions to run, defaults to REFERENCE_POSITIONS.
+    :param max_depth: The deepest depth to run, defaults to every depth with a known count.
+    :return: A list of dictionaries with name, depth, nodes, expected, seconds and nps.
+    """
+    results = []
+    for name, fen, counts in positions or REFERENCE_POSITIONS:
+        gs = chess_engine.GameState.from_fen(fen, board_backend="mailbox")
+        for depth in sorted(counts):
+            if max_depth is not None and depth > max_depth:
+                break
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            seconds = time.perf_counter() - start
+            results.append({
+                "name": name,
+                "depth": depth,
+                "nodes": nodes,
+                "expected": counts[depth],
+                "seconds": seconds,
+                "nps": int(nodes / seconds) if seconds > 0 else 0,
+            })
+    return results
+
+
+def main() -> None:
+    """
+    The command line interface.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Count or benchmark the move generator with perft.")
+    parser.add_argument("--position", default=STARTING_FEN, help="FEN of the position to count")
+    parser.add_argument("--depth", type=int, default=3, help="plies to count to")
+    parser.add_argument("--divide", action="store_true", help="split the count by first move")
+    parser.add_argument("--bench", action="store_true", help="run every reference position up to --depth")
+    parser.add_argument("--profile", action="store_true", help="print call counts and times of the hot methods")
+    args = parser.parse_args()
+
+    if args.bench:
+        total_nodes = total_seconds = 0
+        failed = False
+        for result in benchmark(max_depth=args.depth):
+            status = "ok" if result["nodes"] == result["expected"] else f"FAIL expected {result['expected']}"
+            failed = failed or status != "ok"
+            print(f"{result['name']:<24} depth {result['depth']}  {result['nodes']:>10} nodes  "
+                  f"{result['seconds']:8.3f}s  {result['nps']:>9} nps  {status}")
+            total_nodes += result["nodes"]
+            total_seconds += result["seconds"]
+        print(f"total {total_nodes} nodes in {total_seconds:.3f}s, {int(total_nodes / total_seconds)} nps")
+        raise SystemExit(1 if failed else 0)
+
+    gs = chess_engine.GameState.from_fen(args.position, board_backend="mailbox")
+    profiler = profiling.Profiler()
+    if args.profile:
+        profiler.attach(gs)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(gs, args.depth)
+        for notation, nodes in sorted(counts.items()):
+            print(f"{notation}: {nodes}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(gs, args.depth)
+    seconds = time.perf_counter() - start
+    print(f"nodes {nodes}  time {seconds:.3f}s  nps {int(nodes / seconds) if seconds > 0 else 0}")
+    if args.profile:
+        profiler.detach(gs)
+        print(profiler.to_json(indent=2))
+
+
+if __name__ == "__main__":
+    main()
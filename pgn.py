@@ -0,0 +1,470 @@
+"""
+Reads and writes games in PGN, and replays whole archives of them to check every move is legal.
+
+Files are streamed one game at a time, optionally through a memory map, so an archive never has to fit in
+memory. Moves are read and written in SAN (standard algebraic notation, like Nf3, exd5 or e8=Q+) against the
+legal moves of a GameState. Replaying sends the raw text of each game to worker processes, so the parsing is
+spread over every core too. Run as a script to replay a file:
+
+    python pgn.py games.pgn --workers 4 --mmap
+"""
+# Imports
+import argparse
+import mmap
+import re
+import time
+
+import bitboard as bb
+import chess_engine
+import parallel
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+# The Seven Tag Roster, written first and in this order
+ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+
+_HEADER = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(r"\{[^}]*\}?|;[^\n]*|\(|\)|\$\d+|\d+\.+|[^\s(){};]+")
+_SAN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?$")
+_COORDINATES = re.compile(r"^([a-h][1-8])([a-h][1-8])([nbrq])?$")
+
+
+class Game:
+    """
+    A game read from or to be written to PGN.
+    """
+
+    def __init__(self, headers: dict = None, moves: list = None, result: str = "*"):
+        """
+        Stores the game.
+
+        :param headers: The tag pairs, like {"White": "Carlsen"}, in the order they are written.
+        :param moves: The moves in SAN.
+        :param result: The game result, one of RESULTS.
+        """
+
+        self.headers = dict(headers or {})
+        self.moves = list(moves or [])
+        self.result = result
+
+    def __repr__(self):
+        return f"Game({self.headers.get('White', '?')} - {self.headers.get('Black', '?')}, " \
+               f"{len(self.moves)} plies, {self.result})"
+
+    @property
+    def fen(self) -> str:
+        """
+        The position the game starts from.
+
+        :return: The FEN header, or the normal starting position.
+        """
+
+        return self.headers.get("FEN", chess_engine.STARTING_FEN)
+
+    def replay(self, board_backend: str = "mailbox"):
+        """
+        Plays the moves out on a new game state, checking each is legal.
+
+        :param board_backend: The board backend of the game state.
+        :return: The GameState after the last move.
+        :raises ValueError: If a move is illegal, ambiguous or unreadable, naming the ply.
+        """
+
+        gs = chess_engine.GameState.from_fen(self.fen, board_backend=board_backend)
+        for ply, san in enumerate(self.moves):
+            try:
+                gs.make_move(san_to_move(gs, san))
+            except ValueError as error:
+                raise ValueError(f"ply {ply + 1}: {error}") from None
+        return gs
+
+    def to_pgn(self) -> str:
+        """
+        Writes the game as PGN text, the roster tags first and the movetext wrapped at 80 columns.
+
+        :return: The PGN text, ending with a blank line.
+        """
+
+        headers = {tag: "?" for tag in ROSTER}
+        headers["Date"] = "????.??.??"
+        headers.update(self.headers)
+        headers["Result"] = self.result
+        lines = [f'[{tag} "{_escape(value)}"]' for tag, value in headers.items()]
+        lines.append("")
+
+        fields = self.fen.split()
+        number = int(fields[5]) if len(fields) > 5 else 1
+        white = len(fields) < 2 or fields[1] == "w"
+        words = []
+        for i, san in enumerate(self.moves):
+            if white:
+                words.append(f"{number}.")
+            elif i == 0:
+                words.append(f"{number}...")
+            words.append(san)
+            if not white:
+                number += 1
+            white = not white
+        words.append(self.result)
+
+        line = ""
+        for word in words:
+            if line and len(line) + 1 + len(word) > 80:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        return "\n".join(lines) + "\n\n"
+
+
+def _escape(value: str) -> str:
+    """
+    Escapes a header value for writing between quotes.
+
+    :param value: The value.
+    :return: The escaped value.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def move_to_san(gs, move, legal_moves: list = None) -> str:
+    """
+    Writes a move in SAN, with just enough of the start square to tell it apart and a + or # for check or mate.
+
+    :param gs: The game state before the move, it is returned to the same position.
+    :param move: The move, one of gs.valid_moves().
+    :param legal_moves: The legal moves of gs if already known, saves generating them again.
+    :return: The SAN string.
+    """
+    code = move.code
+    start_sq = code & 63
+    end_sq = code >> 6 & 63
+    moved = code >> 12 & 15
+    kind = bb.PIECE_NAMES[moved][1]
+    if code & chess_engine.CASTLE_FLAG:
+        san = "O-O" if end_sq & 7 == 6 else "O-O-O"
+    else:
+        target = move.get_rank_file(end_sq >> 3, end_sq & 7)
+        capture = "x" if code >> 16 & 15 else ""
+        if kind == "P":
+            san = (chess_engine.Move.cols_to_files[start_sq & 7] + capture if capture else "") + target
+            promotion = code >> 20 & 15
+            if promotion:
+                san += "=" + bb.PIECE_NAMES[promotion][1]
+        else:
+            # Another piece of the same kind that can reach the same square needs the start file, rank or both
+            if legal_moves is None:
+                legal_moves = gs.valid_moves()
+            rivals = [other.code & 63 for other in legal_moves
+                      if other.code >> 6 & 63 == end_sq and other.code >> 12 & 15 == moved
+                      and other.code & 63 != start_sq]
+            start = move.get_rank_file(start_sq >> 3, start_sq & 7)
+            if not rivals:
+                prefix = ""
+            elif all(sq & 7 != start_sq & 7 for sq in rivals):
+                prefix = start[0]
+            elif all(sq >> 3 != start_sq >> 3 for sq in rivals):
+                prefix = start[1]
+            else:
+                prefix = start
+            san = kind + prefix + capture + target
+
+    gs.make_move(move)
+    try:
+        if gs.in_check():
+            san += "+" if gs.has_any_legal_move() else "#"
+    finally:
+        gs.undo_move()
+    return san
+
+
+def san_to_move(gs, san: str, legal_moves: list = None):
+    """
+    Finds the legal move a SAN string means, coordinate notation like e2e4 or e7e8q is accepted too.
+
+    :param gs: The game state before the move.
+    :param san: The move text, check marks and annotations like ! or ? are ignored.
+    :param legal_moves: The legal moves of gs if already known.
+    :return: The Move from legal_moves.
+    :raises ValueError: If the text matches no legal move, or more than one.
+    """
+    if legal_moves is None:
+        legal_moves = gs.valid_moves()
+    text = san.rstrip("+#!?")
+
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        column = 6 if len(text) == 3 else 2
+        candidates = [move for move in legal_moves
+                      if move.code & chess_engine.CASTLE_FLAG and move.code >> 6 & 7 == column]
+    elif _COORDINATES.match(text):
+        if len(text) == 4:
+            text += "q"  # A promotion without a piece is to a queen, any other move just won't match with it
+        candidates = [move for move in legal_moves if move.get_chess_notation() in (text, text[:4])]
+    else:
+        match = _SAN.match(text)
+        if match is None:
+            raise ValueError(f"Can't read move {san!r}")
+        kind, from_file, from_rank, target, promotion = match.groups()
+        kind = kind or "P"
+        end_sq = bb.square(chess_engine.Move.ranks_to_rows[target[1]], chess_engine.Move.files_to_cols[target[0]])
+        candidates = []
+        for move in legal_moves:
+            code = move.code
+            if code >> 6 & 63 != end_sq or bb.PIECE_NAMES[code >> 12 & 15][1] != kind:
+                continue
+            start_sq = code & 63
+            if from_file and chess_engine.Move.files_to_cols[from_file] != start_sq & 7:
+                continue
+            if from_rank and chess_engine.Move.ranks_to_rows[from_rank] != start_sq >> 3:
+                continue
+            move_promotion = code >> 20 & 15
+            if move_promotion and bb.PIECE_NAMES[move_promotion][1] != (promotion or "Q").upper():
+                continue
+            if code & chess_engine.CASTLE_FLAG:
+                continue  # Castling is only written as O-O or O-O-O
+            candidates.append(move)
+
+    if len(candidates) != 1:
+        raise ValueError(f"{'Ambiguous' if candidates else 'Illegal'} move {san!r} in {gs.to_fen()}")
+    return candidates[0]
+
+
+def _lines(source, use_mmap: bool = False):
+    """
+    The lines of a PGN source.
+
+    :param source: A path, or an iterable of lines such as an open file.
+    :param use_mmap: Read a path through a memory map, the operating system then pages the file in as needed.
+    :return: A generator of lines.
+    """
+    if not isinstance(source, str):
+        yield from source
+        return
+    if use_mmap:
+        with open(source, "rb") as file:
+            if not file.seek(0, 2):
+                return  # An empty file can't be mapped
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for line in iter(mapped.readline, b""):
+                    yield line.decode("utf-8", "replace")
+        return
+    with open(source, encoding="utf-8", errors="replace") as file:
+        yield from file
+
+
+def iter_game_texts(source, use_mmap: bool = False):
+    """
+    Splits a PGN source into the raw text of each game, without parsing the moves.
+
+    A game ends with its result, or where the next game's tag pairs begin if the result is missing.
+
+    :param source: A path, or an iterable of lines.
+    :param use_mmap: Read a path through a memory map.
+    :return: A generator of game texts.
+    """
+    lines = []
+    in_movetext = False
+    comment_depth = 0  # Open braces, a comment can run over lines and have a line starting with [ inside it
+    for line in _lines(source, use_mmap):
+        stripped = line.strip()
+        if not comment_depth and in_movetext and stripped.startswith("["):
+            yield "".join(lines)
+            lines = []
+            in_movetext = False
+        lines.append(line if line.endswith("\n") else line + "\n")
+        if comment_depth or stripped and not stripped.startswith("["):
+            in_movetext = True
+            comment_depth = max(0, comment_depth + stripped.count("{") - stripped.count("}"))
+            words = stripped.split()
+            if not comment_depth and words and words[-1] in RESULTS:
+                yield "".join(lines)
+                lines = []
+                in_movetext = False
+    if any(line.strip() for line in lines):
+        yield "".join(lines)
+
+
+def parse_game(text: str) -> Game:
+    """
+    Reads one game's PGN text, skipping comments, variations and annotation glyphs.
+
+    :param text: The text of a single game.
+    :return: The Game.
+    """
+    headers = {}
+    movetext = []
+    for line in text.splitlines():
+        match = _HEADER.match(line.strip()) if not movetext else None
+        if match:
+            headers[match.group(1)] = re.sub(r"\\(.)", r"\1", match.group(2))
+        elif line.strip() and not line.startswith("%"):
+            movetext.append(line)
+
+    moves = []
+    result = headers.get("Result", "*")
+    depth = 0  # Variation nesting
+    for token in _TOKEN.findall("\n".join(movetext)):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(0, depth - 1)
+        elif depth or token[0] in "{;$" or token[0].isdigit() and token.endswith("."):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return Game(headers, moves, result)
+
+
+def read_games(source, use_mmap: bool = False):
+    """
+    Streams the games of a PGN source one at a time.
+
+    :param source: A path, or an iterable of lines such as an open file.
+    :param use_mmap: Read a path through a memory map.
+    :return: A generator of Games.
+    """
+    for text in iter_game_texts(source, use_mmap):
+        yield parse_game(text)
+
+
+def game_from_gamestate(gs, headers: dict = None, result: str = None) -> Game:
+    """
+    Builds a Game from a game state's movelog, working out the SAN of each move.
+
+    :param gs: The game state, its moves are taken back and replayed so it ends where it started.
+    :param headers: Tag pairs to add.
+    :param result: The result, worked out from checkmate or stalemate if not given.
+    :return: The Game, with a FEN header if it did not start from the normal starting position.
+    """
+    played = list(gs.movelog)
+    for _ in played:
+        gs.undo_move()
+    start_fen = gs.to_fen()
+    sans = []
+    for move in played:
+        sans.append(move_to_san(gs, move))
+        gs.make_move(move)
+
+    if result is None:
+        if gs.is_checkmate():
+            result = "0-1" if gs.white_to_move else "1-0"
+        elif gs.is_stalemate():
+            result = "1/2-1/2"
+        else:
+            result = "*"
+    headers = dict(headers or {})
+    if start_fen != chess_engine.STARTING_FEN:
+        headers.setdefault("SetUp", "1")
+        headers.setdefault("FEN", start_fen)
+    return Game(headers, sans, result)
+
+
+def write_games(games, destination) -> int:
+    """
+    Writes games as PGN.
+
+    :param games: An iterable of Games.
+    :param destination: A path, or an open text file to write to.
+    :return: The number of games written.
+    """
+    if isinstance(destination, str):
+        with open(destination, "w", encoding="utf-8") as file:
+            return write_games(games, file)
+    count = 0
+    for game in games:
+        destination.write(game.to_pgn())
+        count += 1
+    return count
+
+
+def replay_game(text: str) -> tuple:
+    """
+    Parses and replays one game, a malformed FEN tag counts as an invalid game like an illegal move.
+
+    :param text: The game's PGN text.
+    :return: A (plies, error) tuple, error is None if the start position and every move were legal.
+    """
+    try:
+        game = parse_game(text)
+        game.replay()
+    except ValueError as error:
+        return 0, str(error)
+    return len(game.moves), None
+
+
+def _replay_chunk(texts: list) -> list:
+    """
+    Replays a chunk of games in a worker process.
+
+    :param texts: The games' PGN texts.
+    :return: A list of (plies, error) tuples.
+    """
+    return [replay_game(text) for text in texts]
+
+
+def replay_games(source, workers: int = None, chunk_size: int = 64, use_mmap: bool = False) -> dict:
+    """
+    Replays every game of a PGN source across worker processes, checking all the moves are legal.
+
+    :param source: A path, or an iterable of lines.
+    :param workers: The number of worker processes, defaults to the CPU count. 0 replays in this process.
+    :param chunk_size: The number of games sent to a worker at a time.
+    :param use_mmap: Read a path through a memory map.
+    :return: A dictionary of games, valid, invalid, plies, seconds, games_per_second, plies_per_second and
+        errors, a list of (game index, message) for the games with an illegal move.
+    """
+    start = time.perf_counter()
+    texts = iter_game_texts(source, use_mmap)
+    if workers == 0:
+        results = map(replay_game, texts)
+    else:
+        results = parallel.map_chunks(_replay_chunk, texts, workers, chunk_size)
+
+    games = plies = 0
+    errors = []
+    for index, (game_plies, error) in enumerate(results):
+        games += 1
+        plies += game_plies
+        if error is not None:
+            errors.append((index, error))
+    seconds = time.perf_counter() - start
+    return {
+        "games": games,
+        "valid": games - len(errors),
+        "invalid": len(errors),
+        "plies": plies,
+        "seconds": seconds,
+        "games_per_second": games / seconds if seconds > 0 else 0.0,
+        "plies_per_second": plies / seconds if seconds > 0 else 0.0,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    """
+    The command line interface, replays a PGN file and reports any illegal games and the throughput.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Replay a PGN file, checking every move is legal.")
+    parser.add_argument("path", help="the PGN file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=64, help="games sent to a worker at a time")
+    parser.add_argument("--mmap", action="store_true", help="read the file through a memory map")
+    args = parser.parse_args()
+
+    stats = replay_games(args.path, args.workers, args.chunk_size, args.mmap)
+    for index, error in stats["errors"]:
+        print(f"game {index + 1}: {error}")
+    print(f"{stats['games']} games, {stats['valid']} valid, {stats['invalid']} invalid, {stats['plies']} plies "
+          f"in {stats['seconds']:.2f}s, {stats['games_per_second']:.1f} games/s, "
+          f"{stats['plies_per_second']:.0f} plies/s")
+    raise SystemExit(1 if stats["invalid"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Counts and times the hot methods of a GameState, without an external profiler.
+
+Attaching a Profiler to a game state replaces its methods on that one instance with timing wrappers, and
+detaching puts the originals back, so nothing at all is added to the hot paths while profiling is off. Times are
+inclusive: valid_moves includes the _legal_moves generator it drains, which includes the _update_move_cache and
+_add_moves calls it makes, and all_moves includes the piece generators like knight_move. A generator counts one call when it is created and is timed while it runs, not while
+its caller has it paused. Move allocations are counted for every game state while any profiler is attached.
+
+    profiler = profiling.Profiler()
+    with profiler.attached(gs):
+        perft.perft(gs, 4)
+    print(profiler.to_json())
+"""
+# Imports
+import contextlib
+import json
+import time
+
+import chess_engine
+
+# The GameState methods that are counted and timed. Legal move generation goes through _legal_moves and the
+# move cache, the piece functions like knight_move are reached from all_moves and the verify_incremental check.
+INSTRUMENTED = ("all_moves", "valid_moves", "_legal_moves", "_update_move_cache", "_add_moves", "_add_enpassant",
+                "_castle_moves", "in_check", "square_attacked", "make_move", "undo_move",
+                "pawn_move", "rook_move", "knight_move", "bishop_move", "queen_move", "king_move")
+# The instrumented methods that return generators
+GENERATORS = ("_legal_moves",)
+
+# The profilers counting Move allocations, and the originals that are swapped back in when none are left
+_allocation_profilers = []
+_original_new_move = chess_engine._new_move
+_original_move_init = chess_engine.Move.__init__
+
+
+def _counting_new_move(cls):
+    """
+    Stands in for chess_engine._new_move while profiling, counting each move the generators build.
+
+    :param cls: The Move class.
+    :return: The new, uninitialised move.
+    """
+    for profiler in _allocation_profilers:
+        profiler.calls["Move"] += 1
+    return object.__new__(cls)
+
+
+def _counting_move_init(self, *args, **kwargs):
+    """
+    Stands in for Move.__init__ while profiling, counting moves built from board squares.
+
+    :return:
+    """
+    for profiler in _allocation_profilers:
+        profiler.calls["Move"] += 1
+    _original_move_init(self, *args, **kwargs)
+
+
+class Profiler:
+    """
+    Call counts and times for the instrumented methods of the game states it is attached to.
+    """
+
+    def __init__(self):
+        """
+        Starts with every counter at zero.
+        """
+
+        self.calls = dict.fromkeys(INSTRUMENTED + ("Move",), 0)
+        self.nanoseconds = dict.fromkeys(INSTRUMENTED, 0)
+        self._attached = []  # The game states, to detach from
+
+    def _wrap(self, name: str, method):
+        """
+        A wrapper that counts and times calls to a bound method.
+
+        :param name: The counter name.
+        :param method: The bound method.
+        :return: The wrapper.
+        """
+
+        calls = self.calls
+        nanoseconds = self.nanoseconds
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                nanoseconds[name] += clock() - start
+                calls[name] += 1
+
+        timed.__wrapped__ = method
+        return timed
+
+    def _wrap_generator(self, name: str, method):
+        """
+        A wrapper that counts calls to a bound generator method and times the generator as it runs.
+
+        :param name: The counter name.
+        :param method: The bound method.
+        :return: The wrapper.
+        """
+
+        calls = self.calls
+        nanoseconds = self.nanoseconds
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            calls[name] += 1
+            generator = method(*args, **kwargs)
+            try:
+                while True:
+                    start = clock()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        nanoseconds[name] += clock() - start
+                    yield item
+            finally:
+                generator.close()  # Left early, like has_any_legal_move does
+
+        timed.__wrapped__ = method
+        return timed
+
+    def attach(self, gs) -> None:
+        """
+        Starts counting the game state's calls.
+
+        :param gs: The game state.
+        :return:
+        """
+
+        if any(attached is gs for attached in self._attached):
+            return
+        for name in INSTRUMENTED:
+            wrap = self._wrap_generator if name in GENERATORS else self._wrap
+            setattr(gs, name, wrap(name, getattr(gs, name)))
+        # The piece generators are also reached through move_functions
+        gs.move_functions = {letter: getattr(gs, function.__name__) for letter, function in gs.move_functions.items()}
+        self._attached.append(gs)
+
+        if not _allocation_profilers:
+            chess_engine._new_move = _counting_new_move
+            chess_engine.Move.__init__ = _counting_move_init
+        if self not in _allocation_profilers:
+            _allocation_profilers.append(self)
+
+    def detach(self, gs=None) -> None:
+        """
+        Stops counting, the game state's own methods are put back.
+
+        :param gs: The game state, or None for every attached game state.
+        :return:
+        """
+
+        for attached in [attached for attached in self._attached if gs is None or attached is gs]:
+            for name in INSTRUMENTED:
+                vars(attached).pop(name, None)
+            attached.move_functions = {letter: getattr(attached, function.__wrapped__.__name__)
+                                       for letter, function in attached.move_functions.items()}
+            self._attached.remove(attached)
+
+        if not self._attached and self in _allocation_profilers:
+            _allocation_profilers.remove(self)
+            if not _allocation_profilers:
+                chess_engine._new_move = _original_new_move
+                chess_engine.Move.__init__ = _original_move_init
+
+    @contextlib.contextmanager
+    def attached(self, gs):
+        """
+        Counts the game state's calls inside a with block.
+
+        :param gs: The game state.
+        :return:
+        """
+
+        self.attach(gs)
+        try:
+            yield self
+        finally:
+            self.detach(gs)
+
+    def reset(self) -> None:
+        """
+        Sets every counter back to zero, the profiler stays attached.
+
+        :return:
+        """
+
+        for name in self.calls:
+            self.calls[name] = 0
+        for name in self.nanoseconds:
+            self.nanoseconds[name] = 0
+
+    def snapshot(self) -> dict:
+        """
+        The counters so far.
+
+        :return: A dictionary from method name to its calls, total seconds and mean microseconds per call, and
+            "Move" to the number of moves allocated.
+        """
+
+        snapshot = {}
+        for name in INSTRUMENTED:
+            calls = self.calls[name]
+            seconds = self.nanoseconds[name] / 1e9
+            snapshot[name] = {
+                "calls": calls,
+                "seconds": seconds,
+                "mean_us": seconds * 1e6 / calls if calls else 0.0,
+            }
+        snapshot["Move"] = {"calls": self.calls["Move"]}
+        return snapshot
+
+    def to_json(self, **kwargs) -> str:
+        """
+        The snapshot as JSON.
+
+        :param kwargs: Passed on to json.dumps, like indent.
+        :return: The JSON text.
+        """
+
+        return json.dumps(self.snapshot(), **kwargs)
@@ -0,0 +1,360 @@
+"""
+Looks for the best move in a GameState, the computer player.
+
+Negamax with alpha-beta pruning, run by iterative deepening under a time or node budget, with a quiescence
+search on captures at the leaves so the evaluation is never taken in the middle of an exchange. Moves are
+tried in the order ``move_ordering.MoveOrderer`` picks, which learns killer moves and history scores as it goes.
+"""
+# Imports
+import time
+
+import chess_engine
+import evaluation
+import move_ordering
+import transposition as tt
+
+MATE_SCORE = 100000
+INFINITY = MATE_SCORE + 1
+MAX_DEPTH = 64
+
+# How many nodes are searched between checks of the clock
+CHECK_EVERY = 1024
+
+
+class SearchAborted(Exception):
+    """
+    Raised inside the search when the time or node budget runs out.
+    """
+
+
+class SearchResult:
+    """
+    What a search found, and how hard it worked to find it.
+    """
+
+    def __init__(self, best_move, score: int, depth: int, pv: list, nodes: int, elapsed: float):
+        """
+        Stores the result.
+
+        :param best_move: The best move found, None if there are no legal moves.
+        :param score: The score of the best move in centipawns, for the player to move.
+        :param depth: The depth of the last completed iteration.
+        :param pv: The principal variation, the expected line of play starting with best_move.
+        :param nodes: The number of positions searched, including quiescence.
+        :param elapsed: The time taken in seconds.
+        """
+
+        self.best_move = best_move
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.nps = int(nodes / elapsed) if elapsed > 0 else 0
+
+    def __repr__(self):
+        line = " ".join(move.get_chess_notation() for move in self.pv)
+        return f"SearchResult(depth={self.depth}, score={self.score}, nodes={self.nodes}, nps={self.nps}, pv={line})"
+
+
+def is_mate_score(score: int) -> bool:
+    """
+    Checks if a score means a forced mate was found.
+
+    :param score: The score.
+    :return: Whether the score is a mate score.
+    """
+    return abs(score) > MATE_SCORE - MAX_DEPTH * 2
+
+
+def score_to_table(score: int, ply: int) -> int:
+    """
+    Makes a mate score relative to the position rather than the root before it is stored.
+
+    :param score: The score as seen from the root.
+    :param ply: The distance of the position from the root.
+    :return: The score to store.
+    """
+    if is_mate_score(score):
+        return score + ply if score > 0 else score - ply
+    return score
+
+
+def score_from_table(score: int, ply: int) -> int:
+    """
+    Turns a stored mate score back into one relative to the current root.
+
+    :param score: The stored score.
+    :param ply: The distance of the position from the root.
+    :return: The score as seen from the root.
+    """
+    if is_mate_score(score):
+        return score - ply if score > 0 else score + ply
+    return score
+
+
+def tablebase_score(result, ply: int) -> int:
+    """
+    Turns a tablebase result into a search score, mates counted from the root like the search's own.
+
+    :param result: The ``tablebase.TablebaseResult``.
+    :param ply: The distance from the root.
+    :return: The score.
+    """
+    if result.wdl > 0:
+        return MATE_SCORE - ply - result.plies
+    if result.wdl < 0:
+        return -MATE_SCORE + ply + result.plies
+    return 0
+
+
+class Searcher:
+    """
+    The alpha-beta searcher.
+    """
+
+    def __init__(self, max_depth: int = MAX_DEPTH, time_limit: float = None, node_limit: int = None,
+                 hash_mb: float = 16, orderer: move_ordering.MoveOrderer = None, book=None, tablebases=None):
+        """
+        Sets up the default limits for a search.
+
+        :param max_depth: The deepest iteration to run, kept between 1 and MAX_DEPTH.
+        :param time_limit: The wall clock budget per move in seconds, None for no limit.
+        :param node_limit: The node budget per move, None for no limit.
+        :param hash_mb: The size of the transposition table in megabytes, 0 to search without one.
+        :param orderer: The move orderer, one with every heuristic turned on if not given.
+        :param book: An ``opening_book.OpeningBook`` consulted before searching, None to always search.
+        :param tablebases: A ``tablebase.Tablebases`` giving the exact score of the endings it covers, None to
+            search them.
+        """
+
+        self.max_depth = max_depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.tt = tt.TranspositionTable(hash_mb) if hash_mb else None
+        self.orderer = orderer if orderer is not None else move_ordering.MoveOrderer(max_ply=MAX_DEPTH * 2)
+        self.book = book
+        self.tablebases = tablebases
+        # Called every CHECK_EVERY nodes when set, returning True stops the search. Like the time and node limits
+        # it is only checked once the first iteration has finished.
+        self.should_stop = None
+        # Called with the SearchResult of each iteration that finishes, for progress reports
+        self.on_iteration = None
+
+        self.nodes = 0
+        self._deadline = None
+        self._max_nodes = None
+        self._should_stop = None
+        self._pv_table = []
+
+    def search(self, gs, max_depth: int = None, time_limit: float = None, node_limit: int = None) -> SearchResult:
+        """
+        Searches the position one ply deeper at a time until a limit is hit.
+
+        The result of the last iteration that finished is returned, an iteration cut short by the budget is
+        thrown away. Depth 1 always finishes, neither the limits nor should_stop cut it short, so there is always
+        a move to play when the position has one. A position in the book or the tablebases is answered with its
+        move straight away, with a depth of 0.
+
+        :param gs: The game state to search, it is returned to the same position afterwards.
+        :param max_depth: Overrides the searcher's max_depth, kept between 1 and MAX_DEPTH.
+        :param time_limit: Overrides the searcher's time_limit.
+        :param node_limit: Overrides the searcher's node_limit.
+        :return: The SearchResult.
+        """
+
+        max_depth = max_depth if max_depth is not None else self.max_depth
+        max_depth = min(max(max_depth, 1), MAX_DEPTH)  # Depth 1 is always run, the PV table goes to MAX_DEPTH
+        time_limit = time_limit if time_limit is not None else self.time_limit
+        node_limit = node_limit if node_limit is not None else self.node_limit
+
+        start = time.perf_counter()
+        if self.book is not None:
+            book_move = self.book.choose(gs)
+            if book_move is not None:
+                return SearchResult(book_move, 0, 0, [book_move], 0, time.perf_counter() - start)
+        if self.tablebases is not None:
+            known = self.tablebases.probe(gs)
+            tablebase_move = self.tablebases.best_move(gs) if known is not None else None
+            if tablebase_move is not None:
+                return SearchResult(tablebase_move, tablebase_score(known, 0), 0, [tablebase_move], 0,
+                                    time.perf_counter() - start)
+        self.nodes = 0
+        self._deadline = None
+        self._max_nodes = None
+        self._should_stop = None
+        result = SearchResult(None, 0, 0, [], 0, 0.0)
+        if self.tt is not None:
+            self.tt.new_search()
+        self.orderer.new_search()
+
+        for depth in range(1, max_depth + 1):
+            self._pv_table = [[] for _ in range(MAX_DEPTH + 1)]
+            try:
+                score = self.negamax(gs, depth, -INFINITY, INFINITY, 0, result.pv)
+            except SearchAborted:
+                break
+            finally:
+                # Only the first iteration runs without limits
+                self._deadline = start + time_limit if time_limit is not None else None
+                self._max_nodes = node_limit
+                self._should_stop = self.should_stop
+
+            pv = self._pv_table[0]
+            result = SearchResult(pv[0] if pv else None, score, depth, pv, self.nodes, time.perf_counter() - start)
+            if self.on_iteration is not None:
+                self.on_iteration(result)
+            if not pv or is_mate_score(score):  # No moves, or the result can't change
+                break
+            if self._deadline is not None and time.perf_counter() >= self._deadline:
+                break
+            if self.should_stop is not None and self.should_stop():
+                break
+
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        result.nps = int(result.nodes / result.elapsed) if result.elapsed > 0 else 0
+        return result
+
+    def _count_node(self):
+        """
+        Counts a node and checks the budget every CHECK_EVERY nodes.
+
+        :return:
+        """
+
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            if self._max_nodes is not None and self.nodes >= self._max_nodes:
+                raise SearchAborted
+            if self._deadline is not None and time.perf_counter() >= self._deadline:
+                raise SearchAborted
+            if self._should_stop is not None and self._should_stop():
+                raise SearchAborted
+
+    def order_moves(self, moves: list, pv_move=None, ply: int = 0) -> list:
+        """
+        Puts the moves in the order the search tries them, the principal variation move first.
+
+        :param moves: The moves to order.
+        :param pv_move: The best move from the previous iteration, if any.
+        :param ply: The distance from the root, for the killer moves.
+        :return: The ordered moves.
+        """
+
+        moves[:] = list(self.orderer.ordered(moves, ply, pv_move))
+        return moves
+
+    def negamax(self, gs, depth: int, alpha: int, beta: int, ply: int, pv_line: list = ()) -> int:
+        """
+        The alpha-beta search, scores are always from the point of view of the player to move.
+
+        :param gs: The game state.
+        :param depth: The remaining depth in plies.
+        :param alpha: The score the player to move is already guaranteed.
+        :param beta: The score the opponent is already guaranteed, anything at or above it is a cut off.
+        :param ply: The distance from the root.
+        :param pv_line: The principal variation from the previous iteration, searched first.
+        :return: The score of the position.
+        """
+
+        self._count_node()
+        self._pv_table[ply] = []
+
+        if ply > 0 and gs.repetition_count() > 1:
+            return 0  # Repeating is a draw as far as the search is concerned
+        if ply > 0 and self.tablebases is not None:
+            known = self.tablebases.probe(gs)
+            if known is not None:
+                return min(max(tablebase_score(known, ply), alpha), beta)
+        if depth <= 0:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        # A stored result that is deep enough can answer the position without searching it
+        hash_move = None
+        if self.tt is not None:
+            entry = self.tt.probe(gs.zobrist_key)
+            if entry is not None:
+                move_code, score, entry_depth, bound = entry
+                if move_code:
+                    hash_move = chess_engine.Move.from_code(move_code)
+                if ply > 0 and entry_depth >= depth:
+                    score = score_from_table(score, ply)
+                    if bound == tt.EXACT:
+                        return min(max(score, alpha), beta)
+                    if bound == tt.LOWER and score >= beta:
+                        return beta
+                    if bound == tt.UPPER and score <= alpha:
+                        return alpha
+
+        moves = gs.valid_moves()
+        if not moves:
+            return -MATE_SCORE + ply if gs.checkmate else 0  # Prefer quicker mates
+
+        best_move = None
+        for move in self.orderer.ordered(moves, ply, pv_line[0] if pv_line else hash_move):
+            gs.make_move(move)
+            try:
+                score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1,
+                                      pv_line[1:] if pv_line and move == pv_line[0] else ())
+            finally:
+                gs.undo_move()
+            if score >= beta:
+                self.orderer.record_cutoff(move, ply, depth)
+                if self.tt is not None:
+                    self.tt.store(gs.zobrist_key, depth, score_to_table(beta, ply), tt.LOWER, move.code)
+                return beta
+            if score > alpha:
+                alpha = score
+                best_move = move
+                self._pv_table[ply] = [move] + self._pv_table[ply + 1]
+
+        if self.tt is not None:
+            if best_move is not None:
+                self.tt.store(gs.zobrist_key, depth, score_to_table(alpha, ply), tt.EXACT, best_move.code)
+            else:
+                self.tt.store(gs.zobrist_key, depth, score_to_table(alpha, ply), tt.UPPER)
+        return alpha
+
+    def quiescence(self, gs, alpha: int, beta: int, ply: int) -> int:
+        """
+        Searches captures only until the position is quiet, the standing evaluation is a lower bound. In check
+        there is no standing evaluation and every evasion is searched.
+
+        :param gs: The game state.
+        :param alpha: The score the player to move is already guaranteed.
+        :param beta: The score the opponent is already guaranteed.
+        :param ply: The distance from the root.
+        :return: The score of the position.
+        """
+
+        if gs.in_check():
+            # No standing pat in check, the position isn't quiet and every evasion is tried, not just captures
+            moves = list(gs.legal_moves())
+            if not moves:
+                return -MATE_SCORE + ply  # Prefer quicker mates
+            ordered = self.orderer.ordered(moves, ply)
+        else:
+            stand_pat = evaluation.evaluate(gs)
+            if stand_pat >= beta:
+                return beta
+            if stand_pat > alpha:
+                alpha = stand_pat
+
+            # Only captures are generated, the full move list is never needed unless there are none
+            captures = list(gs.capture_moves())
+            if not captures and not gs.has_any_legal_move():
+                return 0  # Stalemate
+            ordered = self.orderer.ordered_captures(captures)
+        for move in ordered:
+            self._count_node()
+            gs.make_move(move)
+            try:
+                score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            finally:
+                gs.undo_move()
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
@@ -0,0 +1,427 @@
+"""
+Self-play matches, two engine configurations playing many games against each other to measure a change.
+
+Each opening is played twice with the colours swapped, so neither side gains from a lucky start. Games are played
+in worker processes, one game at a time each, and come back as they finish. A game ends on checkmate or
+stalemate, or is adjudicated a draw on threefold repetition, the fifty move rule, bare kings or the move limit.
+The games are written as PGN. The report gives the score, the Elo difference with its 95% error, games per second,
+each engine's nodes per second and the time of every game, so a slower engine shows up as well as a weaker one.
+
+    python selfplay.py --engine depth=3 --baseline "depth=3,history=off" --games 40 --workers 4 --pgn match.pgn
+
+A configuration is a comma separated list of depth, nodes, time (seconds per move), hash (megabytes), captures,
+killers and history (on or off, the move ordering heuristics) and tb (a tablebase folder).
+"""
+# Imports
+import argparse
+import math
+import time
+
+import analysis
+import move_ordering
+import parallel
+import pgn
+import search
+import tablebase
+
+DEFAULT_MAX_PLIES = 200
+
+# Short, common openings as moves from the starting position, each is played once with each colour
+OPENINGS = tuple(line.split() for line in (
+    "e2e4 e7e5 g1f3 b8c6",
+    "e2e4 c7c5 g1f3 d7d6",
+    "e2e4 e7e6 d2d4 d7d5",
+    "e2e4 c7c6 d2d4 d7d5",
+    "e2e4 d7d5 e4d5 d8d5",
+    "e2e4 e7e5 f1c4 g8f6",
+    "d2d4 d7d5 c2c4 e7e6",
+    "d2d4 g8f6 c2c4 e7e6",
+    "d2d4 g8f6 c2c4 g7g6",
+    "d2d4 f7f5 g2g3 g8f6",
+    "c2c4 e7e5 b1c3 g8f6",
+    "g1f3 d7d5 g2g3 g8f6",
+))
+
+# One searcher per side and configuration in each worker process, so transposition tables are allocated once
+_searchers = {}
+
+
+class EngineConfig:
+    """
+    The settings of one side of a match.
+    """
+
+    def __init__(self, name: str = "engine", depth: int = 3, time_limit: float = None, node_limit: int = None,
+                 hash_mb: float = 4, captures: bool = True, killers: bool = True, history: bool = True,
+                 tablebase_dir: str = None):
+        """
+        Stores the settings.
+
+        :param name: The name written in the PGN and the report.
+        :param depth: The deepest search iteration.
+        :param time_limit: Seconds per move, None for no limit.
+        :param node_limit: Nodes per move, None for no limit.
+        :param hash_mb: The transposition table size.
+        :param captures: Order captures by MVV-LVA.
+        :param killers: Try the killer moves early.
+        :param history: Order quiet moves by their history scores.
+        :param tablebase_dir: A folder of endgame tables to play from, None to search every position.
+        """
+
+        self.name = name
+        self.depth = depth
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.hash_mb = hash_mb
+        self.captures = captures
+        self.killers = killers
+        self.history = history
+        self.tablebase_dir = tablebase_dir
+
+    @classmethod
+    def parse(cls, spec: str, name: str = "engine"):
+        """
+        Reads a configuration like "depth=3,nodes=20000,history=off".
+
+        :param spec: Comma separated key=value settings, anything not given is left at its default.
+        :param name: The configuration's name.
+        :return: The EngineConfig.
+        :raises ValueError: For an unknown setting or a bad value.
+        """
+
+        config = cls(name)
+        for setting in filter(None, (part.strip() for part in spec.split(","))):
+            key, _, value = setting.partition("=")
+            key = key.strip().lower()
+            value = value.strip()
+            if key == "depth":
+                config.depth = int(value)
+            elif key == "nodes":
+                config.node_limit = int(value)
+            elif key == "time":
+                config.time_limit = float(value)
+            elif key == "hash":
+                config.hash_mb = float(value)
+            elif key in ("captures", "killers", "history"):
+                if value.lower() not in ("on", "off"):
+                    raise ValueError(f"{key} must be on or off, not {value!r}")
+                setattr(config, key, value.lower() == "on")
+            elif key == "tb":
+                config.tablebase_dir = value or None
+            else:
+                raise ValueError(f"Unknown engine setting {key!r}")
+        return config
+
+    def key(self) -> tuple:
+        """
+        Everything a searcher is built from, two configurations with the same key play the same.
+
+        :return: A tuple of the settings.
+        """
+
+        return (self.depth, self.time_limit, self.node_limit, self.hash_mb, self.captures, self.killers,
+                self.history, self.tablebase_dir)
+
+    def searcher(self) -> search.Searcher:
+        """
+        Builds a searcher with these settings.
+
+        :return: The Searcher.
+        """
+
+        orderer = move_ordering.MoveOrderer(self.captures, self.killers, self.history, max_ply=search.MAX_DEPTH * 2)
+        tables = tablebase.Tablebases(self.tablebase_dir) if self.tablebase_dir else None
+        return search.Searcher(self.depth, self.time_limit, self.node_limit, self.hash_mb, orderer,
+                               tablebases=tables)
+
+    def __repr__(self):
+        return f"EngineConfig({self.name}, depth={self.depth}, nodes={self.node_limit}, time={self.time_limit})"
+
+
+class GameRecord:
+    """
+    One finished game of a match.
+    """
+
+    def __init__(self, index: int, white: str, black: str, result: str, reason: str, plies: int, seconds: float,
+                 nodes: tuple, thinking: tuple, game: pgn.Game):
+        """
+        Stores the game.
+
+        :param index: The game's number in the match, from 0.
+        :param white: The name of the configuration playing white.
+        :param black: The name of the configuration playing black.
+        :param result: "1-0", "0-1" or "1/2-1/2".
+        :param reason: How the game ended, like "checkmate" or "move limit".
+        :param plies: The plies the engines played, not counting the opening.
+        :param seconds: The wall clock time of the game.
+        :param nodes: The nodes searched by white and by black.
+        :param thinking: The seconds white and black spent searching.
+        :param game: The game for the PGN file.
+        """
+
+        self.index = index
+        self.white = white
+        self.black = black
+        self.result = result
+        self.reason = reason
+        self.plies = plies
+        self.seconds = seconds
+        self.nodes = nodes
+        self.thinking = thinking
+        self.game = game
+
+    @property
+    def nps(self) -> tuple:
+        """
+        White's and black's nodes per second over the game.
+        """
+
+        return tuple(int(nodes / seconds) if seconds > 0 else 0 for nodes, seconds in zip(self.nodes, self.thinking))
+
+    def __repr__(self):
+        return f"GameRecord({self.index}, {self.white} - {self.black}, {self.result}, {self.reason}, {self.plies} plies)"
+
+
+def adjudicate(gs, plies: int, max_plies: int):
+    """
+    Decides whether a game is over.
+
+    :param gs: The game state.
+    :param plies: The plies played since the opening.
+    :param max_plies: The plies after which the game is called a draw.
+    :return: A (result, reason) tuple, or None if the game goes on.
+    """
+    if not gs.has_any_legal_move():
+        if gs.in_check():
+            return ("0-1" if gs.white_to_move else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if gs.threefold_repetition():
+        return "1/2-1/2", "repetition"
+    if gs.halfmove_clock >= 100:
+        return "1/2-1/2", "fifty moves"
+    if gs.bitboards.occupied.bit_count() == 2:
+        return "1/2-1/2", "insufficient material"
+    if plies >= max_plies:
+        return "1/2-1/2", "move limit"
+    return None
+
+
+def play_game(index: int, opening, white: EngineConfig, black: EngineConfig, max_plies: int = DEFAULT_MAX_PLIES,
+              searchers: tuple = None) -> GameRecord:
+    """
+    Plays one game.
+
+    :param index: The game's number in the match.
+    :param opening: A FEN or a list of moves from the starting position to play from.
+    :param white: The configuration playing white.
+    :param black: The configuration playing black.
+    :param max_plies: The plies after which the game is called a draw.
+    :param searchers: White's and black's searchers, new ones if not given, cleared before the game.
+    :return: The GameRecord.
+    """
+    if searchers is None:
+        searchers = (white.searcher(), black.searcher())
+    for searcher in searchers:
+        if searcher.tt is not None:
+            searcher.tt.clear()
+        searcher.orderer.clear()
+
+    start = time.perf_counter()
+    gs = analysis.position_to_gamestate(opening)
+    nodes = [0, 0]
+    thinking = [0.0, 0.0]
+    plies = 0
+    while True:
+        ending = adjudicate(gs, plies, max_plies)
+        if ending is not None:
+            break
+        side = 0 if gs.white_to_move else 1
+        found = searchers[side].search(gs)
+        nodes[side] += found.nodes
+        thinking[side] += found.elapsed
+        gs.make_move(found.best_move)
+        plies += 1
+
+    result, reason = ending
+    headers = {"Event": "Self-play", "Round": str(index + 1), "White": white.name, "Black": black.name,
+               "Termination": reason}
+    game = pgn.game_from_gamestate(gs, headers, result)
+    return GameRecord(index, white.name, black.name, result, reason, plies, time.perf_counter() - start,
+                      tuple(nodes), tuple(thinking), game)
+
+
+def _play_chunk(chunk: list, max_plies: int) -> list:
+    """
+    Plays a chunk of games in a worker process.
+
+    :param chunk: A list of (index, opening, white, black) tuples.
+    :param max_plies: The plies after which a game is called a draw.
+    :return: A list of GameRecords.
+    """
+    records = []
+    for index, opening, white, black in chunk:
+        searchers = []
+        for side, config in enumerate((white, black)):
+            key = (side, config.key())
+            if key not in _searchers:
+                _searchers[key] = config.searcher()
+            searchers.append(_searchers[key])
+        records.append(play_game(index, opening, white, black, max_plies, tuple(searchers)))
+    return records
+
+
+def elo_difference(wins: int, draws: int, losses: int) -> tuple:
+    """
+    The Elo difference a score means, with its 95% confidence margin.
+
+    :param wins: Games won.
+    :param draws: Games drawn.
+    :param losses: Games lost.
+    :return: (difference, margin), infinite when every game was won or lost.
+    """
+    games = wins + draws + losses
+    if not games:
+        return 0.0, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return _elo(score), (_elo(score + margin) - _elo(score - margin)) / 2
+
+
+def _elo(score: float) -> float:
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def read_openings(path: str) -> list:
+    """
+    Reads start positions, one per line, either a FEN or moves in chess notation from the starting position.
+
+    :param path: The file, blank lines and lines starting with # are skipped.
+    :return: A list of FENs and move lists.
+    """
+    openings = []
+    with open(path) as lines:
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                openings.append(line if "/" in line else line.split())
+    return openings
+
+
+def run_match(engine: EngineConfig, baseline: EngineConfig, games: int, openings=None, workers: int = None,
+              max_plies: int = DEFAULT_MAX_PLIES, pgn_path: str = None, on_game=None) -> dict:
+    """
+    Plays a match, engine against baseline, alternating colours with each opening played by both sides.
+
+    :param engine: The configuration being tested.
+    :param baseline: The configuration it is measured against.
+    :param games: The number of games.
+    :param openings: FENs or move lists to start from, OPENINGS if not given.
+    :param workers: The number of worker processes, defaults to the CPU count. 0 plays in this process.
+    :param max_plies: The plies after which a game is called a draw.
+    :param pgn_path: Where to write the games, in the order they were numbered.
+    :param on_game: Called with each GameRecord as it finishes.
+    :return: A dictionary of games, wins, draws and losses for engine, score, elo, elo_margin, seconds,
+        games_per_second, nps ("engine" and "baseline" -> nodes per second), game_seconds (the mean and max game
+        time) and records, the GameRecords in order. Games are counted by which side played them, not by name, so
+        the two configurations may share one.
+    """
+    openings = list(openings or OPENINGS)
+
+    def engine_is_white(index):
+        return index % 2 == 0
+
+    def jobs():
+        for index in range(games):
+            white, black = (engine, baseline) if engine_is_white(index) else (baseline, engine)
+            yield index, openings[index // 2 % len(openings)], white, black
+
+    start = time.perf_counter()
+    if workers == 0:
+        results = (play_game(index, opening, white, black, max_plies) for index, opening, white, black in jobs())
+    else:
+        results = parallel.map_chunks(_play_chunk, jobs(), workers, 1, False, args=(max_plies,))
+    records = []
+    for record in results:
+        records.append(record)
+        if on_game is not None:
+            on_game(record)
+    seconds = time.perf_counter() - start
+    records.sort(key=lambda record: record.index)
+    if pgn_path is not None:
+        pgn.write_games((record.game for record in records), pgn_path)
+
+    wins = draws = losses = 0
+    nodes = {"engine": 0, "baseline": 0}
+    thinking = {"engine": 0.0, "baseline": 0.0}
+    for record in records:
+        players = ("engine", "baseline") if engine_is_white(record.index) else ("baseline", "engine")
+        if record.result == "1/2-1/2":
+            draws += 1
+        elif (record.result == "1-0") == (players[0] == "engine"):
+            wins += 1
+        else:
+            losses += 1
+        for player, side_nodes, side_seconds in zip(players, record.nodes, record.thinking):
+            nodes[player] += side_nodes
+            thinking[player] += side_seconds
+    elo, margin = elo_difference(wins, draws, losses)
+    game_seconds = [record.seconds for record in records]
+    return {
+        "games": len(records),
+        "wins": wins,
+        "draws": draws,
+        "losses": losses,
+        "score": (wins + draws / 2) / len(records) if records else 0.0,
+        "elo": elo,
+        "elo_margin": margin,
+        "seconds": seconds,
+        "games_per_second": len(records) / seconds if seconds > 0 else 0.0,
+        "nps": {player: int(nodes[player] / thinking[player]) if thinking[player] > 0 else 0 for player in nodes},
+        "game_seconds": (sum(game_seconds) / len(game_seconds), max(game_seconds)) if game_seconds else (0.0, 0.0),
+        "records": records,
+    }
+
+
+def main() -> None:
+    """
+    The command line interface, prints a line per game as it finishes and the match report at the end.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Play a self-play match between two engine configurations.")
+    parser.add_argument("--engine", default="depth=3", help="the configuration being tested")
+    parser.add_argument("--baseline", default="depth=3", help="the configuration it is measured against")
+    parser.add_argument("--games", type=int, default=24, help="the number of games")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES, help="plies before a draw is called")
+    parser.add_argument("--openings", default=None, help="a file of FENs or move lists to start from")
+    parser.add_argument("--pgn", default=None, help="where to write the games")
+    args = parser.parse_args()
+
+    engine = EngineConfig.parse(args.engine, "engine")
+    baseline = EngineConfig.parse(args.baseline, "baseline")
+    openings = read_openings(args.openings) if args.openings else None
+
+    def report(record):
+        white_nps, black_nps = record.nps
+        print(f"{record.index + 1:>4} {record.white:>8} - {record.black:<8} {record.result:<7} {record.reason:<21} "
+              f"{record.plies:>4} plies {record.seconds:7.2f}s  nps {white_nps}/{black_nps}", flush=True)
+
+    stats = run_match(engine, baseline, args.games, openings, args.workers, args.max_plies, args.pgn, report)
+    mean, slowest = stats["game_seconds"]
+    print(f"engine +{stats['wins']} ={stats['draws']} -{stats['losses']}, score {stats['score']:.1%}, "
+          f"Elo {stats['elo']:+.0f} +/- {stats['elo_margin']:.0f}")
+    print(f"{stats['games']} games in {stats['seconds']:.1f}s, {stats['games_per_second']:.2f} games/s, "
+          f"{mean:.2f}s a game (slowest {slowest:.2f}s), nps engine {stats['nps']['engine']} "
+          f"baseline {stats['nps']['baseline']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+The piece images packed into one sprite atlas, scaled once per square size and kept on disk.
+
+Loading and smooth-scaling twelve PNGs is the slow part of starting the UI. The atlas scales them once for a
+square size, packs them side by side into a single surface and saves it as one PNG in the theme's cache folder,
+so later launches at that size load a single file. Surfaces for each size used are kept in memory too, so
+switching back to a size, as resizing the window does, costs nothing. Pieces are blitted from the one surface,
+converted to the display's pixel format once a display exists.
+"""
+# Imports
+import os
+
+import pygame as pg
+
+PIECES = ("wP", "bP", "wR", "bR", "wN", "bN", "wB", "bB", "wQ", "bQ", "wK", "bK")
+_INDEX = {piece: i for i, piece in enumerate(PIECES)}  # Piece -> its column on the atlas
+CACHE_FOLDER = "cache"
+
+
+class SpriteAtlas:
+    """
+    The piece sprites of a theme, at one square size at a time.
+    """
+
+    def __init__(self, square_size: int, image_dir: str = "images", cache_dir: str = None):
+        """
+        Loads the atlas for a square size, building and saving it if there is no up to date one on disk.
+
+        :param square_size: The size of a square in pixels.
+        :param image_dir: The folder of piece PNGs, named like wP.png, the theme.
+        :param cache_dir: Where built atlases are saved, a cache folder inside image_dir if not given.
+        """
+
+        self.image_dir = image_dir
+        self.cache_dir = cache_dir if cache_dir is not None else os.path.join(image_dir, CACHE_FOLDER)
+        self._surfaces = {}  # Square size -> atlas surface
+        self.built = 0  # How many atlases had to be built from the source images rather than loaded
+        self.square_size = None
+        self.surface = None
+        self.resize(square_size)
+
+    def resize(self, square_size: int) -> None:
+        """
+        Switches to another square size, from memory or disk if it has been built before.
+
+        :param square_size: The size of a square in pixels.
+        :return:
+        """
+
+        surface = self._surfaces.get(square_size)
+        if surface is None:
+            surface = self._load(square_size)
+            self._surfaces[square_size] = surface
+        self.square_size = square_size
+        self.surface = surface
+
+    def _source_paths(self) -> dict:
+        """
+        The image file of each piece, matching names without regard to case.
+
+        :return: A dictionary from piece to path.
+        """
+
+        files = {name.lower(): name for name in os.listdir(self.image_dir)}
+        paths = {}
+        for piece in PIECES:
+            name = files.get(f"{piece}.png".lower())
+            if name is None:
+                raise FileNotFoundError(f"No image for {piece} in {self.image_dir}")
+            paths[piece] = os.path.join(self.image_dir, name)
+        return paths
+
+    def atlas_path(self, square_size: int) -> str:
+        """
+        Where the atlas for a square size is saved.
+
+        :param square_size: The size of a square in pixels.
+        :return: The path of the PNG.
+        """
+
+        return os.path.join(self.cache_dir, f"atlas_{square_size}.png")
+
+    def _load(self, square_size: int) -> pg.Surface:
+        """
+        The atlas for a square size, from disk if it is newer than every source image, otherwise built and saved.
+
+        :param square_size: The size of a square in pixels.
+        :return: The atlas surface.
+        """
+
+        sources = self._source_paths()
+        path = self.atlas_path(square_size)
+        newest = max(os.path.getmtime(source) for source in sources.values())
+        if os.path.exists(path) and os.path.getmtime(path) >= newest:
+            surface = pg.image.load(path)
+        else:
+            surface = pg.Surface((square_size * len(PIECES), square_size), pg.SRCALPHA)
+            for i, piece in enumerate(PIECES):
+                image = pg.image.load(sources[piece])
+                surface.blit(pg.transform.smoothscale(image, (square_size, square_size)), (i * square_size, 0))
+            self.built += 1
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                pg.image.save(surface, path)
+            except (OSError, pg.error):
+                pass  # A read only theme still works, it is just built each launch
+        if pg.display.get_init() and pg.display.get_surface() is not None:
+            surface = surface.convert_alpha()  # Blits are fastest in the display's own format
+        return surface
+
+    def area(self, piece: str) -> pg.Rect:
+        """
+        Where a piece is on the atlas.
+
+        :param piece: The piece, like "wK".
+        :return: The rect of its sprite.
+        """
+
+        size = self.square_size
+        return pg.Rect(_INDEX[piece] * size, 0, size, size)
+
+    def blit(self, screen: pg.Surface, piece: str, position) -> pg.Rect:
+        """
+        Draws a piece.
+
+        :param screen: The surface to draw on.
+        :param piece: The piece, like "wK".
+        :param position: The top left corner, or a rect whose corner is used.
+        :return: The rect drawn.
+        """
+
+        size = self.square_size
+        return screen.blit(self.surface, position, (_INDEX[piece] * size, 0, size, size))
@@ -0,0 +1,804 @@
+"""
+Endgame tablebases, the exact result and distance to mate of every position with up to four pieces.
+
+A table covers one material set, named by white's pieces then black's, like KQK or KRKP, with the stronger side as
+white. Positions with the colours the other way round are looked up with the board mirrored. A table is worked
+out backwards from its checkmates by retrograde analysis, with Numpy handling a whole table one move at a time, and
+is saved as one byte per position:
+
+    0          a draw
+    1 - 127    the side to move mates in that many moves
+    128 + n    the side to move is mated in n moves, 128 is checkmate
+    255        not a legal position
+
+Positions are numbered by a perfect index, no hashing and no collisions. The board is mirrored so the white king
+is on the a-d files, and also on four ranks when there are no pawns. The index is the white king's square in
+that area, followed by the square of each other piece in base 64, with one run of indexes for each side to move.
+A probe is a few multiplications and one read from the memory-mapped file. Captures and promotions lead into
+smaller tables, which are built first. Positions with castling rights or a legal en passant capture aren't
+covered, and the fifty move rule is ignored.
+
+    python tablebase.py build KQK KRK KPK --dir tablebases
+    python tablebase.py probe --fen "8/8/8/4k3/8/8/8/4K2R w - - 0 1"
+"""
+# Imports
+import argparse
+import os
+import struct
+import time
+
+import numpy as np
+
+import bitboard as bb
+import chess_engine
+
+MAX_PIECES = 4
+DEFAULT_DIR = "tablebases"
+EXTENSION = ".tb"
+MAGIC = b"CHESSTB1"
+HEADER = struct.Struct("<8sQ")  # Magic, positions for each side to move
+
+# Position values as stored
+DRAW = 0
+LOSS = 128
+ILLEGAL = 255
+
+_LETTERS = "PNBRQK"  # Piece kind order of the piece codes
+_ORDER = "KQRBNP"  # Order of the pieces in a table's name
+_VALUES = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+CHUNK = 1 << 18  # Positions handled at once while building, bounds the memory of the temporary arrays
+
+# Build states
+_UNKNOWN, _WIN, _LOSS, _DRAW, _ILLEGAL = range(5)
+_NONE = 255  # No mate through a capture or promotion
+
+
+def _attack_tables() -> tuple:
+    """
+    Builds the Numpy lookups the builder tests moves with.
+
+    :return: (reach, pawn attacks, between): reach[kind, from, to] is whether a piece of that kind moves from one
+        square to the other on an empty board, pawn attacks are indexed [colour, from, to] and between holds the
+        bitboard of the squares strictly between two aligned squares.
+    """
+    reach = np.zeros((6, 64, 64), bool)
+    pawn = np.zeros((2, 64, 64), bool)
+    between = np.zeros((64, 64), np.uint64)
+    for start_sq in range(64):
+        for end_sq in bb.squares(bb.KNIGHT_ATTACKS[start_sq]):
+            reach[KNIGHT, start_sq, end_sq] = True
+        for end_sq in bb.squares(bb.KING_ATTACKS[start_sq]):
+            reach[KING, start_sq, end_sq] = True
+        for colour in (bb.WHITE, bb.BLACK):
+            for end_sq in bb.squares(bb.PAWN_ATTACKS[colour][start_sq]):
+                pawn[colour, start_sq, end_sq] = True
+        for end_sq in range(64):
+            if end_sq == start_sq:
+                continue
+            rows, cols = (end_sq >> 3) - (start_sq >> 3), (end_sq & 7) - (start_sq & 7)
+            reach[ROOK, start_sq, end_sq] = rows == 0 or cols == 0
+            reach[BISHOP, start_sq, end_sq] = abs(rows) == abs(cols)
+            between[start_sq, end_sq] = bb.BETWEEN[start_sq][end_sq]
+    reach[QUEEN] = reach[ROOK] | reach[BISHOP]
+    return reach, pawn, between
+
+
+_REACH, _PAWN_ATTACKS, _BETWEEN = _attack_tables()
+_BIT = np.left_shift(np.uint64(1), np.arange(64, dtype=np.uint64))
+
+
+def _sides(name: str) -> tuple:
+    """
+    Splits a material set into white's and black's pieces.
+
+    :param name: The material set, like "KRKP".
+    :return: (white, black), like ("KR", "KP").
+    """
+    name = name.upper()
+    second = name.find("K", 1)
+    if not name.startswith("K") or second < 0 or "K" in name[second + 1:] or set(name) - set(_ORDER):
+        raise ValueError(f"Not a material set: {name}")
+    return name[:second], name[second:]
+
+
+def _strength(side: str) -> tuple:
+    return sum(_VALUES[letter] for letter in side), len(side), tuple(-_ORDER.index(letter) for letter in side)
+
+
+def canonical_name(name: str) -> str:
+    """
+    The name a material set's table is saved under, each side's pieces in order and the stronger side first.
+
+    :param name: The material set, like "kpkr".
+    :return: The table name, like "KRKP".
+    """
+    white, black = ("".join(sorted(side, key=_ORDER.index)) for side in _sides(name))
+    if _strength(black) > _strength(white):
+        white, black = black, white
+    return white + black
+
+
+def _letter(code: int) -> str:
+    return _LETTERS[(code - 1) % 6]
+
+
+def _arrange(codes) -> tuple:
+    """
+    Matches the pieces of a position to the table that covers them.
+
+    :param codes: The piece codes on the board.
+    :return: (table name, whether the colours are swapped, the order of the pieces in the table).
+    """
+    white = sorted((i for i, code in enumerate(codes) if code <= bb.WK), key=lambda i: _ORDER.index(_letter(codes[i])))
+    black = sorted((i for i, code in enumerate(codes) if code > bb.WK), key=lambda i: _ORDER.index(_letter(codes[i])))
+    white_name = "".join(_letter(codes[i]) for i in white)
+    black_name = "".join(_letter(codes[i]) for i in black)
+    if _strength(black_name) > _strength(white_name):
+        return black_name + white_name, True, black + white
+    return white_name + black_name, False, white + black
+
+
+def dependencies(name: str) -> list:
+    """
+    The smaller tables a table's captures and promotions lead into.
+
+    :param name: The material set.
+    :return: The table names, bare kings left out.
+    """
+    white, black = _sides(canonical_name(name))
+    found = set()
+    for side, other, swapped in ((white, black, False), (black, white, True)):
+        fewer = [other[:i] + other[i + 1:] for i in range(1, len(other))]  # One of the other side's pieces taken
+        after = [(side, theirs) for theirs in fewer]
+        if "P" in side:
+            for piece in "QRBN":
+                promoted = side.replace("P", piece, 1)
+                after += [(promoted, theirs) for theirs in [other] + fewer]
+        for mine, theirs in after:
+            found.add(canonical_name(theirs + mine if swapped else mine + theirs))
+    found.discard(canonical_name(name))
+    return sorted(name for name in found if len(name) > 2)
+
+
+class _Layout:
+    """
+    The shape of one table: its pieces and how positions are numbered.
+    """
+
+    def __init__(self, name: str):
+        white, black = _sides(name)
+        self.name = name
+        self.codes = (tuple(_LETTERS.index(letter) + bb.WP for letter in white)
+                      + tuple(_LETTERS.index(letter) + bb.BP for letter in black))
+        self.pawns = "P" in name
+        self.size = (32 if self.pawns else 16) * 64 ** (len(self.codes) - 1)
+
+    def decode(self, index: np.ndarray) -> list:
+        """
+        The squares of the pieces at some indexes.
+
+        :param index: The indexes.
+        :return: A list of square arrays, one for each piece.
+        """
+
+        squares = []
+        for _ in range(len(self.codes) - 1):
+            squares.append(index & 63)
+            index = index >> 6
+        squares.reverse()
+        return [(index >> 2) * 8 + (index & 3)] + squares
+
+    def index(self, squares: list) -> np.ndarray:
+        """
+        The indexes of positions, mirroring them into the table's part of the board first.
+
+        :param squares: A list of square arrays, one for each piece in the table's order.
+        :return: The indexes.
+        """
+
+        king = squares[0]
+        flip = np.where((king & 7) > 3, 7, 0)
+        if not self.pawns:
+            flip |= np.where((king >> 3) > 3, 56, 0)
+        king = king ^ flip
+        index = (king >> 3) * 4 + (king & 7)
+        for sq in squares[1:]:
+            index = index * 64 + (sq ^ flip)
+        return index
+
+
+def _index(pawns: bool, squares: list) -> int:
+    """
+    The index of one position, ``_Layout.index`` without Numpy for probes.
+
+    :param pawns: Whether the table has pawns, which stops the board being mirrored top to bottom.
+    :param squares: The square of each piece in the table's order.
+    :return: The index.
+    """
+    king = squares[0]
+    flip = 7 if king & 7 > 3 else 0
+    if not pawns and king >> 3 > 3:
+        flip |= 56
+    king ^= flip
+    index = (king >> 3) * 4 + (king & 7)
+    for sq in squares[1:]:
+        index = index * 64 + (sq ^ flip)
+    return index
+
+
+def _attacks(code: int, origin, target, occupied: np.ndarray) -> np.ndarray:
+    """
+    Whether a piece on one square attacks another, for whole arrays of positions.
+
+    :param code: The piece code.
+    :param origin: The squares the piece is on, an array or one square.
+    :param target: The squares attacked, an array or one square.
+    :param occupied: The occupancy bitboards, sliders are blocked by anything in between.
+    :return: A boolean array.
+    """
+    kind = (code - 1) % 6
+    if kind == PAWN:
+        return _PAWN_ATTACKS[bb.colour_of(code), origin, target]
+    hits = _REACH[kind, origin, target]
+    if kind in (BISHOP, ROOK, QUEEN):
+        hits = hits & ((_BETWEEN[origin, target] & occupied) == 0)
+    return hits
+
+
+def _attacked(codes: tuple, squares: list, target, colour: int, occupied: np.ndarray, captured_on=None) -> np.ndarray:
+    """
+    Whether a square is attacked by one side, for whole arrays of positions.
+
+    :param codes: The piece codes.
+    :param squares: The square array of each piece.
+    :param target: The square attacked, an array or one square.
+    :param colour: The attacking side.
+    :param occupied: The occupancy bitboards.
+    :param captured_on: A square whose piece has just been captured and attacks nothing.
+    :return: A boolean array.
+    """
+    hit = np.zeros(occupied.shape, bool)
+    for code, sq in zip(codes, squares):
+        if bb.colour_of(code) == colour:
+            attack = _attacks(code, sq, target, occupied)
+            if captured_on is not None:
+                attack &= sq != captured_on
+            hit |= attack
+    return hit
+
+
+def _occupancy(squares: list) -> np.ndarray:
+    occupied = _BIT[squares[0]]
+    for sq in squares[1:]:
+        occupied = occupied | _BIT[sq]
+    return occupied
+
+
+class TablebaseResult:
+    """
+    The value of a position from the side to move's point of view.
+    """
+
+    __slots__ = ("wdl", "plies")
+
+    def __init__(self, wdl: int, plies):
+        """
+        :param wdl: 1 for a win, 0 for a draw, -1 for a loss.
+        :param plies: The plies until mate with best play on both sides, None for a draw.
+        """
+
+        self.wdl = wdl
+        self.plies = plies
+
+    @property
+    def moves(self):
+        """
+        The distance to mate in moves of the winning side, None for a draw.
+        """
+
+        return None if self.plies is None else (self.plies + 1) // 2
+
+    def __eq__(self, other):
+        return isinstance(other, TablebaseResult) and (self.wdl, self.plies) == (other.wdl, other.plies)
+
+    def __repr__(self):
+        if self.wdl == 0:
+            return "TablebaseResult(draw)"
+        return f"TablebaseResult({'win' if self.wdl > 0 else 'loss'} in {self.moves})"
+
+
+def decode_value(value: int):
+    """
+    Unpacks a stored byte.
+
+    :param value: The byte.
+    :return: The TablebaseResult, or None for an illegal position.
+    """
+    if value == DRAW:
+        return TablebaseResult(0, None)
+    if value < LOSS:
+        return TablebaseResult(1, 2 * value - 1)
+    if value == ILLEGAL:
+        return None
+    return TablebaseResult(-1, 2 * (value - LOSS))
+
+
+class Tablebases:
+    """
+    The tables in a folder, memory-mapped as they are first needed.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIR):
+        """
+        Finds the tables in a folder, an empty or missing folder is fine and answers nothing.
+
+        :param directory: The folder of .tb files.
+        """
+
+        self.directory = directory
+        self._tables = {}  # Name -> (2, size) array, or None when there's no file
+        try:
+            names = [file[:-len(EXTENSION)] for file in os.listdir(directory) if file.endswith(EXTENSION)]
+        except OSError:
+            names = []
+        self.available = sorted(names)
+        # Positions with more pieces than the largest table are turned away before anything else is done
+        self.max_pieces = max((len(name) for name in names), default=0)
+
+    def table(self, name: str):
+        """
+        A table's values, mapped the first time it is asked for.
+
+        :param name: The canonical table name.
+        :return: A read only (2, size) uint8 array indexed [black to move, index], or None if there's no file.
+        """
+
+        if name in self._tables:
+            return self._tables[name]
+        path = os.path.join(self.directory, name + EXTENSION)
+        table = None
+        if os.path.exists(path):
+            size = _Layout(name).size
+            with open(path, "rb") as file:
+                magic, positions = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC or positions != size:
+                raise ValueError(f"{path} is not a tablebase for {name}")
+            table = np.memmap(path, np.uint8, "r", offset=HEADER.size, shape=(2, size))
+        self._tables[name] = table
+        return table
+
+    def close(self) -> None:
+        """
+        Drops the mapped tables, they are mapped again if needed.
+
+        :return:
+        """
+
+        self._tables.clear()
+
+    def probe(self, gs):
+        """
+        Looks a position up.
+
+        :param gs: The game state.
+        :return: The TablebaseResult for the side to move, or None if no table covers the position.
+        """
+
+        bitboards = gs.bitboards
+        if bitboards.occupied.bit_count() > self.max_pieces or gs.castling_rights:
+            return None
+        if gs.enpassant_possible and any(move.code & chess_engine.ENPASSANT_FLAG for move in gs.capture_moves()):
+            return None
+        codes = []
+        squares = []
+        pieces = bitboards.pieces
+        for code in range(bb.WP, bb.BK + 1):
+            for sq in bb.squares(pieces[code]):
+                codes.append(code)
+                squares.append(sq)
+        if len(codes) == 2:
+            return TablebaseResult(0, None)  # Bare kings
+        name, swapped, order = _arrange(codes)
+        table = self.table(name)
+        if table is None:
+            return None
+        white_to_move = gs.white_to_move
+        squares = [squares[i] for i in order]
+        if swapped:
+            squares = [sq ^ 56 for sq in squares]
+            white_to_move = not white_to_move
+        return decode_value(int(table[0 if white_to_move else 1, _index("P" in name, squares)]))
+
+    def lookup(self, codes: tuple, squares: list, white_to_move: bool) -> np.ndarray:
+        """
+        Looks up many positions with the same pieces at once, for building bigger tables.
+
+        :param codes: The piece codes.
+        :param squares: The square array of each piece.
+        :param white_to_move: Whose move it is in all of them.
+        :return: The stored bytes.
+        :raises FileNotFoundError: If the table hasn't been built.
+        """
+
+        if len(codes) == 2:
+            return np.zeros(len(squares[0]), np.uint8)
+        name, swapped, order = _arrange(codes)
+        table = self.table(name)
+        if table is None:
+            raise FileNotFoundError(f"No {name} table in {self.directory}")
+        squares = [squares[i] for i in order]
+        if swapped:
+            squares = [sq ^ 56 for sq in squares]
+            white_to_move = not white_to_move
+        return table[0 if white_to_move else 1][_Layout(name).index(squares)]
+
+    def best_move(self, gs):
+        """
+        The move that mates fastest when winning, holds the draw, or puts off mate longest when losing.
+
+        :param gs: The game state.
+        :return: The Move, or None if the position isn't covered or there are no moves.
+        """
+
+        if self.probe(gs) is None:
+            return None
+        best_move, best_key = None, None
+        for move in gs.valid_moves():
+            gs.make_move(move)
+            try:
+                after = self.probe(gs)
+            finally:
+                gs.undo_move()
+            if after is None:
+                continue
+            if after.wdl < 0:
+                key = (2, -after.plies)
+            elif after.wdl == 0:
+                key = (1, 0)
+            else:
+                key = (0, after.plies)
+            if best_key is None or key > best_key:
+                best_move, best_key = move, key
+        return best_move
+
+
+class _Builder:
+    """
+    The retrograde analysis of one table.
+
+    Every legal position starts unknown, with a count of the moves that stay in the table. Checkmates are lost
+    in 0 plies. Going back one move from the positions lost in n plies finds those won in n + 1. Going back from
+    the positions won in n plies takes one off the counts of their predecessors, and a predecessor whose count
+    reaches 0 with no capture or promotion that escapes is lost in n + 1. Captures and promotions are looked up
+    in the smaller tables when the counts are made, and hold back a win or loss until their own ply. Whatever is
+    still unknown when nothing changes is a draw.
+    """
+
+    def __init__(self, layout: _Layout, tables: Tablebases):
+        self.layout = layout
+        self.tables = tables
+        shape = (2, layout.size)
+        self.state = np.zeros(shape, np.uint8)
+        self.plies = np.zeros(shape, np.uint8)
+        self.count = np.zeros(shape, np.uint8)  # Moves inside the table not yet known to lose
+        self.exit_win = np.full(shape, _NONE, np.uint8)  # Fewest plies to mate through a capture or promotion
+        self.loss_floor = np.zeros(shape, np.uint8)  # The soonest the position can be lost in
+        self.exit_safe = np.zeros(shape, bool)  # A capture or promotion that draws or wins
+
+    def run(self) -> np.ndarray:
+        """
+        Solves every position.
+
+        :return: The (2, size) array of stored bytes.
+        """
+
+        for side in (bb.WHITE, bb.BLACK):
+            for start in range(0, self.layout.size, CHUNK):
+                self._scan(side, np.arange(start, min(start + CHUNK, self.layout.size)))
+
+        state = self.state
+        frontier = [np.flatnonzero(state[side] == _LOSS) for side in (bb.WHITE, bb.BLACK)]
+        ply = 1
+        while True:
+            if ply > 2 * (LOSS - 2):
+                raise OverflowError(f"{self.layout.name} has mates too long to store")
+            frontier = [self._step(side, ply, frontier[1 - side]) for side in (bb.WHITE, bb.BLACK)]
+            if not any(len(found) for found in frontier) and not self._pending(ply):
+                break
+            ply += 1
+
+        values = np.full(state.shape, ILLEGAL, np.uint8)
+        values[(state == _UNKNOWN) | (state == _DRAW)] = DRAW
+        won = state == _WIN
+        values[won] = (self.plies[won] + 1) // 2
+        lost = state == _LOSS
+        values[lost] = LOSS + self.plies[lost] // 2
+        return values
+
+    def _pending(self, ply: int) -> bool:
+        """
+        Whether a capture or promotion still has a win or loss to hand out after this ply.
+
+        :param ply: The ply just done.
+        :return:
+        """
+
+        unknown = self.state == _UNKNOWN
+        waiting_win = (self.exit_win != _NONE) & (self.exit_win > ply)
+        waiting_loss = (self.count == 0) & ~self.exit_safe & (self.loss_floor > ply)
+        return bool((unknown & (waiting_win | waiting_loss)).any())
+
+    def _step(self, side: int, ply: int, frontier: np.ndarray) -> np.ndarray:
+        """
+        Finds one side's positions decided in a number of plies.
+
+        :param side: The side to move in the positions found.
+        :param ply: The plies to mate, odd for wins and even for losses.
+        :param frontier: The other side's positions decided in one ply fewer.
+        :return: The positions found.
+        """
+
+        state = self.state[side]
+        found = self._predecessors(1 - side, frontier)
+        found = found[state[found] == _UNKNOWN]
+        if ply % 2:
+            found = np.union1d(found, np.flatnonzero((self.exit_win[side] == ply) & (state == _UNKNOWN)))
+            result = _WIN
+        else:
+            count = self.count[side]
+            np.subtract.at(count, found, 1)
+            emptied = np.unique(found[count[found] == 0])
+            self.loss_floor[side, emptied] = np.maximum(self.loss_floor[side, emptied], ply)
+            found = np.flatnonzero((count == 0) & (self.loss_floor[side] == ply) & ~self.exit_safe[side]
+                                   & (state == _UNKNOWN))
+            result = _LOSS
+        state[found] = result
+        self.plies[side, found] = ply
+        return found
+
+    def _scan(self, side: int, index: np.ndarray) -> None:
+        """
+        Marks illegal positions, checkmates and stalemates, counts the moves that stay in the table and looks up
+        the ones that leave it.
+
+        :param side: The side to move.
+        :param index: The positions.
+        :return:
+        """
+
+        codes = self.layout.codes
+        squares = self.layout.decode(index)
+        occupied = _occupancy(squares)
+        kings = [i for i, code in enumerate(codes) if (code - 1) % 6 == KING]
+        own_king, enemy_king = kings if side == bb.WHITE else kings[::-1]
+
+        legal = np.ones(len(index), bool)
+        for i in range(len(codes)):
+            for j in range(i):
+                legal &= squares[i] != squares[j]
+            if (codes[i] - 1) % 6 == PAWN:
+                legal &= (squares[i] >= 8) & (squares[i] < 56)
+        legal &= ~_attacked(codes, squares, squares[enemy_king], side, occupied)
+        in_check = _attacked(codes, squares, squares[own_king], 1 - side, occupied)
+
+        has_move = np.zeros(len(index), bool)
+        count = np.zeros(len(index), np.uint8)
+        enemies = [k for k, code in enumerate(codes) if bb.colour_of(code) != side and k != enemy_king]
+        step = -8 if side == bb.WHITE else 8
+        for j, code in enumerate(codes):
+            if bb.colour_of(code) != side:
+                continue
+            kind = (code - 1) % 6
+            origin = squares[j]
+            for end_sq in range(64):
+                end_bit = _BIT[end_sq]
+                taken = [legal & (squares[k] == end_sq) for k in enemies]
+                if kind == PAWN:
+                    empty = (occupied & end_bit) == 0
+                    moves = (origin + step == end_sq) & empty
+                    if end_sq >> 3 == (4 if side == bb.WHITE else 3):
+                        moves |= ((origin + 2 * step == end_sq) & empty
+                                  & ((occupied & _BIT[end_sq - step]) == 0))
+                    for capture in taken:
+                        moves |= _PAWN_ATTACKS[side, origin, end_sq] & capture
+                else:
+                    moves = _attacks(code, origin, end_sq, occupied)
+                    for k, other in enumerate(codes):
+                        if bb.colour_of(other) == side:
+                            moves &= squares[k] != end_sq
+                moves &= legal
+                if not moves.any():
+                    continue
+
+                after = list(squares)
+                after[j] = np.full(len(index), end_sq)
+                occupied_after = (occupied & ~_BIT[origin]) | end_bit
+                king_sq = end_sq if kind == KING else squares[own_king]
+                moves &= ~_attacked(codes, after, king_sq, 1 - side, occupied_after, captured_on=end_sq)
+                if not moves.any():
+                    continue
+                has_move |= moves
+
+                captured = np.zeros(len(index), bool)
+                leaving = []  # (codes, squares, positions) of the moves into other tables
+                for k, capture in zip(enemies, taken):
+                    capture &= moves
+                    captured |= capture
+                    if capture.any():
+                        leaving.append((k, capture))
+                quiet = moves & ~captured
+                if kind == PAWN and end_sq >> 3 == (0 if side == bb.WHITE else 7):
+                    leaving.append((None, quiet))
+                    for k, capture in leaving:
+                        for piece in (QUEEN, ROOK, BISHOP, KNIGHT):
+                            promoted = list(codes)
+                            promoted[j] = piece + (bb.WP if side == bb.WHITE else bb.BP)
+                            self._leave(side, index, promoted, after, k, capture)
+                else:
+                    count += quiet
+                    for k, capture in leaving:
+                        self._leave(side, index, list(codes), after, k, capture)
+
+        self.count[side, index] = count
+        state = np.where(legal, _UNKNOWN, _ILLEGAL)
+        state[legal & ~has_move] = np.where(in_check, _LOSS, _DRAW)[legal & ~has_move]
+        self.state[side, index] = state
+
+    def _leave(self, side: int, index: np.ndarray, codes: list, squares: list, captured, moves: np.ndarray) -> None:
+        """
+        Looks up moves that leave the table and records what they give the side making them.
+
+        :param side: The side moving.
+        :param index: The positions.
+        :param codes: The piece codes after the move, the captured piece still in place.
+        :param squares: The square arrays after the move.
+        :param captured: Which piece is captured, None for a promotion without one.
+        :param moves: Which of the positions the move is played in.
+        :return:
+        """
+
+        rows = np.flatnonzero(moves)
+        if not len(rows):
+            return
+        kept = [i for i in range(len(codes)) if i != captured]
+        values = self.tables.lookup(tuple(codes[i] for i in kept), [squares[i][rows] for i in kept],
+                                    side != bb.WHITE)
+        positions = index[rows]
+        lost = (values >= LOSS) & (values != ILLEGAL)  # Lost for the opponent
+        won = (values > DRAW) & (values < LOSS)
+        win_plies = np.where(lost, 2 * (values.astype(np.int64) - LOSS) + 1, _NONE)
+        self.exit_win[side, positions] = np.minimum(self.exit_win[side, positions], win_plies)
+        self.exit_safe[side, positions] |= ~won
+        loss_plies = np.where(won, 2 * values.astype(np.int64), 0)
+        self.loss_floor[side, positions] = np.maximum(self.loss_floor[side, positions], loss_plies)
+
+    def _predecessors(self, side: int, positions: np.ndarray) -> np.ndarray:
+        """
+        Takes back every move into some positions that could have been made inside the table.
+
+        :param side: The side to move in the positions, the other side made the move.
+        :param positions: The positions.
+        :return: The indexes of the positions before the moves, with the other side to move, one for each move.
+        """
+
+        codes = self.layout.codes
+        mover = 1 - side
+        step = -8 if mover == bb.WHITE else 8
+        start_row = 6 if mover == bb.WHITE else 1
+        kings = [i for i, code in enumerate(codes) if (code - 1) % 6 == KING]
+        enemy_king = kings[side]
+        found = []
+        for start in range(0, len(positions), CHUNK):
+            squares = self.layout.decode(positions[start:start + CHUNK])
+            occupied = _occupancy(squares)
+            for j, code in enumerate(codes):
+                if bb.colour_of(code) != mover:
+                    continue
+                kind = (code - 1) % 6
+                target = squares[j]
+                for start_sq in range(64):
+                    empty = (occupied & _BIT[start_sq]) == 0
+                    if kind == PAWN:
+                        if not 8 <= start_sq < 56:
+                            continue
+                        back = (target == start_sq + step) & empty
+                        if start_sq >> 3 == start_row:
+                            back |= (target == start_sq + 2 * step) & empty & ((occupied & _BIT[start_sq + step]) == 0)
+                    else:
+                        back = _attacks(code, start_sq, target, occupied) & empty
+                    rows = np.flatnonzero(back)
+                    if not len(rows):
+                        continue
+                    before = [sq[rows] for sq in squares]
+                    before[j] = np.full(len(rows), start_sq)
+                    occupied_before = (occupied[rows] & ~_BIT[target[rows]]) | _BIT[start_sq]
+                    legal = ~_attacked(codes, before, before[enemy_king], mover, occupied_before)
+                    found.append(self.layout.index([sq[legal] for sq in before]))
+        return np.concatenate(found) if found else np.zeros(0, np.int64)
+
+
+def build(name: str, directory: str = DEFAULT_DIR, log=None) -> dict:
+    """
+    Builds a table and any smaller tables it needs that aren't in the folder yet.
+
+    :param name: The material set, like "KRK".
+    :param directory: The folder the .tb files are written to.
+    :param log: Called with a line of text as each table is finished, if given.
+    :return: A dictionary of the table's name, positions, wins, draws and losses for the side to move, the
+        longest mate in moves and the seconds taken.
+    """
+    name = canonical_name(name)
+    if len(name) > MAX_PIECES:
+        raise ValueError(f"Tables are built for up to {MAX_PIECES} pieces, not {name}")
+    if len(name) < 3:
+        raise ValueError("Bare kings are always a draw")
+    os.makedirs(directory, exist_ok=True)
+    for dependency in dependencies(name):
+        if not os.path.exists(os.path.join(directory, dependency + EXTENSION)):
+            build(dependency, directory, log)
+
+    start = time.perf_counter()
+    layout = _Layout(name)
+    values = _Builder(layout, Tablebases(directory)).run()
+    path = os.path.join(directory, name + EXTENSION)
+    with open(path + ".tmp", "wb") as file:  # Renamed once complete, a half written table is never read
+        file.write(HEADER.pack(MAGIC, layout.size))
+        file.write(values.tobytes())
+    os.replace(path + ".tmp", path)
+
+    wins = (values > DRAW) & (values < LOSS)
+    losses = (values >= LOSS) & (values != ILLEGAL)
+    stats = {
+        "name": name,
+        "positions": int((values != ILLEGAL).sum()),
+        "wins": int(wins.sum()),
+        "draws": int((values == DRAW).sum()),
+        "losses": int(losses.sum()),
+        "longest": int(values[wins].max(initial=0)),
+        "seconds": time.perf_counter() - start,
+    }
+    if log is not None:
+        log(f"{name}: {stats['positions']} positions, {stats['wins']} won, {stats['draws']} drawn, "
+            f"{stats['losses']} lost, longest mate {stats['longest']} moves, {stats['seconds']:.1f}s")
+    return stats
+
+
+THREE_PIECE = ("KQK", "KRK", "KBK", "KNK", "KPK")
+
+
+def main() -> None:
+    """
+    The command line interface.
+
+    :return:
+    """
+
+    parser = argparse.ArgumentParser(description="Build or probe endgame tablebases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build tables and the smaller tables they need")
+    build_parser.add_argument("tables", nargs="*", default=list(THREE_PIECE), help="material sets, like KRKP")
+    build_parser.add_argument("--dir", default=DEFAULT_DIR, help="the tablebase folder")
+    probe_parser = commands.add_parser("probe", help="look a position up")
+    probe_parser.add_argument("--fen", required=True, help="the position")
+    probe_parser.add_argument("--dir", default=DEFAULT_DIR, help="the tablebase folder")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for name in args.tables:
+            build(name, args.dir, print)
+        return
+
+    tables = Tablebases(args.dir)
+    gs = chess_engine.GameState.from_fen(args.fen, board_backend="mailbox")
+    result = tables.probe(gs)
+    if result is None:
+        print("not in the tablebases")
+        return
+    move = tables.best_move(gs)
+    print(f"{result!r}, best move {move.get_chess_notation() if move is not None else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import unittest
+import analysis
+
+MATE_IN_ONE = "rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2"
+CHECKMATED = "rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3"
+STALEMATED = "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1"
+
+
+class TestAnalysis(unittest.TestCase):
+    """Batch analysis gives the same answers in and out of worker processes"""
+
+    positions = [MATE_IN_ONE, CHECKMATED, STALEMATED, ["e2e4", "e7e5"], "not a fen", ["e2e5"]]
+
+    def check(self, results):
+        self.assertEqual([result.index for result in results], list(range(len(self.positions))))
+        mate, checkmated, stalemated, moves, bad_fen, bad_move = results
+        self.assertEqual(mate.best_move, "d8h4")
+        self.assertEqual(checkmated.legal_moves, 0)
+        self.assertTrue(checkmated.checkmate)
+        self.assertIsNone(checkmated.best_move)
+        self.assertTrue(stalemated.stalemate)
+        self.assertEqual(moves.legal_moves, 29)
+        self.assertIsNotNone(bad_fen.error)
+        self.assertIsNotNone(bad_move.error)
+
+    def test_in_process(self):
+        self.check(list(analysis.analyse_positions(self.positions, workers=0, depth=2)))
+
+    def test_ordered(self):
+        self.check(list(analysis.analyse_positions(self.positions, workers=2, chunk_size=1, depth=2)))
+
+    def test_unordered(self):
+        results = analysis.analyse_positions(self.positions, workers=2, chunk_size=2, ordered=False, depth=2)
+        self.check(sorted(results, key=lambda result: result.index))
+
+    def test_bad_position_in_batch(self):
+        # A king-less board in the middle of a batch gives an error result, everything after it still arrives
+        positions = [MATE_IN_ONE] * 3 + ["4k3/8/8/8/8/8/8/8 w - - 0 1"] + [STALEMATED] * 4
+        results = list(analysis.analyse_positions(positions, workers=2, chunk_size=2, depth=1))
+        self.assertEqual(len(results), len(positions))
+        self.assertEqual([result.error is not None for result in results], [False] * 3 + [True] + [False] * 4)
+
+    def test_failed_search(self):
+        class Broken:
+            def search(self, *args, **kwargs):
+                raise RuntimeError("broken")
+
+        result = analysis.analyse_position(MATE_IN_ONE, 5, searcher=Broken())
+        self.assertEqual((result.index, result.error), (5, "RuntimeError: broken"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
+import io
+import random
 import unittest
 import chess_engine
 import numpy as np
+import profiling
+import zobrist
 
 
 class TestChessEngine(unittest.TestCase):
@@ -30,6 +34,384 @@ class TestChessEngine(unittest.TestCase):
     def test_movelog_empty(self):
         self.assertEqual(self.gs.movelog, [])
 
+    def test_bitboards_match_board(self):
+        self.assertTrue((self.gs.bitboards.to_board() == self.gs.board).all())
+
+    def test_opening_moves(self):
+        self.assertEqual(len(self.gs.valid_moves()), 20)
+
+    def test_bitboards_follow_moves(self):
+        """Plays a short game with an enpassant capture and undoes it, checking the bitboards at each step"""
+        for notation in ("e2e4", "a7a6", "e4e5", "d7d5", "e5d6", "c7d6"):
+            move = next(m for m in self.gs.valid_moves() if m.get_chess_notation() == notation)
+            self.gs.make_move(move)
+            self.assertTrue((self.gs.bitboards.to_board() == self.gs.board).all())
+        self.assertEqual(self.gs.board[2][3], "bP")
+        while self.gs.movelog:
+            self.gs.undo_move()
+            self.assertTrue((self.gs.bitboards.to_board() == self.gs.board).all())
+        self.test_board()
+
+    def play(self, *notations):
+        for notation in notations:
+            move = next(m for m in self.gs.valid_moves() if m.get_chess_notation() == notation)
+            self.gs.make_move(move)
+
+    def test_square_attacked_by_colour(self):
+        self.assertTrue(self.gs.square_attacked(5, 0, by_white=True))  # a3 by the b2 pawn and the b1 knight
+        self.assertFalse(self.gs.square_attacked(5, 0, by_white=False))
+        self.assertTrue(self.gs.square_attacked(2, 7, by_white=False))
+        self.assertFalse(self.gs.square_attacked(4, 4))  # e4, by black as white is to move
+
+    def test_checkers_and_mate(self):
+        self.play("e2e4", "f7f6", "d2d4", "g7g5")
+        self.play("d1h5")
+        self.assertEqual(self.gs.checkers(), [(3, 7)])
+        self.assertTrue(self.gs.in_check())
+        self.assertEqual(self.gs.valid_moves(), [])
+        self.assertTrue(self.gs.checkmate)
+
+    def test_check_evasions(self):
+        self.play("e2e4", "d7d5", "f1b5")
+        moves = sorted(m.get_chess_notation() for m in self.gs.valid_moves())
+        self.assertEqual(moves, ["b8c6", "b8d7", "c7c6", "c8d7", "d8d7"])
+
+    def test_pinned_piece_cannot_move(self):
+        self.play("d2d4", "e7e6", "b1c3", "f8b4")
+        moves = [m.get_chess_notation() for m in self.gs.valid_moves()]
+        self.assertFalse([m for m in moves if m.startswith("c3")])
+
+    def test_castling(self):
+        self.gs.load_fen("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+        before = self.gs.board.copy()
+        moves = {m.get_chess_notation(): m for m in self.gs.valid_moves()}
+        self.assertIn("e1g1", moves)
+        self.assertIn("e1c1", moves)
+        self.gs.make_move(moves["e1g1"])
+        self.assertEqual(self.gs.board[7][6], "wK")
+        self.assertEqual(self.gs.board[7][5], "wR")
+        self.assertEqual(self.gs.board[7][7], "--")
+        self.assertEqual(self.gs.castling_rights, chess_engine.BLACK_KINGSIDE | chess_engine.BLACK_QUEENSIDE)
+        self.assertTrue((self.gs.bitboards.to_board() == self.gs.board).all())
+        self.gs.undo_move()
+        self.assertTrue((self.gs.board == before).all())
+        self.assertEqual(self.gs.castling_rights, 15)
+
+    def test_no_castling_through_check(self):
+        self.gs.load_fen("r3k2r/8/8/8/8/8/5r2/R3K2R w KQkq - 0 1")  # Rook on f2 covers f1
+        moves = [m.get_chess_notation() for m in self.gs.valid_moves()]
+        self.assertNotIn("e1g1", moves)
+        self.assertIn("e1c1", moves)
+        self.gs.load_fen("r3k2r/8/8/8/8/8/8/R3K2R w kq - 0 1")  # No rights
+        self.assertFalse([m for m in self.gs.valid_moves() if m.castle_move])
+        self.gs.load_fen("r3k2r/8/8/8/8/8/4r3/R3K2R w KQkq - 0 1")  # In check
+        self.assertFalse([m for m in self.gs.valid_moves() if m.castle_move])
+
+    def test_underpromotion(self):
+        self.gs.load_fen("8/4P3/8/8/8/8/k7/4K3 w - - 0 1")
+        promotions = sorted(m.get_chess_notation() for m in self.gs.valid_moves() if m.pawn_promotion)
+        self.assertEqual(promotions, ["e7e8b", "e7e8n", "e7e8q", "e7e8r"])
+        move = next(m for m in self.gs.valid_moves() if m.get_chess_notation() == "e7e8n")
+        self.gs.make_move(move)
+        self.assertEqual(self.gs.board[0][4], "wN")
+        self.gs.undo_move()
+        self.assertEqual(self.gs.board[1][4], "wP")
+        self.assertEqual(chess_engine.Move((1, 4), (0, 4), self.gs.board, promotion="N"), move)
+
+
+class TestZobrist(unittest.TestCase):
+    """Checks the incrementally updated key against a key built from scratch"""
+
+    def setUp(self):
+        self.gs = chess_engine.GameState()
+
+    def play(self, *notations):
+        for notation in notations:
+            move = next(m for m in self.gs.valid_moves() if m.get_chess_notation() == notation)
+            self.gs.make_move(move)
+
+    def scratch_key(self):
+        return zobrist.position_key(self.gs.bitboards, self.gs.white_to_move, self.gs.enpassant_possible,
+                                    self.gs.castling_rights)
+
+    def test_incremental_key(self):
+        start_key = self.gs.zobrist_key
+        self.play("e2e4", "d7d5", "e4d5", "c7c5", "d5c6", "b8c6", "f1b5", "d8d2", "b1d2")
+        self.assertEqual(self.gs.zobrist_key, self.scratch_key())
+        while self.gs.movelog:
+            self.gs.undo_move()
+            self.assertEqual(self.gs.zobrist_key, self.scratch_key())
+        self.assertEqual(self.gs.zobrist_key, start_key)
+
+    def test_castling_key(self):
+        self.play("e2e4", "e7e5", "g1f3", "g8f6", "f1c4", "f8c5", "e1g1", "e8g8")
+        self.assertEqual(self.gs.zobrist_key, self.scratch_key())
+        self.gs.undo_move()
+        self.gs.undo_move()
+        self.assertEqual(self.gs.zobrist_key, self.scratch_key())
+
+    def test_enpassant_only_counts_when_capturable(self):
+        self.play("e2e4")  # No black pawn can take on e3
+        self.assertEqual(self.gs.zobrist_key, zobrist.position_key(self.gs.bitboards, False, (), 15))
+
+    def test_threefold_repetition(self):
+        self.assertEqual(self.gs.repetition_count(), 1)
+        self.play("g1f3", "g8f6", "f3g1", "f6g8")
+        self.assertEqual(self.gs.repetition_count(), 2)
+        self.assertFalse(self.gs.threefold_repetition())
+        self.play("g1f3", "g8f6", "f3g1", "f6g8")
+        self.assertTrue(self.gs.threefold_repetition())
+        self.gs.undo_move()
+        self.assertFalse(self.gs.threefold_repetition())
+
+
+class TestMoveCache(unittest.TestCase):
+    """Moves built from the per piece caches match a full regeneration"""
+
+    def setUp(self):
+        self.gs = chess_engine.GameState()
+        self.gs.verify_incremental = True
+
+    def test_random_games_verified(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            self.gs.set_board(chess_engine.GameState().board, castling_rights=15)
+            for _ in range(80):
+                moves = self.gs.valid_moves()  # Raises if the cache is wrong
+                if not moves:
+                    break
+                self.gs.make_move(rng.choice(moves))
+                if rng.random() < 0.25:
+                    self.gs.undo_move()
+
+    def test_only_affected_pieces_recomputed(self):
+        self.gs.valid_moves()
+        cache = self.gs._move_cache[0]
+        before = dict(cache)
+        move = next(m for m in self.gs.valid_moves() if m.get_chess_notation() == "g1f3")
+        self.gs.make_move(move)
+        self.gs.undo_move()
+        self.gs.valid_moves()
+        # Only the knight, and the pieces whose squares it covers or blocks, were worked out again
+        recomputed = {sq for sq in cache if cache[sq] is not before.get(sq)}
+        # The g1 knight, the h1 rook that it blocked, and the e2, f2 and g2 pawns which look at f3
+        self.assertEqual(recomputed, {62, 63, 52, 53, 54})
+
+
+class TestLazyMoves(unittest.TestCase):
+    """The move generators give the same moves as valid_moves"""
+
+    def test_random_games(self):
+        rng = random.Random(5)
+        for fen in (chess_engine.STARTING_FEN, "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"):
+            gs = chess_engine.GameState.from_fen(fen)
+            for _ in range(60):
+                moves = gs.valid_moves()
+                codes = [move.code for move in moves]
+                self.assertEqual([move.code for move in gs.legal_moves()], codes)
+                self.assertEqual([move.code for move in gs.capture_moves()],
+                                 [code for code in codes if code >> 16 & 15])
+                self.assertEqual([move.code for move in gs.quiet_moves()],
+                                 [code for code in codes if not code >> 16 & 15])
+                self.assertEqual(gs.has_any_legal_move(), bool(moves))
+                if not moves:
+                    break
+                gs.make_move(rng.choice(moves))
+
+    def test_enpassant_is_a_capture(self):
+        gs = chess_engine.GameState.from_fen("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+        self.assertEqual([move.get_chess_notation() for move in gs.capture_moves()], ["e5d6"])
+        self.assertNotIn("e5d6", [move.get_chess_notation() for move in gs.quiet_moves()])
+
+    def test_mate_and_stalemate(self):
+        gs = chess_engine.GameState.from_fen("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1")
+        self.assertFalse(gs.has_any_legal_move())
+        self.assertTrue(gs.is_checkmate())
+        self.assertFalse(gs.is_stalemate())
+        gs = chess_engine.GameState.from_fen("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        self.assertTrue(gs.is_stalemate())
+        self.assertFalse(gs.is_checkmate())
+        self.assertFalse(chess_engine.GameState().is_checkmate())
+
+    def test_stops_early(self):
+        gs = chess_engine.GameState()
+        profiler = profiling.Profiler()
+        with profiler.attached(gs):
+            self.assertTrue(gs.has_any_legal_move())
+        self.assertEqual(profiler.calls["king_move"], 0)  # Found a pawn move without reaching the king
+
+
+class TestBoardBackends(unittest.TestCase):
+    """The mailbox board plays the same game as the Numpy board"""
+
+    def test_same_game(self):
+        rng = random.Random(11)
+        for _ in range(10):
+            numpy_gs = chess_engine.GameState()
+            mailbox_gs = chess_engine.GameState(board_backend="mailbox")
+            for _ in range(100):
+                numpy_moves = numpy_gs.valid_moves()
+                self.assertEqual([m.code for m in numpy_moves], [m.code for m in mailbox_gs.valid_moves()])
+                self.assertEqual(numpy_gs.board.tolist(), np.asarray(mailbox_gs.board).tolist())
+                if not numpy_moves:
+                    break
+                move = rng.choice(numpy_moves)
+                numpy_gs.make_move(move)
+                mailbox_gs.make_move(move)
+                if rng.random() < 0.25:
+                    numpy_gs.undo_move()
+                    mailbox_gs.undo_move()
+            self.assertEqual(numpy_gs.to_fen(), mailbox_gs.to_fen())
+            self.assertEqual(mailbox_gs.board.codes(), bytes(mailbox_gs.bitboards.mailbox))
+
+    def test_string_access(self):
+        gs = chess_engine.GameState(board_backend="mailbox")
+        self.assertEqual(gs.board[7][4], "wK")
+        self.assertEqual(gs.board[4][4], "--")
+        move = chess_engine.Move((6, 4), (4, 4), gs.board)
+        self.assertIn(move, gs.valid_moves())
+        drawn = gs.board.copy()
+        gs.make_move(move)
+        self.assertNotEqual(drawn, gs.board)
+        gs.undo_move()
+        self.assertEqual(drawn, gs.board)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            chess_engine.GameState(board_backend="strings")
+
+    def test_mailbox_rows(self):
+        gs = chess_engine.GameState(board_backend="mailbox")
+        self.assertIs(gs.board[6], gs.board[6])  # Read again without building a new row
+        gs.make_move(chess_engine.Move((6, 4), (4, 4), gs.board))
+        self.assertEqual(gs.board[6][4], "--")
+        self.assertEqual(gs.board[4][4], "wP")
+        self.assertEqual(gs.board[-4], gs.board[4])
+        for row in (8, -9):
+            with self.assertRaises(IndexError):
+                gs.board[row]
+        self.assertIs(gs.board.cells, gs.bitboards.mailbox)  # A view, not a copy to keep in step
+
+
+class TestFen(unittest.TestCase):
+    """Checks positions can be loaded and saved as FEN"""
+
+    START = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+    def test_start_position(self):
+        gs = chess_engine.GameState()
+        self.assertEqual(gs.to_fen(), self.START)
+        loaded = chess_engine.GameState.from_fen(self.START)
+        self.assertTrue((loaded.board == gs.board).all())
+        self.assertEqual(loaded.zobrist_key, gs.zobrist_key)
+
+    def test_round_trip(self):
+        for fen in ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                    "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+                    "4k3/8/8/8/8/8/8/4K2R w K - 12 40"):
+            gs = chess_engine.GameState.from_fen(fen)
+            self.assertEqual(gs.to_fen(), fen)
+            self.assertEqual(gs.bitboards.to_board().tolist(), gs.board.tolist())
+
+    def test_king_locations_and_turn(self):
+        gs = chess_engine.GameState.from_fen("8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1")
+        self.assertEqual((gs.white_king_loc, gs.black_king_loc), ((6, 5), (2, 1)))
+        self.assertFalse(gs.white_to_move)
+        self.assertEqual(gs.enpassant_possible, (5, 3))
+
+    def test_clocks_and_castling_follow_moves(self):
+        gs = chess_engine.GameState()
+        for notation in ("g1f3", "g8f6", "h1g1"):
+            gs.make_move(next(m for m in gs.valid_moves() if m.get_chess_notation() == notation))
+        self.assertEqual(gs.to_fen(), "rnbqkb1r/pppppppp/5n2/8/8/5N2/PPPPPPPP/RNBQKBR1 b Qkq - 3 2")
+        while gs.movelog:
+            gs.undo_move()
+        self.assertEqual(gs.to_fen(), self.START)
+
+    def test_undo_restores_state(self):
+        # Long enough to outgrow the preallocated state stack, every position is put back exactly on the way out
+        rng = random.Random(11)
+        gs = chess_engine.GameState.from_fen("8/8/1k6/2b5/2pP4/8/5K2/R6R b - d3 0 1")
+        fens = []
+        while len(fens) < chess_engine.STATE_STACK_PLIES + 20:
+            moves = gs.valid_moves()
+            if not moves:
+                break
+            fens.append((gs.to_fen(), gs.zobrist_key))
+            gs.make_move(rng.choice(moves))
+        while fens:
+            gs.undo_move()
+            self.assertEqual((gs.to_fen(), gs.zobrist_key), fens.pop())
+
+    def test_bad_fen(self):
+        bad = {
+            "ranks": "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w",
+            "empty": "",
+            "no white king": "4k3/8/8/8/8/8/8/8 w - - 0 1",
+            "two black kings": "4k2k/8/8/8/8/8/8/4K3 w - - 0 1",
+            "side": "4k3/8/8/8/8/8/8/4K3 x - - 0 1",
+            "castling": "4k3/8/8/8/8/8/8/4K3 w KX - 0 1",
+            "castling repeated": "4k3/8/8/8/8/8/8/4K3 w KK - 0 1",
+            "enpassant off the board": "4k3/8/8/8/8/8/8/4K3 w - e9 0 1",
+            "enpassant wrong rank": "4k3/8/8/8/8/8/8/4K3 w - e3 0 1",
+            "enpassant file": "4k3/8/8/8/8/8/8/4K3 b - z3 0 1",
+            "halfmove clock": "4k3/8/8/8/8/8/8/4K3 w - - -1 1",
+            "move number": "4k3/8/8/8/8/8/8/4K3 w - - 0 0",
+            "clock text": "4k3/8/8/8/8/8/8/4K3 w - - 0 x",
+            "extra field": "4k3/8/8/8/8/8/8/4K3 w - - 0 1 1",
+            "white pawn on the last rank": "P3k3/8/8/8/8/8/8/4K3 w - - 0 1",
+            "black pawn on the first rank": "4k3/8/8/8/8/8/8/p3K3 b - - 0 1",
+            "side not to move in check": "4k3/8/8/8/8/8/8/4R1K1 w - - 0 1",
+        }
+        for name, fen in bad.items():
+            with self.subTest(name), self.assertRaises(ValueError):
+                chess_engine.GameState.from_fen(fen)
+        # Missing trailing fields still default
+        self.assertEqual(chess_engine.GameState.from_fen("4k3/8/8/8/8/8/8/4K3").to_fen(), "4k3/8/8/8/8/8/8/4K3 w - - 0 1")
+
+    def test_castling_needs_king_and_rook(self):
+        gs = chess_engine.GameState.from_fen("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1")
+        self.assertEqual(gs.to_fen(), "r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1")
+        bare = chess_engine.GameState.from_fen("4k3/8/8/8/8/8/8/4K3 w KQkq - 0 1")
+        self.assertEqual(bare.castling_rights, 0)
+        self.assertEqual(bare.zobrist_key, chess_engine.GameState.from_fen("4k3/8/8/8/8/8/8/4K3 w - - 0 1").zobrist_key)
+
+    def test_read_fens_streams(self):
+        lines = io.StringIO("# comment\n" + self.START + "\n\n8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1 ; id test\n")
+        positions = chess_engine.read_fens(lines)
+        self.assertEqual(next(positions).to_fen(), self.START)
+        self.assertEqual(len(next(positions).valid_moves()), 15)
+        self.assertEqual(list(positions), [])
+
+
+class TestMove(unittest.TestCase):
+    """Checks the packed Move still behaves like the old one"""
+
+    def setUp(self):
+        self.gs = chess_engine.GameState()
+
+    def test_fields_from_board(self):
+        move = chess_engine.Move((6, 4), (4, 4), self.gs.board)
+        self.assertEqual((move.start_row, move.start_col, move.end_row, move.end_col), (6, 4, 4, 4))
+        self.assertEqual(move.piece_moved, "wP")
+        self.assertEqual(move.piece_captured, "--")
+        self.assertEqual(move.move_id, 6444)
+        self.assertEqual(move.get_chess_notation(), "e2e4")
+
+    def test_equal_to_generated_move(self):
+        move = chess_engine.Move((7, 6), (5, 5), self.gs.board)
+        generated = self.gs.valid_moves()
+        self.assertIn(move, generated)
+        self.assertEqual(len(set(generated)), 20)
+        self.assertEqual(hash(move), hash(generated[generated.index(move)]))
+
+    def test_from_code(self):
+        move = chess_engine.Move((1, 0), (3, 0), self.gs.board)
+        self.assertEqual(move.piece_moved, "bP")
+        self.assertFalse(move.pawn_promotion)
+        self.assertEqual(chess_engine.Move.from_code(move.code), move)
+        self.assertFalse(hasattr(move, "__dict__"))
+
 
 if __name__ == "__main__":
     unittest.main()
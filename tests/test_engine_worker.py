@@ -0,0 +1,67 @@
+import time
+import unittest
+import chess_engine
+import engine_worker
+
+
+def wait_for(worker, seconds=10):
+    end = time.time() + seconds
+    while time.time() < end:
+        result = worker.poll()
+        if result is not None:
+            return result
+        time.sleep(0.01)
+    return None
+
+
+class TestEngineWorker(unittest.TestCase):
+    """The worker answers without blocking, can be cancelled and keeps a ponder search on a hit"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.worker = engine_worker.EngineWorker(time_limit=0.2, hash_mb=1)
+        cls.worker.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.close()
+
+    def test_think(self):
+        gs = chess_engine.GameState()
+        self.worker.think(gs)
+        self.assertIsNone(self.worker.poll())  # Returns straight away
+        result = wait_for(self.worker)
+        self.assertIn(result.best_move, gs.valid_moves())
+        self.assertFalse(self.worker.thinking)
+
+    def test_cancel(self):
+        gs = chess_engine.GameState()
+        self.worker.time_limit = 30
+        try:
+            self.worker.think(gs)
+            time.sleep(0.1)
+            self.worker.cancel()
+            self.assertIsNone(wait_for(self.worker, 0.5))
+            # The worker is free again straight away
+            self.worker.time_limit = 0.2
+            self.worker.think(gs)
+            self.assertIsNotNone(wait_for(self.worker, 5))
+        finally:
+            self.worker.time_limit = 0.2
+
+    def test_ponder_hit(self):
+        gs = chess_engine.GameState()
+        reply = gs.valid_moves()[0]
+        self.worker.ponder(gs, reply)
+        self.assertEqual(len(gs.movelog), 0)
+        time.sleep(0.3)
+        self.assertIsNone(self.worker.poll())  # Nothing comes back until the reply is played
+        gs.make_move(reply)
+        self.worker.think(gs)
+        self.assertFalse(self.worker.pondering)
+        result = wait_for(self.worker)
+        self.assertIn(result.best_move, gs.valid_moves())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import random
+import unittest
+import numpy as np
+import chess_engine
+import evaluation
+
+
+class TestEvaluation(unittest.TestCase):
+    """The batch, scalar and incremental scores agree"""
+
+    def random_states(self, count, seed=5):
+        rng = random.Random(seed)
+        gs = chess_engine.GameState()
+        states = []
+        while len(states) < count:
+            moves = gs.valid_moves()
+            if not moves:
+                gs = chess_engine.GameState()
+                continue
+            gs.make_move(rng.choice(moves))
+            states.append(chess_engine.GameState.from_fen(gs.to_fen()))
+            self.assertEqual(gs.eval_score, evaluation.score_mailbox(gs.bitboards.mailbox))
+        return states
+
+    def test_start_is_level(self):
+        gs = chess_engine.GameState()
+        self.assertEqual(gs.eval_score, 0)
+        self.assertEqual(evaluation.evaluate_batch(evaluation.stack_positions([gs])).tolist(), [0])
+
+    def test_batch_matches_scalar(self):
+        states = self.random_states(200)
+        boards = evaluation.stack_positions(states)
+        self.assertEqual(boards.shape, (200, 64))
+        self.assertEqual(evaluation.evaluate_batch(boards).tolist(), [gs.eval_score for gs in states])
+        self.assertEqual(evaluation.material_batch(boards).tolist(),
+                         [evaluation.material(gs.bitboards) for gs in states])
+        to_move = np.array([gs.white_to_move for gs in states])
+        self.assertEqual(evaluation.evaluate_batch(boards, to_move).tolist(),
+                         [evaluation.evaluate(gs) for gs in states])
+
+    def test_encode_board(self):
+        for gs in self.random_states(20, seed=9):
+            self.assertEqual(evaluation.encode_board(gs.board).tolist(), list(gs.bitboards.mailbox))
+
+    def test_mirrored_position_negates(self):
+        gs = chess_engine.GameState.from_fen("4k3/8/8/3p4/8/2N5/8/4K3 w - - 0 1")
+        mirrored = chess_engine.GameState.from_fen("4k3/8/2n5/8/3P4/8/8/4K3 b - - 0 1")
+        self.assertEqual(gs.eval_score, -mirrored.eval_score)
+        self.assertEqual(evaluation.evaluate(gs), evaluation.evaluate(mirrored))
+
+
+if __name__ == "__main__":
+    unittest.main()
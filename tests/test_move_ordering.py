@@ -0,0 +1,70 @@
+import unittest
+import chess_engine
+import move_ordering
+import search
+
+
+class TestMoveOrdering(unittest.TestCase):
+    """Checks the order the search tries moves in"""
+
+    def setUp(self):
+        self.orderer = move_ordering.MoveOrderer()
+
+    def notations(self, fen, ply=0, hash_move=None):
+        moves = chess_engine.GameState.from_fen(fen).valid_moves()
+        return [move.get_chess_notation() for move in self.orderer.ordered(moves, ply, hash_move)]
+
+    def find(self, gs, notation):
+        return next(move for move in gs.valid_moves() if move.get_chess_notation() == notation)
+
+    def test_mvv_lva(self):
+        # The queen on d5 can be taken by the pawn or the rook, the knight on h5 by the queen
+        order = self.notations("4k3/8/8/3q3n/4P3/8/4Q3/3RK3 w - - 0 1")
+        self.assertEqual(order[:3], ["e4d5", "d1d5", "e2h5"])
+
+    def test_promotions(self):
+        order = self.notations("8/P6k/8/8/8/8/8/K7 w - - 0 1")
+        self.assertEqual(order[0], "a7a8q")
+        self.assertEqual(set(order[-3:]), {"a7a8r", "a7a8b", "a7a8n"})
+
+    def test_hash_move_first(self):
+        gs = chess_engine.GameState()
+        hash_move = self.find(gs, "g2g3")
+        order = self.notations(chess_engine.STARTING_FEN, hash_move=hash_move)
+        self.assertEqual(order[0], "g2g3")
+        self.assertEqual(sorted(order), sorted(move.get_chess_notation() for move in gs.valid_moves()))
+
+    def test_killers_and_history(self):
+        gs = chess_engine.GameState()
+        self.orderer.record_cutoff(self.find(gs, "b1c3"), 2, 3)
+        self.orderer.record_cutoff(self.find(gs, "h2h3"), 2, 2)
+        self.orderer.record_cutoff(self.find(gs, "a2a4"), 1, 4)
+        self.assertEqual(self.notations(chess_engine.STARTING_FEN, ply=2)[:3], ["h2h3", "b1c3", "a2a4"])
+        self.assertEqual(self.notations(chess_engine.STARTING_FEN, ply=1)[:3], ["a2a4", "b1c3", "h2h3"])
+
+        self.orderer.new_search()
+        self.assertEqual(self.orderer.killer_moves[2], [None, None])
+        self.assertEqual(self.notations(chess_engine.STARTING_FEN, ply=2)[0], "a2a4")
+
+    def test_captures_not_killers(self):
+        gs = chess_engine.GameState.from_fen("4k3/8/8/3q4/4P3/8/8/4K3 w - - 0 1")
+        self.orderer.record_cutoff(self.find(gs, "e4d5"), 0, 3)
+        self.assertEqual(self.orderer.killer_moves[0], [None, None])
+        self.assertFalse(any(self.orderer.history_table))
+
+    def test_picks_lazily(self):
+        moves = chess_engine.GameState().valid_moves()
+        first = next(self.orderer.ordered(moves))
+        self.assertIn(first, moves)
+
+    def test_fewer_nodes(self):
+        fen = move_ordering.BENCHMARK_POSITIONS[2]
+        nodes = []
+        for _, options in move_ordering.CONFIGURATIONS[::3]:
+            searcher = search.Searcher(max_depth=3, orderer=move_ordering.MoveOrderer(**options))
+            nodes.append(searcher.search(chess_engine.GameState.from_fen(fen)).nodes)
+        self.assertLess(nodes[1], nodes[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
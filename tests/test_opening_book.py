@@ -0,0 +1,95 @@
+import io
+import os
+import tempfile
+import unittest
+import chess_engine
+import opening_book
+import pgn
+import search
+
+GAMES = """[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 1-0
+
+[Result "1/2-1/2"]
+
+1. e4 c5 2. Nf3 d6 1/2-1/2
+
+[Result "0-1"]
+
+1. d4 Nf6 2. c4 e6 0-1
+
+[Result "1-0"]
+[SetUp "1"]
+[FEN "4k3/8/8/8/8/8/8/4K3 w - e9 0 1"]
+
+1. Kd2 1-0
+
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nf6 3. Nxe5 1-0
+
+[Result "*"]
+
+1. e4 e5 2. Ke3 *
+"""
+
+
+class TestOpeningBook(unittest.TestCase):
+    """A book built from games gives their moves back"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "book.bin")
+        self.stats = opening_book.build_book(pgn.read_games(io.StringIO(GAMES)), self.path)
+        self.book = opening_book.OpeningBook(self.path, seed=1)
+        self.addCleanup(self.book.close)
+
+    def weights(self, gs):
+        return {move.get_chess_notation(): weight for move, weight in self.book.moves(gs)}
+
+    def test_file_sorted(self):
+        self.assertEqual(self.stats, {"games": 6, "skipped": 2, "entries": len(self.book)})
+        with open(self.path, "rb") as file:
+            data = file.read()
+        self.assertEqual(len(data), len(self.book) * opening_book.ENTRY.size)
+        keys = [entry[0] for entry in opening_book.ENTRY.iter_unpack(data)]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_weights(self):
+        gs = chess_engine.GameState()
+        # Two wins and a draw for e4, d4 only lost
+        self.assertEqual(self.weights(gs), {"e2e4": 5})
+        gs.make_move(pgn.san_to_move(gs, "e4"))
+        self.assertEqual(self.weights(gs), {"c7c5": 1})  # e5 never scored for black, so it is left out
+        gs = chess_engine.GameState()
+        gs.make_move(pgn.san_to_move(gs, "d4"))
+        self.assertEqual(self.weights(gs), {"g8f6": 2})
+
+    def test_choose(self):
+        gs = chess_engine.GameState()
+        self.assertEqual(self.book.choose(gs).get_chess_notation(), "e2e4")
+        gs.make_move(pgn.san_to_move(gs, "h4"))
+        self.assertIsNone(self.book.choose(gs))
+
+    def test_encode_castling_and_promotion(self):
+        gs = chess_engine.GameState.from_fen("r3k3/1P6/8/8/8/8/8/4K2R w Kq - 0 1")
+        encoded = {move.get_chess_notation(): opening_book.encode_move(move) for move in gs.valid_moves()}
+        self.assertEqual(encoded["e1g1"], 4 << 6 | 7)  # e1 takes h1
+        self.assertEqual(encoded["b7a8n"], 1 << 12 | 6 << 9 | 1 << 6 | 7 << 3)  # b7 to a8, knight
+
+    def test_searcher_plays_from_book(self):
+        result = search.Searcher(book=self.book).search(chess_engine.GameState())
+        self.assertEqual((result.best_move.get_chess_notation(), result.depth, result.nodes), ("e2e4", 0, 0))
+
+    def test_empty_book(self):
+        path = os.path.join(os.path.dirname(self.path), "empty.bin")
+        opening_book.build_book([], path)
+        with opening_book.OpeningBook(path) as book:
+            self.assertEqual(len(book), 0)
+            self.assertEqual(book.moves(chess_engine.GameState()), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
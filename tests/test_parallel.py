@@ -0,0 +1,38 @@
+import time
+import unittest
+import parallel
+
+
+def _slow_first(chunk):
+    if chunk[0] == 0:
+        time.sleep(0.5)
+    return [item * 2 for item in chunk]
+
+
+class TestMapChunks(unittest.TestCase):
+    """Chunks come back in order without reading the whole input"""
+
+    def setUp(self):
+        self.read = 0
+
+    def items(self, count):
+        for item in range(count):
+            self.read += 1
+            yield item
+
+    def test_ordered(self):
+        results = parallel.map_chunks(_slow_first, self.items(100), workers=2, chunk_size=1)
+        self.assertEqual(next(results), 0)
+        # The first chunk held the rest up, only a window of chunks was read meanwhile
+        self.assertLessEqual(self.read, 4)
+        self.assertEqual(list(results), [item * 2 for item in range(1, 100)])
+        self.assertEqual(self.read, 100)
+
+    def test_unordered(self):
+        results = list(parallel.map_chunks(_slow_first, self.items(50), workers=2, chunk_size=3, ordered=False))
+        self.assertEqual(sorted(results), [item * 2 for item in range(50)])
+        self.assertNotEqual(results[0], 0)  # The slow chunk didn't hold the others back
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import unittest
+import chess_engine
+import perft
+
+# Lowest acceptable move generation speed, set PERFT_MIN_NPS to tighten or loosen it on other machines
+MIN_NPS = int(os.environ.get("PERFT_MIN_NPS", 50000))
+
+
+class TestPerft(unittest.TestCase):
+    """Gates move generator changes on identical perft counts and a speed budget"""
+
+    def test_reference_counts(self):
+        for result in perft.benchmark(max_depth=3):
+            with self.subTest(position=result["name"], depth=result["depth"]):
+                self.assertEqual(result["nodes"], result["expected"])
+
+    def test_divide_adds_up(self):
+        gs = chess_engine.GameState.from_fen(perft.STARTING_FEN)
+        counts = perft.divide(gs, 3)
+        self.assertEqual(len(counts), 20)
+        self.assertEqual(sum(counts.values()), 8902)
+
+    def test_speed_budget(self):
+        result = perft.benchmark(perft.REFERENCE_POSITIONS[:1], max_depth=4)[-1]
+        self.assertEqual(result["nodes"], 197281)
+        self.assertGreaterEqual(result["nps"], MIN_NPS)
+
+
+if __name__ == "__main__":
+    unittest.main()
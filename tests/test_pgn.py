@@ -0,0 +1,127 @@
+import io
+import os
+import random
+import tempfile
+import unittest
+import chess_engine
+import pgn
+
+SAMPLE = """[Event "Casual"]
+[Site "?"]
+[White "Anderssen"]
+[Black "Kieseritzky"]
+[Result "1-0"]
+
+1. e4 e5 2. f4 exf4 3. Bc4 Qh4+ 4. Kf1 b5 {A comment
+[that spans lines]} 5. Bxb5 Nf6 6. Nf3 Qh6 7. d3 Nh5 8. Nh4 Qg5 (8... g6 9. Nf5)
+9. Nf5 c6 10. g4 Nf6 11. Rg1 $1 cxb5 12. h4 Qg6 13. h5 Qg5 14. Qf3 Ng8 15. Bxf4
+Qf6 16. Nc3 Bc5 17. Nd5 Qxb2 18. Bd6 Bxg1 19. e5 Qxa1+ 20. Ke2 Na6 21. Nxg7+ Kd8
+22. Qf6+ Nxf6 23. Be7# 1-0
+
+1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0
+"""
+
+
+class TestSan(unittest.TestCase):
+    """SAN is written and read back to the same moves"""
+
+    def test_round_trip_random_games(self):
+        rng = random.Random(3)
+        for _ in range(20):
+            gs = chess_engine.GameState()
+            for _ in range(120):
+                moves = gs.valid_moves()
+                if not moves:
+                    break
+                for move in moves:
+                    self.assertEqual(pgn.san_to_move(gs, pgn.move_to_san(gs, move, moves), moves), move)
+                gs.make_move(rng.choice(moves))
+
+    def test_disambiguation_and_special_moves(self):
+        gs = chess_engine.GameState.from_fen("r3k2r/8/8/8/8/8/4P3/R3K2R w KQkq - 0 1")
+        sans = {pgn.move_to_san(gs, move) for move in gs.valid_moves()}
+        self.assertIn("O-O", sans)
+        self.assertIn("O-O-O", sans)
+        self.assertIn("Rxa8+", sans)
+        gs = chess_engine.GameState.from_fen("4k3/8/8/8/8/R7/8/R4RK1 w - - 0 1")
+        sans = {pgn.move_to_san(gs, move) for move in gs.valid_moves()}
+        self.assertIn("Rad1", sans)
+        self.assertIn("Rfd1", sans)
+        self.assertIn("R1a2", sans)
+        self.assertIn("R3a2", sans)
+        gs = chess_engine.GameState.from_fen("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+        self.assertEqual(pgn.san_to_move(gs, "b8=N").get_chess_notation(), "b7b8n")
+        self.assertEqual(pgn.san_to_move(gs, "b7b8").get_chess_notation(), "b7b8q")
+
+    def test_illegal_move(self):
+        gs = chess_engine.GameState()
+        with self.assertRaises(ValueError):
+            pgn.san_to_move(gs, "e5")
+        with self.assertRaises(ValueError):
+            pgn.san_to_move(gs, "Zz9")
+
+
+class TestPgn(unittest.TestCase):
+    """Games stream in, replay legally and write back out"""
+
+    def test_read_sample(self):
+        games = list(pgn.read_games(io.StringIO(SAMPLE)))
+        self.assertEqual(len(games), 2)
+        immortal, scholars = games
+        self.assertEqual(immortal.headers["White"], "Anderssen")
+        self.assertEqual(immortal.result, "1-0")
+        self.assertEqual(len(immortal.moves), 45)
+        final = immortal.replay()
+        final.valid_moves()
+        self.assertTrue(final.checkmate)
+        self.assertEqual(scholars.moves[-1], "Qxf7#")
+
+    def test_write_and_read_back(self):
+        gs = chess_engine.GameState()
+        for notation in ("e2e4", "e7e5", "d1h5", "b8c6", "f1c4", "g8f6", "h5f7"):
+            gs.make_move(next(m for m in gs.valid_moves() if m.get_chess_notation() == notation))
+        game = pgn.game_from_gamestate(gs, {"White": "Me"})
+        self.assertEqual(game.result, "1-0")
+        self.assertEqual(len(gs.movelog), 7)
+        text = game.to_pgn()
+        self.assertIn("4. Qxf7# 1-0", text)
+        again = next(pgn.read_games(io.StringIO(text)))
+        self.assertEqual(again.moves, game.moves)
+        self.assertEqual(again.replay().to_fen(), gs.to_fen())
+
+    def test_start_from_fen(self):
+        gs = chess_engine.GameState.from_fen("4k3/8/8/8/8/8/8/R3K3 b - - 0 30")
+        gs.make_move(gs.valid_moves()[0])
+        game = pgn.game_from_gamestate(gs)
+        self.assertEqual(game.headers["FEN"], "4k3/8/8/8/8/8/8/R3K3 b - - 0 30")
+        self.assertIn("30... K", game.to_pgn())
+        self.assertEqual(next(pgn.read_games(io.StringIO(game.to_pgn()))).replay().to_fen(), gs.to_fen())
+
+    def test_replay_file(self):
+        bad = '[Event "Bad"]\n\n1. e4 e4 *\n'
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "games.pgn")
+            with open(path, "w") as file:
+                file.write(SAMPLE + "\n" + bad + SAMPLE)
+            for workers, use_mmap in ((0, False), (0, True), (2, True)):
+                with self.subTest(workers=workers, mmap=use_mmap):
+                    stats = pgn.replay_games(path, workers=workers, chunk_size=1, use_mmap=use_mmap)
+                    self.assertEqual(stats["games"], 5)
+                    self.assertEqual(stats["invalid"], 1)
+                    self.assertEqual(stats["errors"][0][0], 2)
+                    self.assertGreater(stats["games_per_second"], 0)
+
+    def test_replay_bad_fen_tag(self):
+        # Malformed start positions are invalid games, not the end of the archive
+        bad_enpassant = '[SetUp "1"]\n[FEN "4k3/8/8/8/8/8/8/4K3 w - e9 0 1"]\n\n1. Kd2 *\n'
+        no_king = '[SetUp "1"]\n[FEN "4k3/8/8/8/8/8/8/8 w - - 0 1"]\n\n*\n'
+        text = SAMPLE + "\n" + bad_enpassant + "\n" + no_king + "\n" + SAMPLE
+        for workers in (0, 2):
+            with self.subTest(workers=workers):
+                stats = pgn.replay_games(io.StringIO(text), workers=workers, chunk_size=1)
+                self.assertEqual((stats["games"], stats["invalid"]), (6, 2))
+                self.assertEqual([index for index, _ in stats["errors"]], [2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import unittest
+import chess_engine
+import perft
+import profiling
+
+
+class TestProfiler(unittest.TestCase):
+    """Counting calls leaves the game state working as before"""
+
+    def test_counts_perft(self):
+        gs = chess_engine.GameState()
+        profiler = profiling.Profiler()
+        with profiler.attached(gs):
+            self.assertEqual(perft.perft(gs, 2), 400)
+        snapshot = profiler.snapshot()
+        self.assertEqual(snapshot["valid_moves"]["calls"], 21)
+        self.assertEqual(snapshot["make_move"]["calls"], 20)
+        self.assertEqual(snapshot["undo_move"]["calls"], 20)
+        # One _legal_moves generator per valid_moves, each piece that can move adds its moves through _add_moves
+        self.assertEqual(snapshot["_legal_moves"]["calls"], 21)
+        self.assertEqual(snapshot["_update_move_cache"]["calls"], 21)
+        self.assertEqual(snapshot["king_move"]["calls"], 21)
+        self.assertEqual(snapshot["_add_moves"]["calls"], 21 * 15 + 21)  # 15 pieces besides the king, and the king
+        self.assertGreater(snapshot["_legal_moves"]["seconds"], 0)
+        self.assertGreaterEqual(snapshot["Move"]["calls"], 420)
+        self.assertGreater(snapshot["valid_moves"]["seconds"], 0)
+        self.assertEqual(json.loads(profiler.to_json()), snapshot)
+
+    def test_detach_restores(self):
+        gs = chess_engine.GameState()
+        profiler = profiling.Profiler()
+        profiler.attach(gs)
+        profiler.detach()
+        self.assertFalse(set(profiling.INSTRUMENTED) & set(vars(gs)))
+        self.assertEqual(gs.move_functions["N"], gs.knight_move)
+        self.assertIs(chess_engine._new_move, object.__new__)
+        gs.valid_moves()
+        self.assertEqual(profiler.calls["valid_moves"], 0)
+        self.assertEqual(profiler.calls["Move"], 0)
+
+    def test_reset(self):
+        gs = chess_engine.GameState()
+        profiler = profiling.Profiler()
+        with profiler.attached(gs):
+            gs.valid_moves()
+            self.assertEqual(profiler.calls["valid_moves"], 1)
+            profiler.reset()
+            self.assertEqual(profiler.snapshot()["valid_moves"], {"calls": 0, "seconds": 0.0, "mean_us": 0.0})
+            self.assertTrue(gs.has_any_legal_move())  # Leaves its generator after the first move
+            gs.in_check()
+        self.assertEqual(profiler.calls["_legal_moves"], 1)
+        self.assertEqual(profiler.calls["in_check"], 1)
+        self.assertEqual(profiler.calls["square_attacked"], 1)  # Reached from in_check
+        self.assertEqual(profiler.calls["valid_moves"], 0)
+
+    def test_piece_generators(self):
+        gs = chess_engine.GameState()
+        profiler = profiling.Profiler()
+        with profiler.attached(gs):
+            self.assertEqual(len(gs.all_moves()), 20)
+        # all_moves goes through move_functions, one call per piece
+        self.assertEqual({name: profiler.calls[name] for name in ("all_moves", "pawn_move", "knight_move",
+                                                                   "bishop_move", "rook_move", "queen_move")},
+                         {"all_moves": 1, "pawn_move": 8, "knight_move": 2, "bishop_move": 2, "rook_move": 2,
+                          "queen_move": 1})
+        self.assertEqual(profiler.calls["king_move"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
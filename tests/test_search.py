@@ -0,0 +1,70 @@
+import unittest
+from unittest import mock
+import chess_engine
+import search
+
+
+class TestSearch(unittest.TestCase):
+    """Checks the searcher finds obvious moves and sticks to its budget"""
+
+    def setUp(self):
+        self.gs = chess_engine.GameState()
+        self.searcher = search.Searcher()
+
+    def play(self, *notations):
+        for notation in notations:
+            move = next(m for m in self.gs.valid_moves() if m.get_chess_notation() == notation)
+            self.gs.make_move(move)
+
+    def test_finds_mate_in_one(self):
+        self.play("e2e4", "f7f6", "d2d4", "g7g5")
+        result = self.searcher.search(self.gs, max_depth=3)
+        self.assertEqual(result.best_move.get_chess_notation(), "d1h5")
+        self.assertTrue(search.is_mate_score(result.score))
+
+    def test_takes_free_queen(self):
+        self.play("e2e4", "d7d5", "d1g4")
+        result = self.searcher.search(self.gs, max_depth=2)
+        self.assertEqual(result.best_move.get_chess_notation(), "c8g4")
+
+    def test_position_restored(self):
+        key = self.gs.zobrist_key
+        result = self.searcher.search(self.gs, max_depth=3)
+        self.assertEqual(self.gs.zobrist_key, key)
+        self.assertEqual(self.gs.movelog, [])
+        self.assertEqual(result.depth, 3)
+        self.assertEqual(result.pv[0], result.best_move)
+        self.assertGreater(result.nodes, 0)
+
+    def test_node_limit(self):
+        result = self.searcher.search(self.gs, node_limit=2000)
+        self.assertGreaterEqual(result.depth, 1)
+        self.assertLess(result.nodes, 2000 + search.CHECK_EVERY)
+        self.assertIsNotNone(result.best_move)
+
+    def test_stop_after_first_iteration(self):
+        # Asked to stop from the very first node, the first iteration still finishes with a move
+        self.searcher.should_stop = lambda: True
+        with mock.patch.object(search, "CHECK_EVERY", 1):
+            result = self.searcher.search(self.gs, max_depth=5)
+        self.assertEqual(result.depth, 1)
+        self.assertIsNotNone(result.best_move)
+
+    def test_quiescence_in_check(self):
+        # The knight checks and forks the queen, only quiet king moves get out of check and the queen is lost
+        gs = chess_engine.GameState.from_fen("q3k3/2N5/8/8/8/8/7K/8 b - - 0 1")
+        self.assertLess(self.searcher.quiescence(gs, -search.INFINITY, search.INFINITY, 0), 0)
+        # Mated with no captures at all, found without standing pat
+        gs = chess_engine.GameState.from_fen("R5k1/5ppp/8/8/8/8/8/6K1 b - - 0 1")
+        self.assertEqual(self.searcher.quiescence(gs, -search.INFINITY, search.INFINITY, 0), -search.MATE_SCORE)
+
+    def test_depth_limits(self):
+        # An explicit 0 is not the searcher's default of MAX_DEPTH, it still gets the one iteration that always runs
+        self.assertEqual(self.searcher.search(self.gs, max_depth=0).depth, 1)
+        with mock.patch.object(search, "MAX_DEPTH", 3):
+            result = search.Searcher(hash_mb=0).search(self.gs, max_depth=5)
+        self.assertEqual(result.depth, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
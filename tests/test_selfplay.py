@@ -0,0 +1,75 @@
+import math
+import os
+import tempfile
+import unittest
+
+import pgn
+import selfplay
+
+
+class TestSelfPlay(unittest.TestCase):
+    """Games are adjudicated, counted and written the same in worker processes as in this one"""
+
+    def setUp(self):
+        self.engine = selfplay.EngineConfig("engine", depth=1, hash_mb=1)
+        self.baseline = selfplay.EngineConfig("baseline", depth=1, hash_mb=1, killers=False, history=False)
+
+    def test_elo_difference(self):
+        self.assertEqual(selfplay.elo_difference(0, 10, 0), (0.0, 0.0))
+        elo, margin = selfplay.elo_difference(15, 0, 5)
+        self.assertAlmostEqual(elo, 190.85, places=2)
+        self.assertGreater(margin, 0)
+        self.assertEqual(selfplay.elo_difference(3, 0, 0)[0], math.inf)
+
+    def test_parse(self):
+        config = selfplay.EngineConfig.parse("depth=2, nodes=500, history=off, tb=tables", "test")
+        self.assertEqual((config.name, config.depth, config.node_limit, config.history, config.killers),
+                         ("test", 2, 500, False, True))
+        self.assertEqual(config.tablebase_dir, "tables")
+        for spec in ("depth=2,speed=3", "killers=maybe", "depth=x"):
+            with self.assertRaises(ValueError):
+                selfplay.EngineConfig.parse(spec)
+
+    def test_adjudication(self):
+        record = selfplay.play_game(0, "7k/8/6K1/8/8/8/8/1Q6 w - - 0 1", self.engine, self.baseline)
+        self.assertEqual((record.result, record.reason, record.plies), ("1-0", "checkmate", 1))
+        self.assertEqual(record.game.moves, ["Qb8#"])
+
+        record = selfplay.play_game(0, "8/8/8/8/8/8/8/k1K5 w - - 0 1", self.engine, self.baseline)
+        self.assertEqual((record.result, record.reason, record.plies), ("1/2-1/2", "insufficient material", 0))
+
+        record = selfplay.play_game(0, ["e2e4", "e7e5"], self.engine, self.baseline, max_plies=4)
+        self.assertEqual((record.result, record.reason, record.plies), ("1/2-1/2", "move limit", 4))
+        self.assertEqual(len(record.game.moves), 6)  # The opening is part of the game
+        self.assertGreater(record.nodes[0], 0)
+
+    def test_match(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "match.pgn")
+        finished = []
+        stats = selfplay.run_match(self.engine, self.baseline, 4, workers=0, max_plies=6, pgn_path=path,
+                                   on_game=finished.append)
+        self.assertEqual((stats["games"], stats["wins"] + stats["draws"] + stats["losses"]), (4, 4))
+        self.assertEqual([record.white for record in stats["records"]], ["engine", "baseline"] * 2)
+        self.assertEqual(len(finished), 4)
+        self.assertEqual(set(stats["nps"]), {"engine", "baseline"})
+        games = list(pgn.read_games(path))
+        self.assertEqual([game.headers["Round"] for game in games], ["1", "2", "3", "4"])
+        for game in games:
+            game.replay()
+
+        parallel = selfplay.run_match(self.engine, self.baseline, 4, workers=2, max_plies=6)
+        self.assertEqual([(record.result, record.game.moves) for record in parallel["records"]],
+                         [(record.result, record.game.moves) for record in stats["records"]])
+
+    def test_same_names(self):
+        # White mates at once in every game, so each side wins the games it has white whatever it is called
+        baseline = selfplay.EngineConfig("engine", depth=1, hash_mb=1, killers=False, history=False)
+        stats = selfplay.run_match(self.engine, baseline, 4, ["7k/8/6K1/8/8/8/8/1Q6 w - - 0 1"], workers=0)
+        self.assertEqual((stats["wins"], stats["draws"], stats["losses"]), (2, 0, 2))
+        self.assertTrue(stats["nps"]["engine"] > 0 and stats["nps"]["baseline"] > 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame as pg
+import sprites
+
+IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "images")
+
+
+class TestSpriteAtlas(unittest.TestCase):
+    """The atlas is built once per size and reused from disk and memory"""
+
+    def setUp(self):
+        pg.display.init()
+        self.addCleanup(pg.display.quit)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_dir = directory.name
+
+    def test_built_then_loaded(self):
+        atlas = sprites.SpriteAtlas(40, IMAGES, self.cache_dir)
+        self.assertEqual(atlas.built, 1)
+        self.assertEqual(atlas.surface.get_size(), (40 * len(sprites.PIECES), 40))
+        self.assertTrue(os.path.exists(atlas.atlas_path(40)))
+
+        again = sprites.SpriteAtlas(40, IMAGES, self.cache_dir)
+        self.assertEqual(again.built, 0)
+        for piece in ("wK", "bP"):
+            area = atlas.area(piece)
+            self.assertEqual(pg.image.tobytes(atlas.surface.subsurface(area), "RGBA"),
+                             pg.image.tobytes(again.surface.subsurface(area), "RGBA"))
+
+    def test_resize_cached_in_memory(self):
+        atlas = sprites.SpriteAtlas(32, IMAGES, self.cache_dir)
+        first = atlas.surface
+        atlas.resize(48)
+        self.assertEqual((atlas.square_size, atlas.built), (48, 2))
+        atlas.resize(32)
+        self.assertIs(atlas.surface, first)
+        self.assertEqual(atlas.built, 2)
+
+    def test_blit(self):
+        atlas = sprites.SpriteAtlas(24, IMAGES, self.cache_dir)
+        screen = pg.Surface((24, 24), pg.SRCALPHA)
+        rect = atlas.blit(screen, "wQ", (0, 0))
+        self.assertEqual(rect, pg.Rect(0, 0, 24, 24))
+        self.assertEqual(pg.image.tobytes(screen, "RGBA"),
+                         pg.image.tobytes(atlas.surface.subsurface(atlas.area("wQ")), "RGBA"))
+
+    def test_missing_image(self):
+        with self.assertRaises(FileNotFoundError):
+            sprites.SpriteAtlas(24, self.cache_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
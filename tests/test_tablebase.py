@@ -0,0 +1,133 @@
+import os
+import random
+import tempfile
+import unittest
+
+import chess_engine
+import search
+import tablebase
+
+
+def _random_position(rng: random.Random, pieces: str) -> chess_engine.GameState:
+    """
+    A random legal position with the given pieces, FEN letters, and no castling or en passant.
+    """
+    while True:
+        rows = [["1"] * 8 for _ in range(8)]
+        placed = rng.sample(range(64), len(pieces))
+        if any(piece in "Pp" and sq >> 3 in (0, 7) for piece, sq in zip(pieces, placed)):
+            continue
+        for piece, sq in zip(pieces, placed):
+            rows[sq >> 3][sq & 7] = piece
+        board = "/".join("".join(row) for row in rows)
+        for length in range(8, 1, -1):
+            board = board.replace("1" * length, str(length))
+        try:
+            return chess_engine.GameState.from_fen(f"{board} {rng.choice('wb')} - - 0 1", board_backend="mailbox")
+        except ValueError:  # The side that just moved is left in check
+            continue
+
+
+class TestTablebase(unittest.TestCase):
+    """The 3 piece tables are built once and checked against the move generator"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.stats = {}
+        for name in ("KQK", "KRK", "KPK"):
+            cls.stats[name] = tablebase.build(name, cls.directory.name)
+        cls.tables = tablebase.Tablebases(cls.directory.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tables.close()
+        cls.directory.cleanup()
+
+    def probe(self, fen: str):
+        return self.tables.probe(chess_engine.GameState.from_fen(fen, board_backend="mailbox"))
+
+    def test_names(self):
+        self.assertEqual(tablebase.canonical_name("kpkr"), "KRKP")
+        self.assertEqual(tablebase.canonical_name("KNKB"), "KBKN")
+        self.assertEqual(tablebase.dependencies("KPK"), ["KBK", "KNK", "KQK", "KRK"])
+        self.assertEqual(tablebase.dependencies("KQK"), [])
+        with self.assertRaises(ValueError):
+            tablebase.canonical_name("QKK")
+
+    def test_longest_mates(self):
+        # The known longest mates of these endings
+        self.assertEqual({name: stats["longest"] for name, stats in self.stats.items()},
+                         {"KQK": 10, "KRK": 16, "KPK": 28})
+        self.assertEqual(self.tables.max_pieces, 3)
+        self.assertEqual(self.tables.available, ["KBK", "KNK", "KPK", "KQK", "KRK"])
+
+    def test_positions(self):
+        self.assertEqual(self.probe("7k/6Q1/6K1/8/8/8/8/8 b - - 0 1"), tablebase.TablebaseResult(-1, 0))
+        self.assertEqual(self.probe("7k/8/6K1/8/8/8/8/1Q6 w - - 0 1"), tablebase.TablebaseResult(1, 1))
+        # The same with the colours swapped, looked up in the KQK table mirrored
+        self.assertEqual(self.probe("1q6/8/8/8/8/6k1/8/7K b - - 0 1"), tablebase.TablebaseResult(1, 1))
+        self.assertEqual(self.probe("4k3/4P3/4K3/8/8/8/8/8 b - - 0 1").wdl, 0)  # Stalemate
+        self.assertEqual(self.probe("8/8/8/8/8/8/8/k1K5 w - - 0 1").wdl, 0)  # Bare kings
+        self.assertEqual(self.probe("8/8/8/4k3/8/8/8/4K2R w - - 0 1").moves, 14)
+
+    def test_consistent_with_moves(self):
+        rng = random.Random(7)
+        for pieces in ("KRk", "KPk", "kpK", "KkQ"):
+            for _ in range(60):
+                gs = _random_position(rng, pieces)
+                moves = gs.valid_moves()
+                children = []
+                for move in moves:
+                    gs.make_move(move)
+                    children.append(self.tables.probe(gs))
+                    gs.undo_move()
+                if not moves:
+                    expected = tablebase.TablebaseResult(-1, 0) if gs.in_check() else tablebase.TablebaseResult(0, None)
+                elif any(child.wdl < 0 for child in children):
+                    expected = tablebase.TablebaseResult(1, min(child.plies for child in children if child.wdl < 0) + 1)
+                elif any(child.wdl == 0 for child in children):
+                    expected = tablebase.TablebaseResult(0, None)
+                else:
+                    expected = tablebase.TablebaseResult(-1, max(child.plies for child in children) + 1)
+                self.assertEqual(self.tables.probe(gs), expected, gs.to_fen())
+
+    def test_not_covered(self):
+        self.assertIsNone(self.probe(chess_engine.STARTING_FEN))
+        self.assertIsNone(self.probe("4k3/8/8/8/8/8/8/R3K3 w Q - 0 1"))  # Castling rights
+        self.assertIsNone(self.probe("r3k3/8/8/8/8/8/8/Q3K3 w - - 0 1"))  # No 4 piece tables
+        self.assertEqual(self.probe("4k3/8/8/8/8/8/8/4K2B w - - 0 1").wdl, 0)  # Built for KPK's underpromotions
+        self.assertIsNotNone(self.tables.table("KQK"))
+        self.assertIsNone(self.tables.table("KQKR"))
+        self.assertEqual(tablebase.Tablebases(os.path.join(self.directory.name, "missing")).max_pieces, 0)
+
+    def test_file(self):
+        path = os.path.join(self.directory.name, "KQK" + tablebase.EXTENSION)
+        with open(path, "rb") as file:
+            magic, positions = tablebase.HEADER.unpack(file.read(tablebase.HEADER.size))
+        self.assertEqual((magic, positions), (tablebase.MAGIC, 16 * 64 * 64))
+        self.assertEqual(os.path.getsize(path), tablebase.HEADER.size + 2 * positions)
+
+    def test_best_move(self):
+        gs = chess_engine.GameState.from_fen("8/8/8/4k3/8/8/8/4K2R w - - 0 1", board_backend="mailbox")
+        plies = 0
+        while gs.valid_moves():  # Both sides play the table's best moves
+            gs.make_move(self.tables.best_move(gs))
+            plies += 1
+        self.assertTrue(gs.checkmate)
+        self.assertEqual(plies, 27)
+
+    def test_search(self):
+        searcher = search.Searcher(hash_mb=1, tablebases=self.tables)
+        result = searcher.search(chess_engine.GameState.from_fen("8/8/8/4k3/8/8/8/4K2R w - - 0 1"), max_depth=4)
+        self.assertEqual((result.depth, result.score), (0, search.MATE_SCORE - 27))
+
+        # Not covered at the root, but taking the knight leads into KRK
+        gs = chess_engine.GameState.from_fen("n3k3/8/8/8/8/8/8/R3K3 w - - 0 1")
+        result = searcher.search(gs, max_depth=1)
+        self.assertEqual(result.best_move.get_chess_notation(), "a1a8")
+        self.assertTrue(search.is_mate_score(result.score))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import chess_engine
+import search
+import transposition
+
+
+class TestTranspositionTable(unittest.TestCase):
+    """Checks storing, probing and the replacement scheme"""
+
+    def setUp(self):
+        self.tt = transposition.TranspositionTable(size_mb=1)
+
+    def test_size_is_power_of_two(self):
+        self.assertEqual(self.tt.size & (self.tt.size - 1), 0)
+        self.assertLessEqual(self.tt.table.nbytes, 1024 * 1024)
+
+    def test_store_and_probe(self):
+        self.assertIsNone(self.tt.probe(12345))
+        self.tt.store(12345, 4, -30, transposition.LOWER, 77)
+        self.assertEqual(self.tt.probe(12345), (77, -30, 4, transposition.LOWER))
+        self.assertEqual((self.tt.hits, self.tt.misses), (1, 1))
+
+    def test_collision_counted(self):
+        other = 12345 + self.tt.size  # Same slot, different key
+        self.tt.store(12345, 4, 0, transposition.EXACT)
+        self.assertIsNone(self.tt.probe(other))
+        self.assertEqual(self.tt.collisions, 1)
+
+    def test_deeper_entry_kept_within_a_search(self):
+        other = 12345 + self.tt.size
+        self.tt.store(12345, 6, 10, transposition.EXACT)
+        self.tt.store(other, 2, 20, transposition.EXACT)
+        self.assertIsNotNone(self.tt.probe(12345))
+        self.tt.new_search()  # Old entries give way to new searches
+        self.tt.store(other, 2, 20, transposition.EXACT)
+        self.assertIsNotNone(self.tt.probe(other))
+        self.assertEqual(self.tt.replacements, 1)
+
+    def test_search_uses_table(self):
+        gs = chess_engine.GameState()
+        plain = search.Searcher(hash_mb=0).search(gs, max_depth=4)
+        searcher = search.Searcher(hash_mb=1)
+        cached = searcher.search(gs, max_depth=4)
+        self.assertEqual(plain.score, cached.score)
+        self.assertLess(cached.nodes, plain.nodes)
+        self.assertGreater(searcher.tt.stats()["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import io
+import os
+import subprocess
+import sys
+import unittest
+import uci
+
+
+class TestUci(unittest.TestCase):
+    """Drives the UCI front-end a command at a time"""
+
+    def setUp(self):
+        self.output = io.StringIO()
+        self.engine = uci.UciEngine(self.output)
+        self.addCleanup(self.engine.stop)
+
+    def run_commands(self, *lines):
+        for line in lines:
+            self.engine.handle(line)
+        self.engine.wait()
+        return self.output.getvalue().splitlines()
+
+    def test_handshake(self):
+        lines = self.run_commands("uci", "isready")
+        self.assertEqual(lines[0], f"id name {uci.NAME}")
+        self.assertIn("uciok", lines)
+        self.assertEqual(lines[-1], "readyok")
+
+    def test_go_depth(self):
+        lines = self.run_commands("position startpos moves e2e4 e7e5 g1f3", "go depth 3")
+        infos = [line for line in lines if line.startswith("info depth")]
+        self.assertEqual([line.split()[2] for line in infos], ["1", "2", "3"])
+        self.assertTrue(all(" nodes " in line and " nps " in line and " pv " in line for line in infos))
+        self.assertTrue(lines[-1].startswith("bestmove "))
+
+    def test_mate_score(self):
+        lines = self.run_commands("position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", "go depth 3")
+        self.assertIn("score mate 1", lines[-2])
+        self.assertTrue(lines[-1].startswith("bestmove a1a8"))
+
+    def test_stop(self):
+        self.engine.handle("position startpos")
+        self.engine.handle("go infinite")
+        self.assertTrue(self.engine.handle("stop"))
+        lines = self.output.getvalue().splitlines()
+        self.assertTrue(lines[-1].startswith("bestmove "))
+        self.assertNotEqual(lines[-1], "bestmove 0000")
+        self.assertFalse(self.engine.handle("quit"))
+
+    def test_hash_option(self):
+        self.run_commands("setoption name Hash value 2", "go depth 1")
+        self.assertEqual(self.engine._searcher.tt.size_mb, 2)
+        self.run_commands("setoption name Hash value 4")
+        self.assertEqual(self.engine._searcher.tt.size_mb, 4)
+
+    def test_illegal_move(self):
+        lines = self.run_commands("position startpos moves e2e5")
+        self.assertEqual(lines, ["info string illegal move e2e5"])
+
+    def test_bad_position_keeps_old(self):
+        self.run_commands("position startpos moves e2e4")
+        before = self.engine._gs.to_fen()
+        self.run_commands("position startpos moves d2d4 d7d5 d4d6")  # Fails on the third move
+        self.run_commands("position fen 8/8/8/8/8/8/8/4K3 w - - 0 1")  # No black king
+        lines = self.output.getvalue().splitlines()
+        self.assertEqual(lines[0], "info string illegal move d4d6")
+        self.assertTrue(lines[1].startswith("info string bad fen 8/8/8/8/8/8/8/4K3 w - - 0 1: "))
+        self.assertEqual(self.engine._gs.to_fen(), before)
+
+    def test_infinite_waits_for_stop(self):
+        # Stalemate, the search is over at once but the bestmove has to wait for stop
+        self.engine.handle("position fen 7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+        self.engine.handle("go infinite")
+        self.engine._thread.join(0.2)
+        self.assertTrue(self.engine._thread.is_alive())
+        self.assertNotIn("bestmove 0000", self.output.getvalue())
+        self.engine.handle("stop")
+        lines = self.output.getvalue().splitlines()
+        self.assertEqual(lines[-1], "bestmove 0000")
+        self.assertTrue(all(" pv" not in line for line in lines))
+
+    def test_failed_search(self):
+        class Broken:
+            should_stop = on_iteration = None
+
+            def search(self, *args, **kwargs):
+                raise RuntimeError("broken")
+
+        self.engine._searcher = Broken()
+        lines = self.run_commands("go depth 2")
+        self.assertEqual(lines, ["info string search failed: RuntimeError: broken", "bestmove 0000"])
+
+    def test_headless(self):
+        # Numpy waits for the background import, pygame never comes in at all
+        code = ("import sys, uci; print('numpy' in sys.modules); engine = uci.UciEngine(sys.stderr); "
+                "engine.handle('go depth 1'); engine.wait(); print('pygame' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.stdout.split(), ["False", "False"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+"""
+The transposition table, a fixed size cache of search results keyed by Zobrist key.
+
+The table is one preallocated Numpy structured array, so its memory use is set once up front and never grows.
+A key maps to a single slot, ``key & (size - 1)``, and when two positions want the same slot the deeper or
+more recent search wins.
+"""
+# Imports
+import numpy as np
+
+# Bound types, what the stored score means
+EMPTY = 0
+EXACT = 1  # The true score
+LOWER = 2  # The score is at least this, the search failed high
+UPPER = 3  # The score is at most this, the search failed low
+
+ENTRY_DTYPE = np.dtype([
+    ("key", np.uint64),
+    ("move", np.uint32),  # Move.code, 0 for none
+    ("score", np.int32),
+    ("depth", np.int16),
+    ("bound", np.uint8),
+    ("age", np.uint8),
+])
+
+
+class TranspositionTable:
+    """
+    The transposition table.
+    """
+
+    def __init__(self, size_mb: float = 16):
+        """
+        Allocates the table.
+
+        :param size_mb: The memory to use in megabytes, rounded down to a power of two number of entries.
+        """
+
+        self.size_mb = size_mb
+        entries = max(1, int(size_mb * 1024 * 1024) // ENTRY_DTYPE.itemsize)
+        self.size = 1 << (entries.bit_length() - 1)
+        self.mask = self.size - 1
+        self.table = np.zeros(self.size, dtype=ENTRY_DTYPE)
+        self.age = 0
+
+        # Statistics
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # Probes that found a different position in the slot
+        self.stores = 0
+        self.replacements = 0  # Stores that overwrote a different position
+
+    def clear(self) -> None:
+        """
+        Empties the table and resets the statistics.
+
+        :return:
+        """
+
+        self.table.fill(0)
+        self.age = 0
+        self.reset_stats()
+
+    def resize(self, size_mb: float) -> None:
+        """
+        Reallocates the table at a new size, everything stored is lost.
+
+        :param size_mb: The memory to use in megabytes.
+        :return:
+        """
+
+        self.__init__(size_mb)
+
+    def new_search(self) -> None:
+        """
+        Ages the table, entries from earlier searches are then the first to be replaced.
+
+        :return:
+        """
+
+        self.age = (self.age + 1) & 0xFF
+
+    def probe(self, key: int):
+        """
+        Looks up a position.
+
+        :param key: The position's Zobrist key.
+        :return: A (move code, score, depth, bound) tuple, or None if the position is not stored.
+        """
+
+        self.probes += 1
+        entry = self.table[key & self.mask]
+        if entry["bound"] == EMPTY:
+            self.misses += 1
+            return None
+        if int(entry["key"]) != key:
+            self.misses += 1
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return int(entry["move"]), int(entry["score"]), int(entry["depth"]), int(entry["bound"])
+
+    def store(self, key: int, depth: int, score: int, bound: int, move_code: int = 0) -> None:
+        """
+        Stores a search result, unless the slot holds a deeper result for another position from this search.
+
+        :param key: The position's Zobrist key.
+        :param depth: The depth the position was searched to.
+        :param score: The score found.
+        :param bound: EXACT, LOWER or UPPER.
+        :param move_code: The code of the best move found, 0 for none.
+        :return:
+        """
+
+        index = key & self.mask
+        entry = self.table[index]
+        if entry["bound"] != EMPTY and int(entry["key"]) != key:
+            if entry["age"] == self.age and entry["depth"] > depth:
+                return  # Keep the deeper search
+            self.replacements += 1
+        elif entry["bound"] != EMPTY and not move_code:
+            move_code = int(entry["move"])  # Same position, keep its best move
+        self.stores += 1
+        self.table[index] = (key, move_code, score, depth, bound, self.age)
+
+    def hashfull(self) -> int:
+        """
+        How full the table is, in permille, by sampling the first thousand slots like UCI engines do.
+
+        :return: The permille of used slots.
+        """
+
+        sample = self.table["bound"][:1000]
+        return int(np.count_nonzero(sample) * 1000 // len(sample))
+
+    def reset_stats(self) -> None:
+        """
+        Zeroes the hit, miss and collision counters.
+
+        :return:
+        """
+
+        self.probes = self.hits = self.misses = self.collisions = self.stores = self.replacements = 0
+
+    def stats(self) -> dict:
+        """
+        The table's counters.
+
+        :return: A dictionary of the counters and the table's size.
+        """
+
+        return {
+            "size_mb": self.size_mb,
+            "entries": self.size,
+            "probes": self.probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "replacements": self.replacements,
+            "hashfull": self.hashfull(),
+        }
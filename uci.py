@@ -0,0 +1,359 @@
+"""
+The engine as a UCI program, for chess GUIs, tournament managers and servers without a display.
+
+Reads UCI commands from stdin and answers on stdout, it never imports pygame:
+
+    python uci.py
+
+Supports uci, isready, ucinewgame, setoption (Hash, BookFile), position, go (depth, nodes, movetime, wtime,
+btime, winc, binc, movestogo, infinite), stop and quit. The search runs on its own thread so stop and isready
+are answered while it thinks, and an info line is written after each iteration. The engine modules, and Numpy
+with them, are imported on a background thread at launch so the first isready is answered straight away.
+"""
+# Imports
+import sys
+import threading
+
+NAME = "Chess"
+AUTHOR = "the Chess developers"
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+
+# The share of the remaining clock a move gets when the number of moves to the time control isn't given
+DEFAULT_MOVES_TO_GO = 30
+# Kept back from every time budget for writing the move and the GUI's overhead
+MOVE_OVERHEAD = 0.05
+
+
+def _import_engine():
+    """
+    Imports the engine modules, the slow part of starting up.
+
+    :return: The chess_engine, opening_book and search modules.
+    """
+    import chess_engine
+    import opening_book
+    import search
+    return chess_engine, opening_book, search
+
+
+def format_score(score: int, search) -> str:
+    """
+    A score in UCI form, centipawns or moves to mate.
+
+    :param score: The score from the searcher, for the side to move.
+    :param search: The search module.
+    :return: "cp <centipawns>" or "mate <moves>", negative when the side to move is getting mated.
+    """
+    if search.is_mate_score(score):
+        plies = search.MATE_SCORE - abs(score)
+        moves = (plies + 1) // 2
+        return f"mate {moves if score > 0 else -moves}"
+    return f"cp {score}"
+
+
+class UciEngine:
+    """
+    The UCI protocol state, a position and a searcher, fed one command line at a time.
+    """
+
+    def __init__(self, output=None):
+        """
+        Sets up the engine and starts importing the engine modules in the background.
+
+        :param output: Where the replies go, stdout if not given.
+        """
+
+        self.output = output if output is not None else sys.stdout
+        self._write_lock = threading.Lock()
+        self._modules = None
+        self._loader = threading.Thread(target=self._load, daemon=True)
+        self._loader.start()
+
+        self.hash_mb = DEFAULT_HASH_MB
+        self.book_path = None
+        self._searcher = None
+        self._book = None
+        self._gs = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._infinite = False
+
+    def _load(self) -> None:
+        self._modules = _import_engine()
+
+    def _engine(self) -> tuple:
+        """
+        The engine modules, waiting for the background import if it hasn't finished.
+
+        :return: The chess_engine, opening_book and search modules.
+        """
+
+        self._loader.join()
+        return self._modules
+
+    def send(self, line: str) -> None:
+        """
+        Writes a line to the GUI.
+
+        :param line: The line, without its newline.
+        :return:
+        """
+
+        with self._write_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line: str) -> bool:
+        """
+        Carries out one command.
+
+        :param line: The command line.
+        :return: False once quit has been received.
+        """
+
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {NAME}")
+            self.send(f"id author {AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max {MAX_HASH_MB}")
+            self.send("option name BookFile type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stop()
+            self._set_option(arguments)
+        elif command == "ucinewgame":
+            self.stop()
+            if self._searcher is not None:
+                if self._searcher.tt is not None:
+                    self._searcher.tt.clear()
+                self._searcher.orderer.clear()
+        elif command == "position":
+            self.stop()
+            self._set_position(arguments)
+        elif command == "go":
+            self.stop()
+            self._go(arguments)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+    def _set_option(self, arguments: list) -> None:
+        """
+        Handles ``setoption name <name> [value <value>]``.
+
+        :param arguments: The words after setoption.
+        :return:
+        """
+
+        if "name" not in arguments:
+            return
+        name_at = arguments.index("name") + 1
+        value_at = arguments.index("value") if "value" in arguments else len(arguments)
+        name = " ".join(arguments[name_at:value_at]).lower()
+        value = " ".join(arguments[value_at + 1:])
+        if name == "hash":
+            try:
+                self.hash_mb = min(max(int(value), 1), MAX_HASH_MB)
+            except ValueError:
+                return
+            if self._searcher is not None:
+                self._searcher.tt.resize(self.hash_mb)
+        elif name == "bookfile":
+            if self._book is not None:
+                self._book.close()
+                self._book = None
+            self.book_path = value if value and value != "<empty>" else None
+            if self._searcher is not None:
+                self._searcher.book = self._open_book()
+
+    def _open_book(self):
+        """
+        Opens the book file, if one is set.
+
+        :return: The OpeningBook, or None.
+        """
+
+        if self.book_path is None:
+            return None
+        _, opening_book, _ = self._engine()
+        try:
+            self._book = opening_book.OpeningBook(self.book_path)
+        except OSError as error:
+            self.send(f"info string cannot open book {self.book_path}: {error}")
+            self.book_path = None
+        return self._book
+
+    def _set_position(self, arguments: list) -> None:
+        """
+        Handles ``position (startpos | fen <fen>) [moves <move> ...]``.
+
+        :param arguments: The words after position.
+        :return:
+        """
+
+        chess_engine, _, _ = self._engine()
+        moves_at = arguments.index("moves") if "moves" in arguments else len(arguments)
+        if arguments and arguments[0] == "fen":
+            fen = " ".join(arguments[1:moves_at])
+        else:
+            fen = chess_engine.STARTING_FEN
+        # Built up on its own and only swapped in once every move has been played, a bad command keeps the old one
+        try:
+            gs = chess_engine.GameState.from_fen(fen, board_backend="mailbox")
+        except ValueError as error:
+            self.send(f"info string bad fen {fen}: {error}")
+            return
+        for notation in arguments[moves_at + 1:]:
+            move = next((move for move in gs.valid_moves() if move.get_chess_notation() == notation), None)
+            if move is None:
+                self.send(f"info string illegal move {notation}")
+                return
+            gs.make_move(move)
+        self._gs = gs
+
+    def _time_budget(self, options: dict, white_to_move: bool):
+        """
+        How long to think, from the go command's clock fields.
+
+        :param options: The go command's numeric fields.
+        :param white_to_move: Whose clock to use.
+        :return: The seconds to think, or None for no time limit.
+        """
+
+        if "movetime" in options:
+            return max(options["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+        remaining = options.get("wtime" if white_to_move else "btime")
+        if remaining is None:
+            return None
+        increment = options.get("winc" if white_to_move else "binc", 0)
+        moves_to_go = options.get("movestogo", DEFAULT_MOVES_TO_GO)
+        budget = remaining / 1000 / max(moves_to_go, 1) + increment / 1000 * 0.75
+        return max(min(budget, remaining / 1000 / 2) - MOVE_OVERHEAD, 0.01)
+
+    def _go(self, arguments: list) -> None:
+        """
+        Handles go, starting the search thread.
+
+        :param arguments: The words after go.
+        :return:
+        """
+
+        chess_engine, _, search = self._engine()
+        if self._gs is None:
+            self._gs = chess_engine.GameState.from_fen(chess_engine.STARTING_FEN, board_backend="mailbox")
+        if self._searcher is None:
+            self._searcher = search.Searcher(hash_mb=self.hash_mb, book=self._open_book())
+
+        options = {}
+        for name, value in zip(arguments, arguments[1:]):
+            if name in ("depth", "nodes", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    options[name] = int(value)
+                except ValueError:
+                    pass
+        infinite = "infinite" in arguments
+        self._infinite = infinite
+        limits = {
+            "max_depth": min(options.get("depth", search.MAX_DEPTH), search.MAX_DEPTH),
+            "time_limit": None if infinite else self._time_budget(options, self._gs.white_to_move),
+            "node_limit": options.get("nodes"),
+        }
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._search, args=(self._gs, limits, infinite), daemon=True)
+        self._thread.start()
+
+    def _search(self, gs, limits: dict, infinite: bool = False) -> None:
+        """
+        The search thread, writes info lines as it deepens and the bestmove at the end.
+
+        :param gs: The game state to search.
+        :param limits: The max_depth, time_limit and node_limit for the search.
+        :param infinite: Hold the bestmove back until stop, as go infinite asks, even if the search ends first.
+        :return:
+        """
+
+        _, _, search = self._engine()
+        searcher = self._searcher
+        stop = self._stop
+
+        def report(result):
+            line = (f"info depth {result.depth} score {format_score(result.score, search)} nodes {result.nodes} "
+                    f"nps {result.nps} time {int(result.elapsed * 1000)}")
+            if result.pv:  # Mated or stalemated, there is no line to show
+                line += " pv " + " ".join(move.get_chess_notation() for move in result.pv)
+            self.send(line)
+
+        searcher.should_stop = stop.is_set
+        searcher.on_iteration = report
+        result = None
+        try:
+            result = searcher.search(gs, **limits)
+        except Exception as error:
+            # The GUI is waiting on a bestmove whatever happens, a dead search thread would hang it
+            self.send(f"info string search failed: {type(error).__name__}: {error}")
+        finally:
+            searcher.should_stop = None
+            searcher.on_iteration = None
+
+        if infinite:
+            stop.wait()
+        if result is None or result.best_move is None:
+            self.send("bestmove 0000")
+        elif len(result.pv) > 1:
+            self.send(f"bestmove {result.best_move.get_chess_notation()} ponder {result.pv[1].get_chess_notation()}")
+        else:
+            self.send(f"bestmove {result.best_move.get_chess_notation()}")
+
+    def stop(self) -> None:
+        """
+        Stops the search if one is running and waits for its bestmove.
+
+        :return:
+        """
+
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def wait(self) -> None:
+        """
+        Waits for the running search to finish on its own, for scripts and tests. A go infinite search never
+        does, so it is stopped instead.
+
+        :return:
+        """
+
+        if self._thread is not None:
+            if self._infinite:
+                self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+def main() -> None:
+    """
+    Runs the engine on stdin and stdout until quit or the end of input.
+
+    :return:
+    """
+
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    else:
+        engine.wait()  # Input ran out, let the last search finish rather than cutting it off
+
+
+if __name__ == "__main__":
+    main()
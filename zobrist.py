@@ -0,0 +1,72 @@
+"""
+Zobrist keys, 64-bit numbers that identify a position.
+
+A position's key is the XOR of one random number per (piece, square) on the board, one for the side to move,
+one for the enpassant file and one for the castling rights. Making a move only changes a few of those terms,
+so ``GameState`` keeps its key up to date incrementally instead of rebuilding it.
+"""
+# Imports
+import random
+
+import bitboard as bb
+
+# Fixed seed so keys are the same on every run, anything saved by key (books, tables) stays valid
+_random = random.Random(0x5EED)
+
+
+def _random_keys(count: int) -> list:
+    """
+    Draws random 64-bit keys.
+
+    :param count: How many keys to draw.
+    :return: A list of keys.
+    """
+    return [_random.getrandbits(64) for _ in range(count)]
+
+
+# PIECE_KEYS[code][sq], the empty "piece" 0 has all zero keys
+PIECE_KEYS = [[0] * 64] + [_random_keys(64) for _ in range(12)]
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+ENPASSANT_KEYS = _random_keys(8)  # Indexed by file
+CASTLING_KEYS = _random_keys(16)  # Indexed by the 4 bit castling rights
+
+
+def enpassant_key(bitboards, enpassant_possible: tuple, white_to_move: bool) -> int:
+    """
+    The enpassant term of a key.
+
+    The file only counts when a pawn of the side to move could actually capture, otherwise the position is
+    the same as one without the enpassant square and should share its key for repetition checks.
+
+    :param bitboards: The position's bitboards.
+    :param enpassant_possible: The enpassant square (row, column), or an empty tuple.
+    :param white_to_move: Whether it is white's turn.
+    :return: The key for the enpassant file, or 0.
+    """
+    if not enpassant_possible:
+        return 0
+    ep_sq = bb.square(*enpassant_possible)
+    if white_to_move:
+        capturers = bb.PAWN_ATTACKS[bb.BLACK][ep_sq] & bitboards.pieces[bb.WP]
+    else:
+        capturers = bb.PAWN_ATTACKS[bb.WHITE][ep_sq] & bitboards.pieces[bb.BP]
+    return ENPASSANT_KEYS[enpassant_possible[1]] if capturers else 0
+
+
+def position_key(bitboards, white_to_move: bool, enpassant_possible: tuple = (), castling_rights: int = 0) -> int:
+    """
+    Computes a position's key from scratch.
+
+    :param bitboards: The position's bitboards.
+    :param white_to_move: Whether it is white's turn.
+    :param enpassant_possible: The enpassant square (row, column), or an empty tuple.
+    :param castling_rights: The castling rights as a 4 bit number.
+    :return: The 64-bit key.
+    """
+    key = 0
+    for sq, code in enumerate(bitboards.mailbox):
+        key ^= PIECE_KEYS[code][sq]
+    if not white_to_move:
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= enpassant_key(bitboards, enpassant_possible, white_to_move)
+    return key ^ CASTLING_KEYS[castling_rights]